@@ -1,4 +1,4 @@
-import os, re, json, requests, time, argparse
+import os, re, json, requests, time, argparse, uuid, logging
 from openai import OpenAI
 from pathlib import Path
 from typing import Dict
@@ -12,6 +12,8 @@ from config.prompts import (
     load_intents, build_llm_intent_doc
 )
 
+logger = logging.getLogger(__name__)
+
 INTENTS = load_intents()
 LLM_INTENT_DOC = build_llm_intent_doc(INTENTS)
 
@@ -55,10 +57,15 @@ def decompose_query(user_input: str) -> dict:
 
 # ──────────────────────────────────────
 # 統一呼叫 unified_server 查詢
-def call_server(tool, args, retry=2):
+# trace_id 以 X-Trace-Id 標頭送出，server 端的 log、Server-Timing 與 /metrics 可用同一個 id 對照
+def trace_headers(trace_id):
+    return {"X-Trace-Id": trace_id} if trace_id else {}
+
+def call_server(tool, args, retry=2, trace_id=None):
     for attempt in range(retry):
         try:
-            resp = requests.get(UNIFIED_SERVER_URL, params={"type": tool, **args}, timeout=10)
+            resp = requests.get(UNIFIED_SERVER_URL, params={"type": tool, **args},
+                                headers=trace_headers(trace_id), timeout=10)
             resp.raise_for_status()
             return resp.json()
         except Exception as e:
@@ -68,6 +75,39 @@ def call_server(tool, args, retry=2):
             else:
                 return {"status": "ERROR", "data": str(e)}
 
+# 子查詢中不屬於篩選條件、需放在子查詢頂層的參數
+SUBQUERY_OPTIONS = ("fields", "group_by", "agg", "include_measurements", "page", "size")
+
+def call_server_batch(tool_calls, retry=2, trace_id=None):
+    """
+    以 POST /api/query/batch 一次送出多個 tool_call，回傳與 tool_calls 對應順序的結果清單。
+    整批失敗時退回逐一呼叫 call_server；個別子查詢失敗時也改用單筆查詢重試。
+    """
+    queries = []
+    for call in tool_calls:
+        args = call.get("args", {}) or {}
+        sub = {"type": call.get("tool", ""), "filters": {k: v for k, v in args.items() if k not in SUBQUERY_OPTIONS}}
+        sub.update({k: v for k, v in args.items() if k in SUBQUERY_OPTIONS})
+        queries.append(sub)
+    batch_url = UNIFIED_SERVER_URL.rstrip("/") + "/batch"
+    results = None
+    for attempt in range(retry):
+        try:
+            resp = requests.post(batch_url, json={"queries": queries}, headers=trace_headers(trace_id), timeout=10)
+            resp.raise_for_status()
+            results = resp.json().get("results")
+            break
+        except Exception:
+            if attempt < retry-1:
+                time.sleep(1)
+    if not results or len(results) != len(tool_calls):
+        results = [None] * len(tool_calls)
+    return [
+        result if result and result.get("status") == "ok"
+        else call_server(call.get("tool", ""), call.get("args", {}) or {}, retry=retry, trace_id=trace_id)
+        for call, result in zip(tool_calls, results)
+    ]
+
 # ──────────────────────────────────────
 # 彈性摘要各種 tool 的回傳結果（全 tool 支援）
 def summarize_tool_result(tool, tool_result):
@@ -298,17 +338,19 @@ def run_agent_smart(user_query, session_history=None, return_summary=False, max_
     yield 1, step_outputs[1]
     
     # --- 步驟 3: agent tool_call ---
+    # 同一次查詢的所有 server 呼叫共用一個 trace_id（只記在 log 與 X-Trace-Id 標頭，不顯示給使用者）
+    trace_id = uuid.uuid4().hex
     tool_call_strs = [f"tool: {call.get('tool', '')}, args: {call.get('args', {})}" for call in tool_calls]
+    logger.info("tool_calls trace_id=%s tools=%s", trace_id, [call.get("tool", "") for call in tool_calls])
     step_outputs[2] = "\n".join(tool_call_strs)
     yield 2, step_outputs[2]
 
     # --- 步驟 4: server回傳 ---
     tool_results_dict = {}
     tool_result_summaries = []
-    for call in tool_calls:
+    # 所有 tool_call 合併成一次批次查詢，共用篩選條件只在 server 端計算一次
+    for call, tool_result in zip(tool_calls, call_server_batch(tool_calls, retry=2, trace_id=trace_id)):
         tool = call.get("tool", "")
-        args = call.get("args", {}) or {}
-        tool_result = call_server(tool, args, retry=2)
         tool_results_dict[tool] = tool_result
         summary_str = summarize_tool_result(tool, tool_result)
         tool_result_summaries.append(f"【{tool}】\n{summary_str}")
@@ -20,10 +20,46 @@ else:
 
 # 從 _settings 中讀取所有設定值
 OPENAI_API_KEY = _settings.get("OPENAI_API_KEY")
+DATA_SRC = _settings.get("DATA_SRC")
 JSON_CACHE = _settings.get("JSON_CACHE")
+# ETL 輸出格式：json 或 binary（.mcpb）
+CACHE_FORMAT = _settings.get("CACHE_FORMAT", "json")
+# ETL 平行轉換的行程數（1 表示在主行程逐檔轉換）
+ETL_WORKERS = _settings.get("ETL_WORKERS", 1)
+# Cp/Cpk 群內標準差的估計方式：rbar（R-bar/d2）或 pooled（合併標準差）
+CAPABILITY_SIGMA_METHOD = _settings.get("CAPABILITY_SIGMA_METHOD", "rbar")
+# ETL 監控模式：來源檔 size/mtime 需維持不變的秒數，才視為寫入完成
+WATCH_SETTLE_SECONDS = _settings.get("WATCH_SETTLE_SECONDS", 2.0)
 MOCK_DATA_PATH = _settings.get("MOCK_DATA_PATH")
-CPK_PPK_THRESHOLD = _settings.get("CPK_PPK_THRESHOLD")
+# SPC 製程能力（Cpk/Ppk）異常的閾值
+CPK_PPK_THRESHOLD = _settings.get("CPK_PPK_THRESHOLD", 1.33)
 UNIFIED_SERVER_URL = _settings.get("UNIFIED_SERVER_URL")
+# unified_server 資料來源變動偵測間隔（秒），0 表示不自動重載
+DATA_RELOAD_INTERVAL = _settings.get("DATA_RELOAD_INTERVAL", 5)
+# json_cache 模式下，完整批次文件（含 measurements）LRU 快取的位元組上限
+DOC_CACHE_MAX_BYTES = _settings.get("DOC_CACHE_MAX_BYTES", 256 * 1024 * 1024)
+# unified_server 查詢結果快取的位元組上限
+RESPONSE_CACHE_MAX_BYTES = _settings.get("RESPONSE_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+
+# 各 MCP tool server 的資料來源資料夾
+MOCK_PRODUCTION_SUMMARY = _settings.get("MOCK_PRODUCTION_SUMMARY")
+MOCK_DOWNTIME_SUMMARY = _settings.get("MOCK_DOWNTIME_SUMMARY")
+MOCK_YIELD_SUMMARY = _settings.get("MOCK_YIELD_SUMMARY")
+MOCK_ANOMALY_TREND = _settings.get("MOCK_ANOMALY_TREND")
+MOCK_KPI_SUMMARY = _settings.get("MOCK_KPI_SUMMARY")
+MOCK_ISSUE_TRACKER = _settings.get("MOCK_ISSUE_TRACKER")
+# tool gateway：共用工作執行緒數、本機承載的 tool（None 表示全部）、轉送到其他行程的 tool 端點
+TOOL_WORKERS = _settings.get("TOOL_WORKERS", 8)
+GATEWAY_TOOLS = _settings.get("GATEWAY_TOOLS")
+TOOL_ENDPOINTS = _settings.get("TOOL_ENDPOINTS", {})
+# tool server 的 CSV 解析結果快取位元組上限（依檔案 mtime/size 自動失效）
+CSV_CACHE_MAX_BYTES = _settings.get("CSV_CACHE_MAX_BYTES", 128 * 1024 * 1024)
+# anomaly_trend 月份分區趨勢資料的存放位置（None 表示不寫檔，分區只放在記憶體），以及解析後分區的快取位元組上限
+TREND_STORE_DIR = _settings.get("TREND_STORE_DIR")
+TREND_CACHE_MAX_BYTES = _settings.get("TREND_CACHE_MAX_BYTES", 128 * 1024 * 1024)
+# spc_summary / batch_anomaly 多批次查詢：平行載入批次檔的執行緒數、已解析批次快取的位元組上限
+BATCH_LOAD_WORKERS = _settings.get("BATCH_LOAD_WORKERS", 4)
+BATCH_CACHE_MAX_BYTES = _settings.get("BATCH_CACHE_MAX_BYTES", 256 * 1024 * 1024)
 
 # ===== 新增的程式碼 =====
 # 讀取 USE_MOCK_DATA 開關，如果 json 檔中沒有這個鍵，預設為 True (使用假資料)
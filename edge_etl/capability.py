@@ -0,0 +1,134 @@
+"""
+capability.py
+
+製程能力指標（Cp、Cpk、Pp、Ppk、Ca）的 NumPy 計算，一次計算同一活頁簿的所有特性：
+- 群內標準差（Cp/Cpk）：量測值依序每 sample_size 筆為一個子群組（只取完整子群組），
+  以 R-bar/d2 或合併標準差（pooled，除以不偏常數 c4）估計；
+  沒有子群組大小（sample_size 空白或小於 2）或不足一個子群組時，以移動全距 MR-bar/d2(2) 估計。
+- 整體標準差（Pp/Ppk）：全部量測值的樣本標準差（n-1）。
+- Ca = (平均 - 規格中心) / (公差 / 2)，帶正負號（正值偏上限、負值偏下限）。
+
+量測值少於 2 筆、缺 usl/lsl、usl 不大於 lsl 或標準差為 0 時，對應指標為 None。
+"""
+
+import math
+
+import numpy as np
+
+# 管制圖常數 d2（子群組大小 2~25），超過時 R-bar 估計不適用，改用 pooled
+D2 = {
+    2: 1.128, 3: 1.693, 4: 2.059, 5: 2.326, 6: 2.534, 7: 2.704, 8: 2.847, 9: 2.970, 10: 3.078,
+    11: 3.173, 12: 3.258, 13: 3.336, 14: 3.407, 15: 3.472, 16: 3.532, 17: 3.588, 18: 3.640,
+    19: 3.689, 20: 3.735, 21: 3.778, 22: 3.819, 23: 3.858, 24: 3.895, 25: 3.931,
+}
+
+METHODS = ("rbar", "pooled")
+
+def c4(n):
+    """標準差的不偏常數 c4(n)"""
+    return math.sqrt(2.0 / (n - 1)) * math.exp(math.lgamma(n / 2.0) - math.lgamma((n - 1) / 2.0))
+
+def _index(numerator, sigma, valid):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(valid & (sigma > 0), numerator / sigma, np.nan)
+
+def _subgroup_sigma(values, ids, counts, sizes, method):
+    """
+    各特性以 sizes 為子群組大小的群內標準差，無法以子群組估計的特性為 NaN。
+    values/ids 為所有特性串接後的量測值與所屬特性索引（同一特性連續排列）。
+    """
+    k = len(counts)
+    sigma = np.full(k, np.nan)
+    n = np.where(sizes >= 2, sizes, 0)
+    groups = np.where(n > 0, counts // np.maximum(n, 1), 0)
+    if not groups.any():
+        return sigma
+    # 每個量測值在所屬特性中的位置；只保留完整子群組內的值，子群組在串接後的陣列中連續排列
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    pos = np.arange(len(values)) - starts[ids]
+    keep = pos < (groups * n)[ids]
+    kept, kept_ids = values[keep], ids[keep]
+    n_per = n[kept_ids]
+    first = np.flatnonzero(pos[keep] % np.maximum(n_per, 1) == 0)
+    sg_feature = kept_ids[first]
+    sg_size = n[sg_feature]
+
+    rbar_ok = (groups > 0) & (n <= max(D2))
+    pooled = np.full(k, method == "pooled") | ~rbar_ok
+    if (~pooled & (groups > 0)).any():
+        ranges = np.maximum.reduceat(kept, first) - np.minimum.reduceat(kept, first)
+        rbar = np.bincount(sg_feature, weights=ranges, minlength=k) / np.maximum(groups, 1)
+        d2 = np.array([D2.get(int(s), np.nan) for s in n])
+        use = ~pooled & (groups > 0)
+        sigma[use] = rbar[use] / d2[use]
+    if (pooled & (groups > 0)).any():
+        sg_mean = np.add.reduceat(kept, first) / sg_size
+        sg_index = np.repeat(np.arange(len(first)), sg_size)
+        ss = np.bincount(sg_feature, weights=np.bincount(sg_index, weights=(kept - sg_mean[sg_index]) ** 2),
+                         minlength=k)
+        dof = groups * (n - 1)
+        use = pooled & (groups > 0)
+        unbias = np.array([c4(d + 1) if u else 1.0 for d, u in zip(dof.tolist(), use.tolist())])
+        sigma[use] = np.sqrt(ss[use] / dof[use]) / unbias[use]
+    return sigma
+
+def _moving_range_sigma(values, ids, counts):
+    """各特性相鄰量測值的移動全距 MR-bar/d2(2)，不跨特性"""
+    k = len(counts)
+    same = ids[1:] == ids[:-1]
+    mr = np.abs(np.diff(values))[same]
+    total = np.bincount(ids[1:][same], weights=mr, minlength=k)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(counts >= 2, total / (counts - 1) / D2[2], np.nan)
+
+def _round(x):
+    x = float(x)
+    return round(x, 4) if math.isfinite(x) else None
+
+def capability_indices(samples, usl, lsl, sample_size, method="rbar"):
+    """
+    一次計算多個特性的製程能力指標。
+    samples 為各特性的量測值（依量測順序），usl/lsl/sample_size 為對應的規格上下限與子群組大小（可為 None）；
+    method 為群內標準差的估計方式：rbar（R-bar/d2，子群組大於 25 時改用 pooled）或 pooled。
+    回傳 list of dict（cp、cpk、pp、ppk、ca，四捨五入到小數 4 位），順序與 samples 相同。
+    """
+    if method not in METHODS:
+        raise ValueError(f"unknown sigma method: {method}")
+    k = len(samples)
+    if k == 0:
+        return []
+    arrays = [np.asarray(s, dtype=float) for s in samples]
+    arrays = [a[np.isfinite(a)] for a in arrays]
+    counts = np.array([len(a) for a in arrays], dtype=np.int64)
+    values = np.concatenate(arrays) if counts.sum() else np.empty(0)
+    ids = np.repeat(np.arange(k), counts)
+    usl = np.array([np.nan if v is None else v for v in usl], dtype=float)
+    lsl = np.array([np.nan if v is None else v for v in lsl], dtype=float)
+    sizes = np.array([0 if v is None else v for v in sample_size], dtype=np.int64)
+
+    # 整體：平均與樣本標準差
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = np.bincount(ids, weights=values, minlength=k) / counts
+        ss = np.bincount(ids, weights=(values - mean[ids]) ** 2, minlength=k) if len(values) else np.zeros(k)
+        sigma_overall = np.sqrt(ss / (counts - 1))
+
+    # 群內：子群組估計，不可行時以移動全距估計
+    sigma_within = _subgroup_sigma(values, ids, counts, sizes, method)
+    missing = np.isnan(sigma_within)
+    if missing.any():
+        sigma_within[missing] = _moving_range_sigma(values, ids, counts)[missing]
+
+    valid = (counts >= 2) & (usl > lsl)
+    tolerance = usl - lsl
+    nearest = np.minimum(usl - mean, mean - lsl)
+    cp = _index(tolerance, 6 * sigma_within, valid)
+    cpk = _index(nearest, 3 * sigma_within, valid)
+    pp = _index(tolerance, 6 * sigma_overall, valid)
+    ppk = _index(nearest, 3 * sigma_overall, valid)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ca = np.where(valid, (mean - (usl + lsl) / 2) / (tolerance / 2), np.nan)
+
+    return [
+        {"cp": _round(a), "cpk": _round(b), "pp": _round(c), "ppk": _round(d), "ca": _round(e)}
+        for a, b, c, d, e in zip(cp, cpk, pp, ppk, ca)
+    ]
@@ -0,0 +1,189 @@
+"""
+change_watch.py
+
+ETL 監控模式的變動偵測：
+- EtlManifest：記錄已處理的 Excel（路徑、size、mtime、內容 sha256 與轉換結果），存成輸出資料夾的
+  .etl_manifest（JSON 內容），重新啟動後仍有效。size/mtime 與紀錄相同視為未變動，不同時才計算 hash；
+  內容相同（只有 mtime 改變）只更新紀錄，不重新轉換。轉換失敗的檔案也會記錄，檔案變動後才再試。
+- ChangeWatcher：有安裝 watchdog 時由檔案系統事件觸發，並每 interval 秒完整掃描一次補漏；未安裝時只輪詢。
+  檔案的 size/mtime 需維持 settle 秒不變才視為寫入完成，避免讀到複製到一半的檔案。
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+import threading
+import time
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # watchdog 為選用套件，未安裝時只以輪詢偵測
+    FileSystemEventHandler = object
+    Observer = None
+
+# 不用 .json 副檔名，避免被 json_cache 的批次掃描（*.json）當成批次檔
+MANIFEST_NAME = ".etl_manifest"
+
+def is_source(path):
+    # Excel 開啟檔案時產生的 ~$ 暫存檔不處理
+    return path.name.endswith(".xlsx") and not path.name.startswith("~$")
+
+def file_signature(st):
+    return (st.st_mtime_ns, st.st_size)
+
+def file_digest(path, chunk_size=1024 * 1024):
+    """檔案內容的 sha256（分塊讀取）"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+class EtlManifest:
+    """已處理來源檔的紀錄：{絕對路徑: {size, mtime_ns, sha256, status, etl_time}}"""
+
+    def __init__(self, dst):
+        self.path = Path(dst) / MANIFEST_NAME
+        self.dirty = False
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                self.entries = json.load(f).get("files", {})
+        except (OSError, ValueError, AttributeError):
+            # 沒有或損毀的 manifest 視為全部未處理
+            self.entries = {}
+
+    def is_current(self, path, st):
+        """size/mtime 與紀錄相同"""
+        entry = self.entries.get(str(path))
+        return entry is not None and (entry.get("mtime_ns"), entry.get("size")) == file_signature(st)
+
+    def get(self, path):
+        return self.entries.get(str(path))
+
+    def record(self, path, st, digest, status):
+        self.entries[str(path)] = {
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "sha256": digest,
+            "status": status,
+            "etl_time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        self.dirty = True
+
+    def forget(self, path):
+        if self.entries.pop(str(path), None) is not None:
+            self.dirty = True
+
+    def save(self):
+        """有變動時寫回（先寫暫存檔再 os.replace，中斷時不會留下寫一半的 manifest）"""
+        if not self.dirty:
+            return
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"files": self.entries}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+
+class _SourceEventHandler(FileSystemEventHandler):
+    def __init__(self, watcher):
+        self.watcher = watcher
+
+    def on_any_event(self, event):
+        if event.is_directory:
+            return
+        for p in (event.src_path, getattr(event, "dest_path", "")):
+            if p and is_source(Path(os.fsdecode(p))):
+                self.watcher.notify(os.fsdecode(p))
+
+class ChangeWatcher:
+    """
+    偵測 src 資料夾中新增或變動的 Excel。poll() 回傳寫入完成且內容與 manifest 不同的檔案，
+    wait() 等到下一個檔案事件、debounce 到期或下一次完整掃描。
+    """
+
+    def __init__(self, src, manifest, interval=300, settle=2.0):
+        self.src = Path(src).resolve()
+        self.manifest = manifest
+        self.interval = interval
+        self.settle = settle
+        self._pending = {}   # 路徑 -> (size/mtime, 首次看到這組 size/mtime 的時間)
+        self._dirty = set()  # 檔案事件通知、尚未檢查的路徑
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._next_scan = 0.0
+        self._observer = None
+
+    def start(self):
+        """啟動檔案事件監聽，回傳是否啟用（未安裝 watchdog 時為 False，只輪詢）"""
+        if Observer is None:
+            return False
+        observer = Observer()
+        observer.schedule(_SourceEventHandler(self), str(self.src), recursive=False)
+        observer.start()
+        self._observer = observer
+        return True
+
+    def stop(self):
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+            self._observer = None
+
+    def notify(self, path):
+        with self._lock:
+            self._dirty.add(Path(path).resolve())
+        self._wake.set()
+
+    def _candidates(self, now):
+        # 先清除喚醒旗標再取出通知：掃描期間才到的事件會重新設定旗標，下一次 wait() 立即返回
+        self._wake.clear()
+        with self._lock:
+            paths = set(self._dirty)
+            self._dirty.clear()
+        if now >= self._next_scan:
+            # 完整掃描：目前的來源檔，加上 manifest 中屬於 src 的紀錄（檔案已刪除時移除紀錄）
+            self._next_scan = now + self.interval
+            paths.update(p.resolve() for p in self.src.glob("*.xlsx") if is_source(p))
+            paths.update(Path(k) for k in self.manifest.entries if Path(k).parent == self.src)
+        paths.update(self._pending)
+        return paths
+
+    def poll(self):
+        """回傳已寫入完成且內容有變動的 [(路徑, stat, sha256)]"""
+        now = time.monotonic()
+        ready = []
+        for path in sorted(self._candidates(now)):
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                self._pending.pop(path, None)
+                self.manifest.forget(path)
+                continue
+            if self.manifest.is_current(path, st):
+                self._pending.pop(path, None)
+                continue
+            signature = file_signature(st)
+            seen = self._pending.get(path)
+            if seen is None or seen[0] != signature:
+                # 新出現或仍在寫入：重新開始 debounce
+                self._pending[path] = (signature, now)
+                continue
+            if now - seen[1] < self.settle:
+                continue
+            del self._pending[path]
+            digest = file_digest(path)
+            entry = self.manifest.get(path)
+            if entry is not None and entry.get("sha256") == digest:
+                # 內容未變（例如重新複製同一檔案），只更新 size/mtime
+                self.manifest.record(path, st, digest, entry.get("status"))
+                continue
+            ready.append((path, st, digest))
+        return ready
+
+    def wait(self):
+        timeout = self._next_scan - time.monotonic()
+        if self._pending:
+            timeout = min(timeout, self.settle)
+        self._wake.wait(max(timeout, 0))
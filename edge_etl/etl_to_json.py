@@ -4,15 +4,32 @@ import json
 import re
 import math
 import config.setting as setting
+from edge_etl.capability import capability_indices
+from edge_etl.change_watch import ChangeWatcher, EtlManifest
+from edge_etl.xlsx_reader import XlsxReader
+from mcp_server.batch_format import SUFFIX as BINARY_SUFFIX, write_batch_binary
 from pathlib import Path
+import numpy as np
 import pandas as pd
 import argparse
-from datetime import datetime
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date, datetime
+import tempfile
 import time
 
 # 讀取設定
 DEFAULT_SRC = setting.DATA_SRC
 DEFAULT_DST = setting.JSON_CACHE
+# 輸出格式：json（縮排 JSON + 摘要檔）或 binary（.mcpb，量測值存成型別陣列，見 mcp_server/batch_format.py）
+DEFAULT_FORMAT = setting.CACHE_FORMAT
+# 平行轉換的行程數（--workers）
+DEFAULT_WORKERS = setting.ETL_WORKERS
+# Cp/Cpk 的群內標準差估計方式（見 capability.py）
+SIGMA_METHOD = setting.CAPABILITY_SIGMA_METHOD
+# 監控模式的 debounce 秒數（--settle）
+DEFAULT_SETTLE = setting.WATCH_SETTLE_SECONDS
 
 def safe_str(x):
     if pd.isna(x):
@@ -36,6 +53,10 @@ def extract_tail_number(filename):
     match = re.search(r'(\d+)(?!.*\d)', filename)
     return match.group(1) if match else filename
 
+def output_key(excel_path):
+    """Excel 對應的批次 key（meta.machine_id，輸出檔名 {key}.json / {key}.mcpb）"""
+    return extract_tail_number(Path(excel_path).stem)
+
 def is_number(x):
     try:
         float(x)
@@ -43,37 +64,111 @@ def is_number(x):
     except Exception:
         return False
 
+# 量測時間中的日期（2025-06-01、2025/6/1 等）與檔名/資料夾名稱中的 YYYYMMDD
+DATE_RE = re.compile(r"(\d{4})[-/.](\d{1,2})[-/.](\d{1,2})")
+COMPACT_DATE_RE = re.compile(r"(?<!\d)(\d{4})(\d{2})(\d{2})(?!\d)")
+
+def parse_date(text, pattern=DATE_RE):
+    """從文字中取出第一個日期，回傳 YYYY-MM-DD；沒有或不是合法日期時回傳 None"""
+    m = pattern.search(text)
+    if not m:
+        return None
+    try:
+        return date(int(m.group(1)), int(m.group(2)), int(m.group(3))).isoformat()
+    except ValueError:
+        return None
+
+def production_date(features, excel_path):
+    """批次的生產日期：量測時間中最早的日期；量測時間沒有日期時，取檔名或所在資料夾名稱中的日期"""
+    timestamps = {m["timestamp"] for feat in features for m in feat["measurements"] if m["timestamp"]}
+    dates = {parse_date(t) for t in timestamps} - {None}
+    if dates:
+        return min(dates)
+    for name in (excel_path.stem, excel_path.parent.name):
+        found = parse_date(name) or parse_date(name, COMPACT_DATE_RE)
+        if found:
+            return found
+    return None
+
 def nowstr():
     return datetime.now().strftime("%Y-%m-%dT%H:%M:%S%z")
 
-def calc_cpk_ppk(measurements, usl, lsl):
-    vals = [x["value"] for x in measurements if is_number(x["value"])]
-    if len(vals) < 2 or usl is None or lsl is None:
-        return None, None
-    mean = sum(vals) / len(vals)
-    std = math.sqrt(sum((v-mean)**2 for v in vals) / (len(vals)-1))
-    if std == 0:
-        return None, None
-    cpk = min((usl-mean)/(3*std), (mean-lsl)/(3*std))
-    ppk = cpk  # 假設只計算一次樣本，與 Cpk 相同（如要嚴謹請補上群內與總體標準差）
-    return round(cpk, 4), round(ppk, 4)
+def _float_or_none(x):
+    try:
+        return float(x)
+    except Exception:
+        return None
+
+def numeric_column(values):
+    """
+    將一欄轉成 float 陣列，可轉換的規則與 is_number / float() 相同。
+    回傳 (數值陣列, 可轉換遮罩)，無法轉換的位置為 NaN；數值型別的欄直接轉換，混有文字的欄才逐值嘗試。
+    """
+    if values.dtype.kind in "biuf":
+        return values.astype(float), np.ones(len(values), dtype=bool)
+    floats = [_float_or_none(x) for x in values]
+    ok = np.array([f is not None for f in floats], dtype=bool)
+    return np.array([np.nan if f is None else f for f in floats], dtype=float), ok
+
+def extract_measurements(body, usl, lsl):
+    """
+    以欄為單位取出特性分頁的量測值，回傳 (measurements, abnormal_detail, 量測值陣列)：
+    seq（A 欄）不是數字或空白、量測值（B 欄）空白的列略過；時間（C 欄）空白時沿用前一筆量測的時間；
+    超出 usl/lsl 的量測標記 out_of_spec。
+    """
+    data = body.to_numpy()
+    _, seq_ok = numeric_column(data[:, 0])
+    rows = np.flatnonzero(seq_ok & ~pd.isna(data[:, 0]))
+    # seq 為小數字串、inf 等無法轉成整數時丟出例外（該檔 ETL 失敗）
+    seqs = [int(x) for x in data[rows, 0]]
+    raw_values = data[rows, 1]
+    values, value_ok = numeric_column(raw_values)
+    keep = value_ok & ~pd.isna(raw_values)
+    rows, values = rows[keep], values[keep]
+    seqs = [s for s, k in zip(seqs, keep.tolist()) if k]
+
+    # 時間欄：有值的列更新目前時段，空白的列補上前一個時段（第一筆之前沒有時段則為 None）
+    if data.shape[1] > 2:
+        raw_times = data[rows, 2]
+        texts = [str(x) for x in raw_times]
+        present = ~pd.isna(raw_times) & np.array([bool(t.strip()) for t in texts], dtype=bool)
+        last = np.maximum.accumulate(np.where(present, np.arange(len(rows)), -1)) if len(rows) else present
+        timestamps = [texts[i] if i >= 0 else None for i in last.tolist()]
+    else:
+        timestamps = [None] * len(rows)
+
+    above = values > usl
+    out_of_spec = above | (values < lsl)
+    measurements = [
+        {"seq": seq, "value": value, "timestamp": timestamp, "out_of_spec": out}
+        for seq, value, timestamp, out in zip(seqs, values.tolist(), timestamps, out_of_spec.tolist())
+    ]
+    abnormal_detail = [
+        f"第{seqs[i]}筆量測值{'超上限' if above[i] else '超下限'}" for i in np.flatnonzero(out_of_spec).tolist()
+    ]
+    return measurements, abnormal_detail, values
+
+# Summary 分頁的 meta 欄（G 欄，第 1~5 列依序為 vendor、批號、機台、品名、料號）與特性分頁用到的欄數（A~D）
+META_COLUMN = 7
+FEATURE_COLUMNS = 4
 
 def etl_inspection_excel(excel_path: Path):
-    df = pd.read_excel(excel_path, header=None, engine="openpyxl")
-    # === meta資料 ===
-    vendor = safe_str(df.iloc[0, 6]) if df.shape[0] > 0 and df.shape[1] > 6 else None
-    batch_id_in_file = safe_str(df.iloc[1, 6]) if df.shape[0] > 1 and df.shape[1] > 6 else None
-    machine_id_in_file = safe_str(df.iloc[2, 6]) if df.shape[0] > 2 and df.shape[1] > 6 else None
-    product_name = safe_str(df.iloc[3, 6]) if df.shape[0] > 3 and df.shape[1] > 6 else None
-    part_no = safe_str(df.iloc[4, 6]) if df.shape[0] > 4 and df.shape[1] > 6 else None
+    # 活頁簿只開啟一次，meta 與各特性分頁都從同一個 reader 串流讀取，只轉換用到的欄位
+    with XlsxReader(excel_path) as book:
+        return _etl_workbook(book, excel_path)
+
+def _etl_workbook(book, excel_path):
+    # === meta資料（第一個分頁的 G 欄）===
+    meta = book.read_frame(book.sheet_names[0], min_col=META_COLUMN, max_col=META_COLUMN)
+    meta_values = [safe_str(v) for v in meta.iloc[:5, 0]] if meta.shape[1] > 0 else []
+    vendor, batch_id_in_file, machine_id_in_file, product_name, part_no = (meta_values + [None] * 5)[:5]
 
     # 找所有特性分頁（跳過Summary）
-    xl = pd.ExcelFile(excel_path)
-    features = []
-    for sheet in xl.sheet_names:
+    parsed = []
+    for sheet in book.sheet_names:
         if sheet.lower() == "summary":
             continue
-        body = xl.parse(sheet)
+        body = book.read_frame(sheet, header=0, max_col=FEATURE_COLUMNS)
         # 取得欄位位置
         try:
             name = str(body.iloc[0, 0])
@@ -85,35 +180,17 @@ def etl_inspection_excel(excel_path: Path):
         except Exception:
             continue
         # 抓所有量測數值
-        measurements = []
-        abnormal_detail = []
-        last_timestamp = None  # 新增：記錄上一次的時間
-
-        for i, row in body.iterrows():
-            if not is_number(row.iloc[0]):
-                continue
-            seq = int(row.iloc[0])
-            value = float(row.iloc[1]) if is_number(row.iloc[1]) and not pd.isna(row.iloc[1]) else None
-            if value is None:
-                continue  # 直接跳過這筆沒有數值的量測資料
-
-            # 處理timestamp欄，支援自動補上前一個時段
-            raw_time = row.iloc[2] if row.shape[0] > 2 else None
-            if pd.notna(raw_time) and str(raw_time).strip():
-                timestamp = str(raw_time)
-                last_timestamp = timestamp  # 更新目前的時段
-            else:
-                timestamp = last_timestamp  # 補上前一個時段
-
-            out_of_spec = False
-            if value > usl or value < lsl:
-                out_of_spec = True
-                abnormal_detail.append(f"第{seq}筆量測值{'超上限' if value > usl else '超下限'}")
-            measurements.append({
-                "seq": seq, "value": value, "timestamp": timestamp, "out_of_spec": out_of_spec
-            })
-
-        cpk, ppk = calc_cpk_ppk(measurements, usl, lsl)
+        measurements, abnormal_detail, values = extract_measurements(body, usl, lsl)
+        parsed.append((name, spec, usl, lsl, unit, sample_size, measurements, abnormal_detail, values))
+
+    # 所有特性的製程能力指標一次計算（群內標準差以 sample_size 為子群組大小）
+    indices = capability_indices(
+        [p[8] for p in parsed], [p[2] for p in parsed], [p[3] for p in parsed], [p[5] for p in parsed],
+        SIGMA_METHOD,
+    )
+    features = []
+    for (name, spec, usl, lsl, unit, sample_size, measurements, abnormal_detail, _), cap in zip(parsed, indices):
+        cpk, ppk = cap["cpk"], cap["ppk"]
         cpk_alert = cpk is not None and cpk < 1.33
         ppk_alert = ppk is not None and ppk < 1.33
         features.append({
@@ -124,8 +201,11 @@ def etl_inspection_excel(excel_path: Path):
             "unit": unit,
             "sample_size": sample_size,
             "measurements": measurements,
+            "cp": cap["cp"],
             "cpk": cpk,
+            "pp": cap["pp"],
             "ppk": ppk,
+            "ca": cap["ca"],
             "cpk_alert": cpk_alert,
             "cpk_reason": "Cpk低於1.33" if cpk_alert else "",
             "ppk_alert": ppk_alert,
@@ -135,8 +215,9 @@ def etl_inspection_excel(excel_path: Path):
 
     return {
         "meta": {
-            "machine_id": extract_tail_number(excel_path.stem),
-            "batch_id": f"{batch_id_in_file}_{extract_tail_number(excel_path.stem)}",
+            "machine_id": output_key(excel_path),
+            "batch_id": f"{batch_id_in_file}_{output_key(excel_path)}",
+            "date": production_date(features, excel_path),
             "source_file": os.path.basename(excel_path),
             "etl_time": nowstr()
         },
@@ -149,56 +230,213 @@ def etl_inspection_excel(excel_path: Path):
         "etl_log": {"status": "success", "msg": ""}
     }
 
-def batch_etl(src_dir, dst_dir):
+# 批次摘要檔（不含 measurements）的子資料夾，spc_summary / batch_anomaly / unified_server 直接讀取
+SUMMARY_DIR = "summary"
+
+def build_batch_summary(result):
+    """
+    批次摘要：meta/summary 與各特性的 Cp/Cpk/Pp/Ppk/Ca、警示與異常明細（不含量測值），以及異常特性數。
+    alert_features（有警示的特性名稱）由讀取端直接使用（見 dataset_store.alert_features），不再逐項判斷。
+    """
+    features = [{k: v for k, v in feat.items() if k != "measurements"} for feat in result["features"]]
+    alert_features = [
+        f["feature_name"] for f in features
+        if f.get("cpk_alert") or f.get("ppk_alert") or f.get("abnormal_detail")
+    ]
+    return {
+        "meta": result["meta"],
+        "summary": result["summary"],
+        "features": features,
+        "abnormal_count": len(alert_features),
+        "alert_features": alert_features,
+        "etl_log": result["etl_log"],
+    }
+
+def write_json_atomic(path, obj):
+    """
+    先寫到同資料夾下唯一名稱的暫存檔再 os.replace：讀取端（unified_server 熱重載、catalog）不會讀到寫一半的檔案，
+    多個行程同時寫入時也不會互相覆寫暫存檔。
+    """
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=path.name + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(obj, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+def write_batch(result, dst, fmt="json"):
+    """
+    依 fmt 寫出批次檔，回傳輸出路徑。json：批次 JSON 與對應的摘要檔；binary：單一 .mcpb 檔。
+    同一批次先前以另一種格式輸出的檔案會一併移除，避免讀取端讀到舊資料。
+    """
+    result = nan_to_none(result)
+    key = result['meta']['machine_id']
+    if fmt == "binary":
+        out_path = dst / f"{key}{BINARY_SUFFIX}"
+        write_batch_binary(result, out_path)
+        (dst / f"{key}.json").unlink(missing_ok=True)
+        (dst / SUMMARY_DIR / f"{key}.json").unlink(missing_ok=True)
+        return out_path
+    out_path = dst / f"{key}.json"
+    (dst / f"{key}{BINARY_SUFFIX}").unlink(missing_ok=True)
+    write_json_atomic(out_path, result)
+    # 摘要檔記錄批次檔的 size/mtime，批次檔之後被改寫時讀取端會改讀完整 JSON
+    st = out_path.stat()
+    summary = build_batch_summary(result)
+    summary["batch_file"] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+    summary_dir = dst / SUMMARY_DIR
+    summary_dir.mkdir(exist_ok=True)
+    write_json_atomic(summary_dir / out_path.name, summary)
+    return out_path
+
+def convert_file(file, dst, fmt="json"):
+    """轉換單一 Excel 並寫出批次檔，回傳 (輸出檔名, 錯誤訊息)；失敗不丟例外，不影響其他檔案"""
+    try:
+        result = etl_inspection_excel(file)
+        return write_batch(result, dst, fmt).name, None
+    except Exception as e:
+        return None, str(e)
+
+def _convert_isolated(file, dst, fmt="json"):
+    """在單獨的子行程轉換一個檔案；子行程異常結束時只回傳該檔失敗"""
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        try:
+            return pool.submit(convert_file, file, dst, fmt).result()
+        except Exception as e:
+            return None, f"worker failed: {e!r}"
+
+def iter_convert(files, dst, fmt="json", workers=1):
+    """
+    逐檔轉換，依 files 順序產生 (file, 輸出檔名, 錯誤訊息)。
+    workers > 1 時以行程池平行轉換：同時送出的工作最多 workers * 2 個，
+    批次結果在子行程直接寫檔，不傳回主行程，記憶體用量不隨檔案數增加。
+    輸出 key 相同的檔案（寫入同一個批次檔）不會同時轉換：前一個檔案完成後才送出下一個，
+    寫入順序與 workers=1 相同（files 中較後面的檔案為最終結果）。
+    子行程異常結束（例如記憶體不足）會使整個行程池損壞且無法得知是哪個檔案造成，
+    此時已送出的檔案改為逐一在單獨的子行程重新轉換，只有造成異常的檔案記為失敗，其餘檔案以新的行程池繼續。
+    """
+    if workers <= 1:
+        for file in files:
+            yield (file, *convert_file(file, dst, fmt))
+        return
+    window = workers * 2
+    todo = deque(files)
+    pending = deque()
+    inflight = Counter()  # 已送出、尚未取得結果的輸出 key
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        while True:
+            broken = False
+            while len(pending) < window and todo:
+                file = todo[0]
+                key = output_key(file)
+                if inflight[key]:
+                    # 同一個批次檔的前一個檔案尚未完成，等它完成後再送出
+                    break
+                todo.popleft()
+                inflight[key] += 1
+                try:
+                    pending.append((file, key, pool.submit(convert_file, file, dst, fmt)))
+                except BrokenProcessPool:
+                    pending.append((file, key, None))
+                    broken = True
+                    break
+            if not pending:
+                return
+            if not broken:
+                file, key, future = pending[0]
+                try:
+                    result = future.result()
+                except BrokenProcessPool:
+                    broken = True
+                except Exception as e:
+                    pending.popleft()
+                    inflight[key] -= 1
+                    yield file, None, f"worker failed: {e!r}"
+                else:
+                    pending.popleft()
+                    inflight[key] -= 1
+                    yield (file, *result)
+            if broken:
+                pool.shutdown(wait=True, cancel_futures=True)
+                inflight.clear()
+                while pending:
+                    file, _, future = pending.popleft()
+                    if future is not None and future.done() and not future.cancelled() and future.exception() is None:
+                        yield (file, *future.result())
+                    else:
+                        yield (file, *_convert_isolated(file, dst, fmt))
+                pool = ProcessPoolExecutor(max_workers=workers)
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+def run_etl(files, dst, fmt="json", workers=1):
+    """轉換 files 並輸出每檔結果與結束摘要（檔案數、失敗數、每秒檔案數），回傳成功轉換的檔案清單"""
+    start = time.perf_counter()
+    done, failed = [], 0
+    for file, out_name, error in iter_convert(files, dst, fmt, workers):
+        if error is None:
+            print(f"檔案 {file.name} → {out_name} 產生成功")
+            done.append(file)
+        else:
+            print(f"處理 {file.name} 失敗: {error}")
+            failed += 1
+    elapsed = time.perf_counter() - start
+    rate = len(files) / elapsed if elapsed > 0 else 0.0
+    print(f"ETL完成：成功 {len(done)} 筆、失敗 {failed} 筆，耗時 {elapsed:.2f} 秒（{rate:.2f} 檔/秒，{max(workers, 1)} 個行程）")
+    return done
+
+def batch_etl(src_dir, dst_dir, fmt="json", workers=1):
     src = Path(src_dir)
     dst = Path(dst_dir)
     dst.mkdir(parents=True, exist_ok=True)
     files = list(src.glob("*.xlsx"))
     print(f"共偵測到 {len(files)} 筆 Excel 檔案，開始ETL...")
-    for file in files:
-        try:
-            result = etl_inspection_excel(file)
-            out_path = dst / f"{result['meta']['machine_id']}.json"
-            with open(out_path, "w", encoding="utf-8") as f:
-                json.dump(nan_to_none(result), f, ensure_ascii=False, indent=2)
-            print(f"檔案 {file.name} → {out_path.name} 產生成功")
-        except Exception as e:
-            print(f"處理 {file.name} 失敗: {e}")
+    run_etl(files, dst, fmt, workers)
 
-def watch_etl(src_dir, dst_dir, interval=300):
+def watch_etl(src_dir, dst_dir, interval=300, fmt="json", workers=1, settle=DEFAULT_SETTLE):
+    """
+    持續監控 src_dir，只轉換新增或內容變動的 Excel（見 change_watch.py）。
+    處理結果記錄在 dst_dir 的 manifest，重新啟動後未變動的檔案不會重新轉換。
+    """
     src = Path(src_dir)
     dst = Path(dst_dir)
     dst.mkdir(parents=True, exist_ok=True)
-    已處理 = set(f.stem for f in dst.glob("*.json"))
-    print(f"進入監控模式，每 {interval} 秒自動同步 Excel → JSON")
-    while True:
-        filelist = list(src.glob("*.xlsx"))
-        新檔案 = [f for f in filelist if f.stem not in 已處理]
-        if 新檔案:
-            print(f"偵測到 {len(新檔案)} 筆新檔案，執行ETL...")
-        for file in 新檔案:
-            try:
-                result = etl_inspection_excel(file)
-                out_path = dst / f"{result['meta']['machine_id']}.json"
-                with open(out_path, "w", encoding="utf-8") as f:
-                    json.dump(nan_to_none(result), f, ensure_ascii=False, indent=2)
-                print(f"檔案 {file.name} → {out_path.name} 產生成功")
-                已處理.add(file.stem)
-            except Exception as e:
-                print(f"處理 {file.name} 失敗: {e}")
-        time.sleep(interval)
+    manifest = EtlManifest(dst)
+    watcher = ChangeWatcher(src, manifest, interval, settle)
+    if watcher.start():
+        print(f"進入監控模式（檔案事件觸發，每 {interval} 秒完整掃描補漏），自動同步 Excel → {fmt}")
+    else:
+        print(f"進入監控模式（未安裝 watchdog，每 {interval} 秒輪詢），自動同步 Excel → {fmt}")
+    try:
+        while True:
+            ready = watcher.poll()
+            if ready:
+                print(f"偵測到 {len(ready)} 筆新增或變動的檔案，執行ETL...")
+                done = set(run_etl([path for path, _, _ in ready], dst, fmt, workers))
+                for path, st, digest in ready:
+                    manifest.record(path, st, digest, "success" if path in done else "failed")
+            manifest.save()
+            watcher.wait()
+    finally:
+        watcher.stop()
 
 def main():
     parser = argparse.ArgumentParser(description="最嚴謹ETL Excel→JSON for MCP")
     parser.add_argument("--src", type=str, default=DEFAULT_SRC, help="來源 Excel 資料夾")
     parser.add_argument("--dst", type=str, default=DEFAULT_DST, help="輸出 JSON 快取資料夾")
     parser.add_argument("--watch", action="store_true", help="持續監控模式")
-    parser.add_argument("--interval", type=int, default=300, help="監控間隔秒數 (預設300秒)")
+    parser.add_argument("--interval", type=int, default=300, help="監控完整掃描間隔秒數 (預設300秒)")
+    parser.add_argument("--settle", type=float, default=DEFAULT_SETTLE, help="檔案需維持不變的秒數才轉換 (預設2秒)")
+    parser.add_argument("--format", choices=["json", "binary"], default=DEFAULT_FORMAT, help="輸出格式 (預設json)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="平行轉換的行程數 (預設1)")
     args = parser.parse_args()
     if args.watch:
-        watch_etl(args.src, args.dst, args.interval)
+        watch_etl(args.src, args.dst, args.interval, args.format, args.workers, args.settle)
     else:
-        batch_etl(args.src, args.dst)
+        batch_etl(args.src, args.dst, args.format, args.workers)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,84 @@
+"""
+xlsx_reader.py
+
+ETL 用的活頁簿讀取器：活頁簿以 openpyxl 唯讀模式（read_only、data_only）只開啟一次，
+shared strings 與樣式由 openpyxl 在開啟時解析一次，各分頁以 iter_rows 逐列串流讀取，只轉換指定欄位範圍內的儲存格。
+
+儲存格值的轉換（空白、錯誤值、整數值）、尾端空白列的裁切與欄寬同 pandas 的 openpyxl reader，
+再交由 pandas 的 TextParser（pd.read_excel 內部使用的同一個解析器）判斷型別，
+read_frame() 的結果與 pd.read_excel 讀取同一範圍的 DataFrame 一致（見 tests/test_xlsx_reader.py）。
+"""
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.cell.cell import TYPE_ERROR, TYPE_NUMERIC
+from pandas.errors import EmptyDataError
+from pandas.io.parsers import TextParser
+
+def _convert_cell(cell):
+    # 轉換規則同 pandas 的 openpyxl reader：空白為 ""、錯誤值為 NaN、整數值的數字轉為 int
+    value = cell.value
+    if value is None:
+        return ""
+    if cell.data_type == TYPE_ERROR:
+        return np.nan
+    if cell.data_type == TYPE_NUMERIC:
+        as_int = int(value)
+        return as_int if as_int == value else float(value)
+    return value
+
+class XlsxReader:
+    """
+    以 with XlsxReader(path) as book: 使用。sheet_names 為工作表名稱（不含圖表頁），
+    read_frame() 讀取指定分頁的欄位範圍。
+    """
+
+    def __init__(self, path):
+        self._book = load_workbook(path, read_only=True, data_only=True, keep_links=False)
+        # 只列工作表（圖表頁不算，與 pd.ExcelFile.sheet_names 相同）
+        self.sheet_names = [ws.title for ws in self._book.worksheets]
+
+    def close(self):
+        self._book.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def iter_rows(self, sheet, min_col=1, max_col=None):
+        """
+        逐列產生 (該列最後一個有值儲存格的欄號（整列空白為 0）, min_col~max_col 欄轉換後的值)；
+        值為 list，未填的儲存格為 ""，範圍外的儲存格不做轉換。
+        """
+        ws = self._book[sheet]
+        # 不採用檔案內記錄的 dimension（可能不正確），與 pandas 相同
+        ws.reset_dimensions()
+        for row in ws.iter_rows():
+            last = len(row)
+            while last and row[last - 1].value is None:
+                last -= 1
+            yield last, [_convert_cell(cell) for cell in row[min_col - 1:max_col]]
+
+    def read_frame(self, sheet, header=None, min_col=1, max_col=None):
+        """
+        讀取分頁 min_col~max_col 欄為 DataFrame，等同 pd.read_excel(sheet_name=sheet, header=header)
+        再取這幾欄的結果：尾端空白列的裁切與欄寬依整個分頁判斷，缺值與型別判斷相同。
+        """
+        data, last_row, width = [], -1, 0
+        for n, (last, values) in enumerate(self.iter_rows(sheet, min_col, max_col)):
+            if last:
+                last_row = n
+                width = max(width, last)
+            data.append(values)
+        data = data[:last_row + 1]
+        width = (width if max_col is None else min(width, max_col)) - min_col + 1
+        if width <= 0:
+            return pd.DataFrame()
+        data = [values + [""] * (width - len(values)) for values in data]
+        try:
+            return TextParser(data, header=header, skip_blank_lines=False).read()
+        except EmptyDataError:
+            return pd.DataFrame()
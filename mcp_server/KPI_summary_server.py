@@ -10,43 +10,34 @@ KPI_summary_server.py
 """
 
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from typing import Any, Dict, List
 import config.setting as setting
-import pandas as pd
 from pathlib import Path
 from datetime import datetime
-import uuid
+from mcp_server import metrics
+from mcp_server.tool_common import CSV_CACHE, ToolCall, ToolResult, run_tool_call
 
 # KPI Summary Server
 DATA_DIR = Path(setting.MOCK_KPI_SUMMARY)
 
-# MCP Tool Schema & Pydantic 模型
-class ToolCall(BaseModel):
-    trace_id: str = str(uuid.uuid4())
-    tool: str
-    args: Dict[str, Any]
-
-# ToolResult Schema
-class ToolResult(BaseModel):
-    trace_id: str
-    status: str
-    data: List[Dict[str, Any]]
-
 # 建立 FastAPI 伺服器
 app = FastAPI()
+metrics.instrument(app, "KPI_summary")
 
 # 將字串轉為 datetime 物件
-@app.post("/tool_call", response_model=ToolResult)
-def tool_call(payload: ToolCall):
+def handle_tool_call(payload: ToolCall):
     batch_date = payload.args.get("date", datetime.now().strftime("%Y-%m-%d"))
     target_path = DATA_DIR / f"{batch_date}.csv"
-    if not target_path.exists():
+    try:
+        data = CSV_CACHE.load(target_path)
+    except FileNotFoundError:
         return ToolResult(trace_id=payload.trace_id, status="NO_DATA", data=[])
-    df = pd.read_csv(target_path)
-    data = df.to_dict(orient="records")
     return ToolResult(trace_id=payload.trace_id, status="OK", data=data)
 
+# 路由：在共用執行緒池執行 handle_tool_call，同時進行的相同查詢只執行一次
+@app.post("/tool_call", response_model=ToolResult)
+async def tool_call(payload: ToolCall):
+    return await run_tool_call(handle_tool_call, payload, "KPI_summary")
+
 # 啟動 FastAPI 伺服器
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+aggregation.py
+
+unified_server 的伺服器端聚合：在快照的欄式 DataFrame 上做 group_by，
+只回傳每群的彙總值，讓 agent 拿到精簡的機台/班別統計，而不是整批原始資料列。
+
+agg 語法：逗號分隔的 `函數:欄位`，`count` 可省略欄位代表每群筆數，例如
+  group_by=machine_id,shift&agg=sum:actual_qty,mean:yield_percent,max:total_minutes,count
+"""
+
+import pandas as pd
+
+AGG_FUNCS = {'sum', 'mean', 'min', 'max', 'median', 'std', 'count', 'nunique'}
+# 只適用數值欄位（含 is_<旗標> 的 bool 欄）的聚合函數
+NUMERIC_FUNCS = {'sum', 'mean', 'median', 'std'}
+
+# 未指定 agg 時的預設彙總：筆數與各類異常筆數
+DEFAULT_AGG = 'count,sum:is_abnormal,sum:is_spc_abnormal,sum:is_batch_abnormal'
+
+def build_frame(rows, flag_columns):
+    """
+    將資料列轉為只含純量欄位的 DataFrame（list/dict 欄位如 spc_items 不納入），
+    並附上異常旗標欄（bool）供聚合使用。
+    """
+    df = pd.DataFrame.from_records(list(rows))
+    nested = [
+        col for col in df.columns
+        if df[col].dtype == object and df[col].map(lambda v: isinstance(v, (list, dict))).any()
+    ]
+    df = df.drop(columns=nested)
+    for name, values in flag_columns.items():
+        df[name] = values
+    return df
+
+def parse_agg(spec):
+    """解析 agg 字串為 [(輸出欄名, 欄位 or None, 函數)]；格式錯誤時丟出 ValueError"""
+    parsed = []
+    for part in (spec or DEFAULT_AGG).split(','):
+        part = part.strip()
+        if not part:
+            continue
+        func, _, col = part.partition(':')
+        func, col = func.strip(), col.strip() or None
+        if func not in AGG_FUNCS:
+            raise ValueError(f"不支援的聚合函數: {func}")
+        if col is None and func != 'count':
+            raise ValueError(f"聚合函數 {func} 需指定欄位，例如 {func}:actual_qty")
+        parsed.append((func if col is None else f"{func}_{col}", col, func))
+    if not parsed:
+        raise ValueError("agg 不可為空")
+    return parsed
+
+def aggregate(frame, positions, group_by, agg):
+    """
+    對 frame 中 positions 指定的列依 group_by 欄位分群並計算 agg，回傳每群一筆 dict。
+    positions 為 None 代表全表。欄位或函數不合法時丟出 ValueError。
+    """
+    keys = [k.strip() for k in group_by.split(',') if k.strip()]
+    if not keys:
+        raise ValueError("group_by 不可為空")
+    specs = parse_agg(agg)
+    missing = [c for c in keys + [col for _, col, _ in specs if col] if c not in frame.columns]
+    if missing:
+        raise ValueError(f"不支援分群/聚合的欄位: {', '.join(dict.fromkeys(missing))}")
+
+    not_numeric = [
+        f"{func}:{col}" for _, col, func in specs
+        if col and func in NUMERIC_FUNCS and not pd.api.types.is_numeric_dtype(frame[col])
+    ]
+    if not_numeric:
+        raise ValueError(f"聚合函數只適用數值欄位: {', '.join(not_numeric)}")
+
+    df = frame if positions is None else frame.take(positions)
+    grouped = df.groupby(keys, dropna=False, sort=True)
+    named = {
+        out: (col if col else keys[0], 'size' if col is None else func)
+        for out, col, func in specs
+    }
+    try:
+        result = grouped.agg(**named).reset_index()
+    except TypeError:
+        # 例如 min/max 遇到數值與文字混合的欄位
+        raise ValueError(f"聚合欄位型別不符: {', '.join(f'{func}:{col}' for _, col, func in specs if col)}")
+    # 轉為 JSON 可序列化的 Python 原生型別，NaN 以 None 表示
+    result = result.astype(object).where(result.notna(), None)
+    return result.to_dict(orient='records')
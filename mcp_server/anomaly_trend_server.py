@@ -3,6 +3,8 @@
 anomaly_trend_server.py
 
 自動彙整指定日期區間的異常趨勢資料，回傳所有產品/產線/班別的異常統計。
+每日 CSV 會增量併入以月份分區的趨勢資料（見 trend_store.py），區間查詢只讀取涵蓋到的月份，
+並可用 machine_id、line 先行篩選。
 標準 API 回傳格式，支援 LLM 多工具自動化查詢。
 
 啟動方式：
@@ -10,39 +12,27 @@ anomaly_trend_server.py
 """
 
 import config.setting as setting
-import pandas as pd
 from pathlib import Path
-from typing import Dict, Any, List
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel, Field
-import uuid
-from datetime import datetime, timedelta
+from mcp_server import metrics
+from mcp_server.tool_common import ToolCall, ToolResult, run_tool_call
+from mcp_server.trend_store import TrendStore, TrendStoreError
+from datetime import datetime
 
 # Anomaly Trend Server
 # 自動彙整指定日期的異常趨勢資料，回傳所有產品/產線/班別的異常統計。
 DATA_DIR = Path(setting.MOCK_ANOMALY_TREND)
-
-# MCP Tool Schema & Pydantic 模型
-class ToolCall(BaseModel):
-    trace_id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    tool: str
-    args: Dict[str, Any]
-
-# ToolResult Schema
-class ToolResult(BaseModel):
-    trace_id: str
-    status: str
-    data: List[Dict[str, Any]]
+STORE = TrendStore(DATA_DIR, setting.TREND_STORE_DIR, max_bytes=setting.TREND_CACHE_MAX_BYTES)
 
 # 建立 FastAPI 伺服器
 app = FastAPI(title="Anomaly Trend MCP-server")
+metrics.instrument(app, "anomaly_trend")
 
 # 將字串轉為 datetime 物件
 def parse_date(date_str):
     return datetime.strptime(date_str, "%Y-%m-%d")
 
-# 路由：處理工具呼叫
-@app.post("/tool_call", response_model=ToolResult)
+# 處理工具呼叫
 def handle_tool_call(req: ToolCall):
     if req.tool != "anomaly_trend":
         raise HTTPException(400, "Unsupported tool")
@@ -57,20 +47,19 @@ def handle_tool_call(req: ToolCall):
     except Exception:
         raise HTTPException(400, "日期格式錯誤，請用YYYY-MM-DD")
 
-    all_records = []
-    curr_dt = start_dt
-    while curr_dt <= end_dt:
-        date_str = curr_dt.strftime("%Y-%m-%d")
-        csv_path = DATA_DIR / f"{date_str}.csv"
-        if csv_path.exists():
-            try:
-                df = pd.read_csv(csv_path, encoding="utf-8")
-                for row in df.to_dict(orient="records"):
-                    row["date"] = date_str
-                    all_records.append(row)
-            except Exception:
-                pass
-        curr_dt += timedelta(days=1)
+    try:
+        with metrics.phase("sync"):
+            STORE.sync()
+        with metrics.phase("query"):
+            all_records = STORE.query(
+                start_dt.strftime("%Y-%m-%d"),
+                end_dt.strftime("%Y-%m-%d"),
+                machine_id=req.args.get("machine_id"),
+                line=req.args.get("line"),
+            )
+    except TrendStoreError as e:
+        raise HTTPException(500, f"Failed to read anomaly trend data: {e}")
+    metrics.add_rows(len(all_records))
 
     return ToolResult(
         trace_id=req.trace_id,
@@ -78,6 +67,11 @@ def handle_tool_call(req: ToolCall):
         data=all_records
     )
 
+# 路由：在共用執行緒池執行 handle_tool_call，同時進行的相同查詢只執行一次
+@app.post("/tool_call", response_model=ToolResult)
+async def tool_call(req: ToolCall):
+    return await run_tool_call(handle_tool_call, req, "anomaly_trend")
+
 # 啟動 FastAPI 伺服器
 if __name__ == "__main__":
     import uvicorn
@@ -4,77 +4,43 @@ batch_anomaly_server.py
 
 MCP-server：接收 tool_call，根據 batch_id 讀取 json_cache/ 下的 JSON，
 自動判斷該批次有無異常（abnormal_flag），回傳整批檢驗摘要。
+也可一次查詢多個批次（batch_ids、glob、日期/機台篩選），見 batch_source.py。
 
 啟動方式：
   uvicorn mcp_server.batch_anomaly_server:app --host 0.0.0.0 --port 8001
 """
 
-import config.setting as setting
-import json
-from pathlib import Path
-from typing import Dict, Any, List
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel, Field
-import uuid
-import json
-from pathlib import Path
-
-# JSON cache 存放資料夾路徑
-CACHE_DIR = Path(setting.JSON_CACHE)
-
-# MCP Tool Schema & Pydantic 模型
-class ToolCall(BaseModel):
-    trace_id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    tool: str
-    args: Dict[str, Any]
-
-class ToolResult(BaseModel):
-    trace_id: str
-    status: str
-    data: List[Dict[str, Any]]
+from mcp_server import metrics
+from mcp_server.batch_source import batch_tool_response
+from mcp_server.dataset_store import alert_features
+from mcp_server.tool_common import ToolCall, ToolResult, run_tool_call
 
 # 建立 FastAPI 伺服器
 app = FastAPI(title="Batch Anomaly MCP-server")
+metrics.instrument(app, "batch_anomaly")
 
-# 路由：處理工具呼叫
-@app.post("/tool_call", response_model=ToolResult)
-def handle_tool_call(req: ToolCall):
-    if req.tool != "batch_anomaly":
-        raise HTTPException(400, "Unsupported tool")
-    batch_id = req.args.get("batch_id")
-    if not batch_id:
-        raise HTTPException(400, "batch_id required")
-
-    json_path = CACHE_DIR / f"{batch_id}.json"
-    if not json_path.exists():
-        raise HTTPException(404, f"Batch {batch_id} not found")
-
-    try:
-        with open(json_path, "r", encoding="utf-8") as f:
-            batch_data = json.load(f)
-    except Exception as e:
-        raise HTTPException(500, f"Failed to load batch: {e}")
-
-    features = batch_data.get("features", [])
+def build_batch_anomaly(batch_id, batch_data):
+    """單一批次的異常摘要"""
     meta = batch_data.get("meta", {})
     summary = batch_data.get("summary", {})
 
     abnormal_features = []
-    for feat in features:
-        if feat.get("cpk_alert") or feat.get("ppk_alert") or (feat.get("abnormal_detail") and len(feat.get("abnormal_detail")) > 0):
-            abnormal_features.append({
-                "feature_name": feat.get("feature_name"),
-                "cpk": feat.get("cpk"),
-                "ppk": feat.get("ppk"),
-                "cpk_alert": feat.get("cpk_alert"),
-                "cpk_reason": feat.get("cpk_reason"),
-                "ppk_alert": feat.get("ppk_alert"),
-                "ppk_reason": feat.get("ppk_reason"),
-                "abnormal_detail": feat.get("abnormal_detail"),
-            })
+    # 優先使用 ETL 摘要檔記錄的 alert_features，不逐項判斷
+    for feat in alert_features(batch_data):
+        abnormal_features.append({
+            "feature_name": feat.get("feature_name"),
+            "cpk": feat.get("cpk"),
+            "ppk": feat.get("ppk"),
+            "cpk_alert": feat.get("cpk_alert"),
+            "cpk_reason": feat.get("cpk_reason"),
+            "ppk_alert": feat.get("ppk_alert"),
+            "ppk_reason": feat.get("ppk_reason"),
+            "abnormal_detail": feat.get("abnormal_detail"),
+        })
 
     has_abnormal = len(abnormal_features) > 0
-    summary_result = {
+    return {
         "batch_id": batch_id,
         "machine_id": meta.get("machine_id"),
         "product_name": summary.get("product_name"),
@@ -86,11 +52,18 @@ def handle_tool_call(req: ToolCall):
         "type": "batch_anomaly_summary"
     }
 
-    return ToolResult(
-        trace_id=req.trace_id,
-        status="OK",
-        data=[summary_result]
-    )
+# 處理工具呼叫
+# args：batch_id（單批）或 batch_ids / glob / date、start_date、end_date（生產日期）、machine_id（多批），
+#       stream=true 以 NDJSON 串流、only_abnormal=true 只回傳有異常的批次
+def handle_tool_call(req: ToolCall):
+    if req.tool != "batch_anomaly":
+        raise HTTPException(400, "Unsupported tool")
+    return batch_tool_response(req, build_batch_anomaly)
+
+# 路由：在共用執行緒池執行 handle_tool_call，同時進行的相同查詢只執行一次
+@app.post("/tool_call", response_model=ToolResult)
+async def tool_call(req: ToolCall):
+    return await run_tool_call(handle_tool_call, req, "batch_anomaly")
 
 # 啟動 FastAPI 伺服器
 if __name__ == "__main__":
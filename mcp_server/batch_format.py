@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+batch_format.py
+
+json_cache 的二進位批次格式（{key}.mcpb）。量測值不再逐筆存成 dict，而是依欄位存成連續的型別陣列：
+
+  b"MCPB" | 版本 uint16 | header 長度 uint32 | header（UTF-8 JSON）| 補齊到 8 bytes | 陣列區
+  header：meta / summary / etl_log / features（各特性不含量測值，measurements 改記 start、count），
+          timestamps（時間字串表）、rows（量測總筆數）、arrays（各陣列在陣列區中的 offset 與 dtype）
+  陣列區：value float64、seq int32、timestamp int32（時間字串表的索引，-1 表示 None）、
+          out_of_spec 以 bit 壓縮（little bit order）
+
+讀取端只讀 header 即可取得 catalog 與 SPC 摘要；需要量測值時以 mmap 對應陣列區，只取用到的特性。
+"""
+
+import json
+import mmap
+import os
+import struct
+import tempfile
+
+import numpy as np
+
+MAGIC = b"MCPB"
+FORMAT_VERSION = 1
+SUFFIX = ".mcpb"
+_PREFIX = struct.Struct("<4sHI")
+_ALIGN = 8
+
+ARRAY_DTYPES = {
+    "value": "<f8",
+    "seq": "<i4",
+    "timestamp": "<i4",
+    "out_of_spec": "u1",
+}
+
+def _pad(n):
+    return (-n) % _ALIGN
+
+def write_batch_binary(doc, path):
+    """將批次文件（etl_inspection_excel 的輸出，已做 nan_to_none）寫成二進位格式"""
+    values, seqs, ts_codes, flags = [], [], [], []
+    ts_table = {}
+    features = []
+    for feat in doc.get("features", []):
+        header_feat = {}
+        for k, v in feat.items():
+            if k == "measurements":
+                v = {"start": len(values), "count": len(v)}
+                for m in feat["measurements"]:
+                    values.append(m["value"])
+                    seqs.append(m["seq"])
+                    ts = m["timestamp"]
+                    ts_codes.append(-1 if ts is None else ts_table.setdefault(ts, len(ts_table)))
+                    flags.append(bool(m["out_of_spec"]))
+            header_feat[k] = v
+        features.append(header_feat)
+
+    arrays = {
+        "value": np.asarray(values, dtype=ARRAY_DTYPES["value"]),
+        "seq": np.asarray(seqs, dtype=ARRAY_DTYPES["seq"]),
+        "timestamp": np.asarray(ts_codes, dtype=ARRAY_DTYPES["timestamp"]),
+        "out_of_spec": np.packbits(np.asarray(flags, dtype=bool), bitorder="little"),
+    }
+    layout, offset = {}, 0
+    for name, arr in arrays.items():
+        layout[name] = {"offset": offset, "dtype": ARRAY_DTYPES[name], "length": int(arr.size)}
+        offset += arr.nbytes + _pad(arr.nbytes)
+
+    # 保留原文件的欄位順序，還原後與 JSON 格式逐字相同
+    header = {k: (features if k == "features" else v) for k, v in doc.items()}
+    header.update({
+        "timestamps": list(ts_table),
+        "rows": len(values),
+        "arrays": layout,
+    })
+    header_bytes = json.dumps(header, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    # 同資料夾下唯一名稱的暫存檔，多個行程同時寫入時不會互相覆寫
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.fspath(path)) or ".", prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_PREFIX.pack(MAGIC, FORMAT_VERSION, len(header_bytes)))
+            f.write(header_bytes)
+            f.write(b"\0" * _pad(_PREFIX.size + len(header_bytes)))
+            for arr in arrays.values():
+                f.write(arr.tobytes())
+                f.write(b"\0" * _pad(arr.nbytes))
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+class BinaryBatch:
+    """
+    讀取 .mcpb 批次檔。建立時只讀 header；measurements() 才以 mmap 對應陣列區，
+    取出需要的特性後即關閉對應，不會長時間佔用檔案（ETL 可直接覆寫）。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            magic, version, header_len = _PREFIX.unpack(f.read(_PREFIX.size))
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a binary batch file")
+            if version != FORMAT_VERSION:
+                raise ValueError(f"Unsupported binary batch version {version} in {path}")
+            self.header = json.loads(f.read(header_len).decode("utf-8"))
+        self.data_offset = _PREFIX.size + header_len + _pad(_PREFIX.size + header_len)
+
+    @property
+    def features(self):
+        return self.header["features"]
+
+    def document(self, with_measurements=False, feature_names=None):
+        """
+        回傳與 JSON 格式相同結構的批次文件。with_measurements 為 False 時特性不含 measurements；
+        feature_names 可限定只還原部分特性的量測值。
+        """
+        doc = {k: v for k, v in self.header.items() if k not in ("timestamps", "rows", "arrays")}
+        wanted = None if feature_names is None else set(feature_names)
+        indexes = [
+            i for i, feat in enumerate(self.features)
+            if with_measurements and (wanted is None or feat.get("feature_name") in wanted)
+        ]
+        measured = self.measurements(indexes) if indexes else {}
+        features = []
+        for i, feat in enumerate(self.features):
+            if i in measured:
+                features.append({k: (measured[i] if k == "measurements" else v) for k, v in feat.items()})
+            else:
+                features.append({k: v for k, v in feat.items() if k != "measurements"})
+        doc["features"] = features
+        return doc
+
+    def measurements(self, indexes):
+        """以 mmap 讀取指定特性（features 中的索引）的量測值，回傳 {索引: [{seq, value, timestamp, out_of_spec}]}"""
+        layout = self.header["arrays"]
+        rows = self.header["rows"]
+        ts_table = self.header["timestamps"]
+        result = {}
+        if not rows:
+            return {i: [] for i in indexes}
+        with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            def view(name):
+                spec = layout[name]
+                return np.frombuffer(mm, dtype=spec["dtype"], count=spec["length"],
+                                     offset=self.data_offset + spec["offset"])
+            values, seqs, codes = view("value"), view("seq"), view("timestamp")
+            flags = np.unpackbits(view("out_of_spec"), count=rows, bitorder="little")
+            for i in indexes:
+                span = self.features[i]["measurements"]
+                lo, hi = span["start"], span["start"] + span["count"]
+                result[i] = [
+                    {"seq": s, "value": v, "timestamp": None if c < 0 else ts_table[c], "out_of_spec": bool(o)}
+                    for s, v, c, o in zip(
+                        seqs[lo:hi].tolist(), values[lo:hi].tolist(), codes[lo:hi].tolist(), flags[lo:hi].tolist()
+                    )
+                ]
+            # 釋放對 mmap 的參照後才能關閉
+            del values, seqs, codes, flags, view
+        return result
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+batch_source.py
+
+spc_summary_server 與 batch_anomaly_server 共用的批次讀取：
+- 二進位批次檔（.mcpb）只讀 header；JSON 批次優先讀取 ETL 輸出的批次摘要檔（json_cache/summary/，
+  不含 measurements），摘要檔不存在或已過期時才讀完整批次 JSON；皆依檔案 mtime/size 快取（ParsedFileCache）；
+- 多批次查詢：batch_id / batch_ids 可為批次清單或 glob（例如 "0*"、"*"），
+  也可用 date、start_date、end_date（批次的生產日期，ETL 由量測時間或檔名取得，寫在 meta.date）、
+  machine_id 篩選（依 json_cache catalog 判斷；沒有生產日期的批次不符合日期條件）；
+- 多批次以有上限的執行緒池平行載入，依批次順序逐筆產生結果，最後附上彙總。
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+from fnmatch import fnmatchcase
+import json
+import os
+from pathlib import Path
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+import config.setting as setting
+from mcp_server import metrics
+from mcp_server.batch_format import SUFFIX as BINARY_SUFFIX
+from mcp_server.dataset_store import (
+    JsonCacheSource, batch_path, read_batch, scan_batches, summary_is_current, summary_path,
+)
+from mcp_server.fast_json import dumps as json_dumps
+from mcp_server.tool_common import ParsedFileCache, ToolResult
+
+CACHE_DIR = Path(setting.JSON_CACHE)
+BATCH_DOCS = ParsedFileCache(setting.BATCH_CACHE_MAX_BYTES)
+BATCH_LOADER = ThreadPoolExecutor(max_workers=setting.BATCH_LOAD_WORKERS, thread_name_prefix="batch-loader")
+# 批次 meta catalog（machine_id、date），只在使用篩選條件時建立，之後依檔案變動增量更新
+CATALOG = JsonCacheSource(CACHE_DIR, max_doc_bytes=0)
+metrics.REGISTRY.register_cache("batch_docs", BATCH_DOCS)
+
+FILTER_ARGS = ('date', 'start_date', 'end_date', 'machine_id')
+GLOB_CHARS = set('*?[')
+
+def _parse_json(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def _parse_header(path):
+    return read_batch(path, with_measurements=False)
+
+def _file_size(doc, st):
+    # 以檔案大小估算記憶體用量（與 unified_server 的 DOC_CACHE 相同）
+    return st.st_size
+
+def load_batch(batch_id):
+    """
+    讀取批次資料（經快取），features 可能不含 measurements；批次檔不存在時丟出 FileNotFoundError。
+    有對應目前批次檔的摘要檔時直接使用，不解析量測值。
+    """
+    doc = _load_batch(batch_id)
+    metrics.add_rows(len(doc.get("features", [])))
+    return doc
+
+def _load_batch(batch_id):
+    path = batch_path(CACHE_DIR, batch_id)
+    if path.suffix == BINARY_SUFFIX:
+        return BATCH_DOCS.get(path, _parse_header, _file_size)
+    st = os.stat(path)
+    try:
+        summary = BATCH_DOCS.get(summary_path(CACHE_DIR, batch_id), _parse_json, _file_size)
+    except (OSError, ValueError):
+        summary = None
+    if summary is not None and summary_is_current(summary, (st.st_mtime_ns, st.st_size)):
+        return summary
+    return BATCH_DOCS.get(path, _parse_json, _file_size)
+
+def _split_ids(value):
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = value.split(",")
+    return [str(v).strip() for v in value if str(v).strip()]
+
+def _available_batches():
+    return sorted(scan_batches(CACHE_DIR))
+
+def _matches_filters(row, args):
+    date = row.get("date") or ""
+    if args.get("date") and date != args["date"]:
+        return False
+    if args.get("start_date") and date < args["start_date"]:
+        return False
+    if args.get("end_date") and date > args["end_date"]:
+        return False
+    if args.get("machine_id") and str(row.get("machine_id")) != str(args["machine_id"]):
+        return False
+    return True
+
+def is_single_batch(args):
+    """只指定一個不含 glob 的 batch_id 且沒有篩選條件：維持原本的單批次回應"""
+    ids = _split_ids(args.get("batch_id")) + _split_ids(args.get("batch_ids"))
+    return (
+        len(ids) == 1 and not (GLOB_CHARS & set(ids[0]))
+        and not any(args.get(k) for k in FILTER_ARGS)
+    )
+
+def select_batches(args):
+    """
+    依 args 決定要查詢的批次，回傳 (批次清單, 找不到的批次)。
+    batch_id/batch_ids 可為清單、逗號分隔字串或 glob；只給篩選條件時從全部批次中篩選。
+    """
+    requested = _split_ids(args.get("batch_id")) + _split_ids(args.get("batch_ids"))
+    has_filters = any(args.get(k) for k in FILTER_ARGS)
+    if not requested and not has_filters:
+        raise HTTPException(400, "batch_id, batch_ids or a date/machine_id filter required")
+
+    available = _available_batches()
+    if not requested:
+        selected, missing = available, []
+    else:
+        present = set(available)
+        selected, missing = [], []
+        for pattern in requested:
+            if GLOB_CHARS & set(pattern):
+                selected.extend(k for k in available if fnmatchcase(k, pattern))
+            elif pattern in present:
+                selected.append(pattern)
+            else:
+                missing.append(pattern)
+        selected = list(dict.fromkeys(selected))
+
+    if has_filters:
+        matched = {row["cache_key"] for row in CATALOG.load_rows() if _matches_filters(row, args)}
+        selected = [k for k in selected if k in matched]
+    return selected, missing
+
+def single_batch_result(batch_id, build):
+    """單批次：找不到回 404、讀取失敗回 500"""
+    try:
+        doc = load_batch(batch_id)
+    except FileNotFoundError:
+        raise HTTPException(404, f"Batch {batch_id} not found")
+    except Exception as e:
+        raise HTTPException(500, f"Failed to load batch: {e}")
+    return build(batch_id, doc)
+
+def _build_one(batch_id, build):
+    try:
+        return batch_id, build(batch_id, load_batch(batch_id)), None
+    except Exception as e:
+        return batch_id, None, str(e)
+
+def iter_batch_results(batch_ids, build, window=None):
+    """
+    以 BATCH_LOADER 平行載入並建立各批次結果，依 batch_ids 順序逐筆產生 (batch_id, result, error)。
+    同時送出的工作最多 window 個，不會一次把全部批次載入記憶體。
+    各工作在發起請求的 contextvars 中執行，讀檔與解析耗時記入該請求的 metrics。
+    """
+    window = window or setting.BATCH_LOAD_WORKERS * 2
+    pending = []
+    ids = iter(batch_ids)
+    for batch_id in ids:
+        pending.append(BATCH_LOADER.submit(contextvars.copy_context().run, _build_one, batch_id, build))
+        if len(pending) >= window:
+            break
+    while pending:
+        yield pending.pop(0).result()
+        batch_id = next(ids, None)
+        if batch_id is not None:
+            pending.append(BATCH_LOADER.submit(contextvars.copy_context().run, _build_one, batch_id, build))
+
+def iter_aggregated(tool, batch_ids, missing, build, only_abnormal=False):
+    """逐筆產生各批次結果，最後一筆為彙總（批次數、異常批次、找不到與讀取失敗的批次）"""
+    abnormal, errors = [], [{"batch_id": b, "msg": "not found"} for b in missing]
+    count = 0
+    for batch_id, result, error in iter_batch_results(batch_ids, build):
+        if error is not None:
+            errors.append({"batch_id": batch_id, "msg": error})
+            continue
+        count += 1
+        if result.get("abnormal_count", 0) > 0:
+            abnormal.append(batch_id)
+        elif only_abnormal:
+            continue
+        yield result
+    yield {
+        "batch_count": count,
+        "abnormal_batch_count": len(abnormal),
+        "abnormal_batches": abnormal,
+        "errors": errors,
+        "type": f"{tool}_aggregate",
+    }
+
+def batch_tool_response(req, build):
+    """
+    spc_summary / batch_anomaly 的共用處理流程。build(batch_id, doc) 產生單一批次的結果。
+    args.stream 為 true 時以 NDJSON 逐筆串流回傳；args.only_abnormal 只回傳有異常的批次（彙總照常）。
+    """
+    args = req.args
+    if is_single_batch(args):
+        batch_id = (_split_ids(args.get("batch_id")) or _split_ids(args.get("batch_ids")))[0]
+        return ToolResult(trace_id=req.trace_id, status="OK", data=[single_batch_result(batch_id, build)])
+
+    batch_ids, missing = select_batches(args)
+    results = iter_aggregated(req.tool, batch_ids, missing, build, bool(args.get("only_abnormal")))
+    if args.get("stream"):
+        def ndjson():
+            for item in results:
+                yield json_dumps(item) + b"\n"
+        return StreamingResponse(
+            ndjson(), media_type="application/x-ndjson", headers={"X-Trace-Id": req.trace_id}
+        )
+    return ToolResult(trace_id=req.trace_id, status="OK", data=list(results))
@@ -0,0 +1,564 @@
+#!/usr/bin/env python3
+"""
+dataset_store.py
+
+unified_server 的資料層：把整份資料建成不可變快照（資料列、等值索引、異常旗標 bitmap、版本號），
+並由背景 watcher 偵測資料來源變動，重新解析、建索引後以單一指派原子切換快照。
+查詢端只需在請求開頭取一次 `STORE.current`，整個請求都看到同一版資料，不會被重載阻塞。
+
+資料來源有兩種：MockFileSource（單一 mock JSON 檔）與 JsonCacheSource（ETL 輸出的 json_cache 目錄，
+批次檔可為 JSON 或二進位格式 .mcpb，見 batch_format.py）。
+"""
+
+import json
+import logging
+import os
+import sys
+import threading
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict, defaultdict
+from pathlib import Path
+from functools import cached_property, reduce
+from operator import and_
+
+import numpy as np
+
+from config.setting import CPK_PPK_THRESHOLD
+from mcp_server.aggregation import build_frame
+from mcp_server.batch_format import SUFFIX as BINARY_SUFFIX, BinaryBatch
+from mcp_server.fast_json import dumps as json_dumps
+
+logger = logging.getLogger(__name__)
+
+# 等值查詢欄位：載入資料時建立 hash 索引（值 -> 列位置 posting list）
+INDEX_FIELDS = ['batch_id', 'machine_id', 'product', 'shift', 'line', 'date', 'status']
+
+def is_abnormal(row):
+    # 綜合異常判斷
+    if row.get('abnormal_count', 0) > 0:
+        return True
+    if row.get('event_count', 0) > 0:
+        return True
+    if row.get('ng_qty', 0) > 0:
+        return True
+    if row.get('event_type'):
+        return True
+    if row.get('status') == 'open':
+        return True
+    if row.get('kpi_achieve_rate', 100) < 90:
+        return True
+    return False
+
+def _below_threshold(value):
+    # ETL 在量測值不足或缺規格時輸出 cpk/ppk = None，視為非異常
+    return value is not None and value < CPK_PPK_THRESHOLD
+
+def is_spc_abnormal(row):
+    for spc in row.get('spc_items', []):
+        if _below_threshold(spc.get('cpk')) or _below_threshold(spc.get('ppk')):
+            return True
+        if spc.get('cpk_alert') or spc.get('ppk_alert'):
+            return True
+    return False
+
+def is_batch_abnormal(row):
+    return bool(row.get('abnormal_features'))
+
+# 異常旗標：載入時逐列判斷一次，以 int 作為 bitset（第 pos 位元代表第 pos 列）
+FLAG_FUNCS = {
+    'abnormal': is_abnormal,
+    'spc_abnormal': is_spc_abnormal,
+    'batch_abnormal': is_batch_abnormal,
+}
+
+def build_indexes(rows):
+    """為 INDEX_FIELDS 建立索引，posting list 內的列位置維持遞增排序"""
+    indexes = {f: defaultdict(list) for f in INDEX_FIELDS}
+    for pos, row in enumerate(rows):
+        for f in INDEX_FIELDS:
+            v = row.get(f)
+            if v is not None:
+                indexes[f][v].append(pos)
+    return {f: dict(idx) for f, idx in indexes.items()}
+
+def build_date_index(rows):
+    """依 date（YYYY-MM-DD 字串）排序的 (date, 列位置) 清單，供區間查詢二分搜尋"""
+    return sorted((row['date'], pos) for pos, row in enumerate(rows) if row.get('date'))
+
+def build_flag_bitmaps(rows):
+    """計算每種異常旗標的 bitmap"""
+    return {
+        name: int(''.join('1' if fn(row) else '0' for row in reversed(rows)) or '0', 2)
+        for name, fn in FLAG_FUNCS.items()
+    }
+
+def _intersect(small, large):
+    # 以較短的 posting list 逐一在較長者中二分搜尋
+    out = []
+    n = len(large)
+    for pos in small:
+        j = bisect_left(large, pos)
+        if j < n and large[j] == pos:
+            out.append(pos)
+    return out
+
+def bit_array(bits, n):
+    """bitmap 展開為長度 n 的 bool 陣列（第 i 個元素為第 i 位元）"""
+    raw = np.frombuffer(bits.to_bytes((n + 7) // 8 or 1, 'little'), dtype=np.uint8)
+    return np.unpackbits(raw, bitorder='little')[:n].astype(bool)
+
+def bit_positions(bits):
+    """由低位到高位列出 bitmap 中為 1 的列位置（遞增 list）"""
+    return np.flatnonzero(bit_array(bits, bits.bit_length())).tolist()
+
+class DatasetSnapshot:
+    """
+    某一版資料的不可變快照。建立後不再修改；資料異動一律產生新快照（新版本號）。
+    """
+
+    def __init__(self, rows, version):
+        self.version = version
+        self.rows = tuple(rows)
+        self.indexes = build_indexes(self.rows)
+        self.date_index = build_date_index(self.rows)
+        self.flag_bitmaps = build_flag_bitmaps(self.rows)
+        # 投影名稱 -> (欄位, 每列預先序列化的 JSON bytes)，第一次使用時建立
+        self._projections = {}
+        # 旗標 bitmap（AND 後）-> 為 1 的列位置，同一快照內每種組合只解碼一次
+        self._mask_positions = {}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def projection(self, name, fields):
+        """
+        回傳每列依 fields 投影後預先序列化的 JSON bytes（list，索引即列位置）。
+        同一快照內只計算一次，之後查詢直接拼接 bytes，不再逐列建立 dict。
+        """
+        cached = self._projections.get(name)
+        if cached is None or cached[0] != fields:
+            fields = list(fields)
+            cached = (fields, [json_dumps({k: row.get(k) for k in fields}) for row in self.rows])
+            self._projections[name] = cached
+        return cached[1]
+
+    @cached_property
+    def frame(self):
+        """欄式 DataFrame（純量欄位 + is_<旗標> 欄），第一次聚合查詢時才建立"""
+        n = len(self.rows)
+        flag_columns = {f"is_{name}": bit_array(bits, n) for name, bits in self.flag_bitmaps.items()}
+        return build_frame(self.rows, flag_columns)
+
+    def date_range(self, start=None, end=None):
+        """
+        回傳 start <= date <= end 的列位置（遞增）；兩端皆可省略。
+        於排序後的 date 索引二分搜尋，成本為 O(log n + k)。
+        """
+        lo = bisect_left(self.date_index, (start,)) if start else 0
+        hi = bisect_right(self.date_index, (end, sys.maxsize)) if end else len(self.date_index)
+        return sorted(pos for _, pos in self.date_index[lo:hi])
+
+    def lookup(self, filters, date_range=None):
+        """
+        依等值條件交集各欄位的 posting list，回傳符合的列位置（遞增）。
+        date_range 為 (start, end) 時一併與日期區間的列位置取交集。
+        沒有任何條件時回傳 None，代表需走訪全表。
+        """
+        postings = [self.indexes[f].get(v, []) for f, v in filters.items() if v]
+        if date_range and any(date_range):
+            postings.append(self.date_range(*date_range))
+        if not postings:
+            return None
+        postings.sort(key=len)
+        result = postings[0]
+        for p in postings[1:]:
+            if not result:
+                break
+            result = _intersect(result, p)
+        return result
+
+    def flag_mask(self, names):
+        """將多個異常旗標 bitmap 做 AND；沒有旗標條件時回傳 None"""
+        required = [self.flag_bitmaps[name] for name in names]
+        return reduce(and_, required) if required else None
+
+    def mask_positions(self, mask):
+        """mask 中為 1 的列位置（遞增）；解碼結果快取於快照"""
+        positions = self._mask_positions.get(mask)
+        if positions is None:
+            positions = self._mask_positions[mask] = bit_positions(mask)
+        return positions
+
+    def select(self, candidates, mask, start=0):
+        """
+        結合索引候選列與旗標 bitmap，回傳要處理的列位置（遞增）。
+        candidates 為 None 代表全表；mask 為 None 代表不做旗標過濾。
+        start 為 keyset 分頁的起點，只回傳 >= start 的列位置（候選列以二分搜尋定位）。
+        """
+        if candidates is not None and start:
+            candidates = candidates[bisect_left(candidates, start):]
+        if mask is None:
+            return range(start, len(self.rows)) if candidates is None else candidates
+        positions = self.mask_positions(mask)
+        if candidates is None:
+            return positions[bisect_left(positions, start):] if start else positions
+        if len(candidates) > len(positions):
+            return _intersect(positions, candidates)
+        return _intersect(candidates, positions)
+
+    def replace_row(self, pos, row, version):
+        """
+        回傳第 pos 列換成 row 的新快照；只複製有變動的索引與 bitmap，其餘與舊快照共用。
+        """
+        new = DatasetSnapshot.__new__(DatasetSnapshot)
+        new.version = version
+        new.rows = self.rows[:pos] + (row,) + self.rows[pos + 1:]
+        old = self.rows[pos]
+        new.indexes = dict(self.indexes)
+        for f in INDEX_FIELDS:
+            old_v, new_v = old.get(f), row.get(f)
+            if old_v == new_v:
+                continue
+            idx = new.indexes[f] = dict(new.indexes[f])
+            if old_v is not None:
+                posting = [p for p in idx[old_v] if p != pos]
+                if posting:
+                    idx[old_v] = posting
+                else:
+                    del idx[old_v]
+            if new_v is not None:
+                posting = list(idx.get(new_v, []))
+                insort(posting, pos)
+                idx[new_v] = posting
+        new.date_index = self.date_index
+        if old.get('date') != row.get('date'):
+            new.date_index = [entry for entry in self.date_index if entry[1] != pos]
+            if row.get('date'):
+                insort(new.date_index, (row['date'], pos))
+        # 已建立的投影只需重新序列化被替換的那一列
+        new._projections = {
+            name: (fields, encoded[:pos] + [json_dumps({k: row.get(k) for k in fields})] + encoded[pos + 1:])
+            for name, (fields, encoded) in self._projections.items()
+        }
+        bit = 1 << pos
+        new.flag_bitmaps = {
+            name: (bits | bit) if FLAG_FUNCS[name](row) else (bits & ~bit)
+            for name, bits in self.flag_bitmaps.items()
+        }
+        new._mask_positions = {}
+        return new
+
+class MockFileSource:
+    """單一 JSON 檔（list of rows）資料來源，如 mock_data/all_server_full_mock_data.json"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def signature(self):
+        """檔案的 (mtime, size)，用於偵測變動；檔案不存在時回傳 None"""
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def load_rows(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def attach_measurements(self, row):
+        # mock data 的 spc_items 本身就含 measurements
+        return row
+
+class ByteLRU:
+    """以位元組總量為上限的 LRU；超過上限時從最久未使用的項目開始淘汰"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._items.move_to_end(key)
+            return item[0]
+
+    def put(self, key, value, nbytes):
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.total_bytes -= old[1]
+            if nbytes > self.max_bytes:
+                return
+            self._items[key] = (value, nbytes)
+            self.total_bytes += nbytes
+            while self.total_bytes > self.max_bytes:
+                _, (_, freed) = self._items.popitem(last=False)
+                self.total_bytes -= freed
+
+    def discard(self, key):
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.total_bytes -= old[1]
+
+    def __len__(self):
+        return len(self._items)
+
+def feature_has_alert(feat):
+    """特性有 Cpk/Ppk 警示或超規量測"""
+    return bool(feat.get('cpk_alert') or feat.get('ppk_alert') or feat.get('abnormal_detail'))
+
+def alert_features(doc):
+    """
+    批次中有警示的特性（feature dict，依原順序）。
+    ETL 摘要檔已記錄 alert_features（特性名稱）時直接依名稱取出，不再逐項判斷；完整批次檔與 .mcpb 才逐項判斷。
+    """
+    features = doc.get('features', [])
+    names = doc.get('alert_features')
+    if names is None:
+        return [feat for feat in features if feature_has_alert(feat)]
+    names = set(names)
+    return [feat for feat in features if feat.get('feature_name') in names]
+
+def batch_doc_to_row(key, doc):
+    """
+    將 ETL 產生的批次 JSON 轉成 unified_server 的資料列（catalog 用）。
+    只保留 meta/summary 與各特性的 SPC 結果，不含 measurements。
+    """
+    meta = doc.get('meta', {})
+    summary = doc.get('summary', {})
+    def strip(feat):
+        return {k: v for k, v in feat.items() if k != 'measurements'}
+    spc_items = [strip(feat) for feat in doc.get('features', [])]
+    abnormal_features = [strip(feat) for feat in alert_features(doc)]
+    return {
+        'cache_key': key,
+        'batch_id': meta.get('batch_id') or key,
+        'machine_id': meta.get('machine_id'),
+        'product': summary.get('product_name'),
+        'part_no': summary.get('part_no'),
+        'vendor': summary.get('vendor'),
+        # 生產日期（ETL 由量測時間或檔名取得），不是 ETL 執行日期
+        'date': meta.get('date'),
+        'source_file': meta.get('source_file'),
+        'abnormal_count': len(abnormal_features),
+        'abnormal_features': abnormal_features,
+        'total_spc_items': len(spc_items),
+        'spc_items': spc_items,
+    }
+
+# ETL 為每批另外輸出的摘要檔（不含 measurements）放在 json_cache/summary/{key}.json，
+# 內容與批次 JSON 相同但特性不含量測值，並以 batch_file 記錄對應批次檔的 size/mtime
+SUMMARY_DIR = 'summary'
+
+def summary_path(cache_dir, key):
+    return Path(cache_dir) / SUMMARY_DIR / f"{key}.json"
+
+def summary_is_current(summary, signature):
+    """摘要檔是否對應目前的批次檔（signature 為批次檔的 (mtime_ns, size)）；批次檔被改寫後摘要即失效"""
+    src = summary.get('batch_file') or {}
+    return (src.get('mtime_ns'), src.get('size')) == tuple(signature)
+
+# json_cache 中的批次檔副檔名；同一批次兩種格式並存時優先使用二進位格式
+BATCH_SUFFIXES = (BINARY_SUFFIX, '.json')
+
+def scan_batches(cache_dir):
+    """列出 cache_dir 中的批次檔，回傳 {key: (檔名, (mtime_ns, size))}"""
+    found = {}
+    try:
+        with os.scandir(cache_dir) as it:
+            for e in it:
+                if not e.is_file():
+                    continue
+                for rank, suffix in enumerate(BATCH_SUFFIXES):
+                    if e.name.endswith(suffix):
+                        key = e.name[:-len(suffix)]
+                        st = e.stat()
+                        if key not in found or rank < found[key][0]:
+                            found[key] = (rank, e.name, (st.st_mtime_ns, st.st_size))
+                        break
+    except FileNotFoundError:
+        pass
+    return {key: (name, sig) for key, (_, name, sig) in found.items()}
+
+def batch_path(cache_dir, key):
+    """批次 key 對應的批次檔路徑（依 BATCH_SUFFIXES 順序找第一個存在的）；都不存在時丟出 FileNotFoundError"""
+    for suffix in BATCH_SUFFIXES:
+        path = Path(cache_dir) / f"{key}{suffix}"
+        if path.exists():
+            return path
+    raise FileNotFoundError(f"Batch file for {key} not found in {cache_dir}")
+
+def read_batch(path, with_measurements=True):
+    """
+    讀取批次檔為 dict。二進位格式只讀 header，with_measurements 為 True 時才以 mmap 還原量測值；
+    JSON 格式一律整份解析。
+    """
+    path = Path(path)
+    if path.suffix == BINARY_SUFFIX:
+        return BinaryBatch(path).document(with_measurements=with_measurements)
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+class JsonCacheSource:
+    """
+    ETL 輸出的 json_cache 目錄（每批一個 JSON 或 .mcpb）資料來源。
+    記憶體中只保留輕量 catalog（不含 measurements）；完整批次文件依需求載入，
+    並放在以位元組上限控制的 LRU 中，目錄再大記憶體用量也維持平穩。
+    """
+
+    def __init__(self, cache_dir, max_doc_bytes=256 * 1024 * 1024):
+        self.cache_dir = Path(cache_dir)
+        self.docs = ByteLRU(max_doc_bytes)
+        # 檔名 -> ((mtime, size), catalog row)；重載時只重新解析有變動的檔案
+        self._catalog = {}
+
+    def _scan(self):
+        return {name: sig for name, sig in scan_batches(self.cache_dir).values()}
+
+    def signature(self):
+        return tuple(sorted(self._scan().items()))
+
+    def load_rows(self):
+        catalog = {}
+        for key, (name, sig) in sorted(scan_batches(self.cache_dir).items()):
+            cached = self._catalog.get(name)
+            if cached is not None and cached[0] == sig:
+                catalog[name] = cached
+                continue
+            try:
+                # 二進位格式的 header 即為摘要，JSON 格式則優先讀 ETL 摘要檔
+                doc = self._read_summary(key, sig) or read_batch(self.cache_dir / name, with_measurements=False)
+            except Exception:
+                logger.exception("批次檔 %s 解析失敗，略過", name)
+                continue
+            catalog[name] = (sig, batch_doc_to_row(key, doc))
+        self._catalog = catalog
+        return [row for _, row in catalog.values()]
+
+    def _read_summary(self, key, sig):
+        """讀取 ETL 摘要檔建立 catalog（不解析量測值）；沒有摘要檔或已過期時回傳 None"""
+        try:
+            with open(summary_path(self.cache_dir, key), 'r', encoding='utf-8') as f:
+                summary = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return summary if summary_is_current(summary, sig) else None
+
+    def load_document(self, key):
+        """取得完整批次文件（含 measurements），優先從 LRU 取用"""
+        path = batch_path(self.cache_dir, key)
+        if path.suffix == BINARY_SUFFIX:
+            # 二進位格式每次以 mmap 直接還原，不佔用 LRU
+            return read_batch(path)
+        st = path.stat()
+        cache_key = (path.name, st.st_mtime_ns, st.st_size)
+        doc = self.docs.get(cache_key)
+        if doc is None:
+            doc = read_batch(path)
+            # 以檔案大小估算記憶體用量
+            self.docs.put(cache_key, doc, st.st_size)
+        return doc
+
+    def attach_measurements(self, row):
+        """回傳 spc_items 換成完整特性資料（含 measurements）的資料列"""
+        key = row.get('cache_key')
+        if key is None:
+            return row
+        doc = self.load_document(key)
+        return dict(row, spc_items=doc.get('features', []))
+
+class DatasetStore:
+    """
+    持有目前的資料快照。讀取端直接讀 `current`（單一屬性讀取，不需加鎖）；
+    重載與異動在寫入鎖內建立新快照後，再一次指派切換。
+    最近幾版快照會保留一段時間，讓 cursor 分頁在重載後仍能讀完同一版資料。
+    """
+
+    def __init__(self, source, poll_interval=5.0, keep_versions=4):
+        self.source = source
+        self.poll_interval = poll_interval
+        self.keep_versions = keep_versions
+        self._recent = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = 0
+        self._signature = None
+        self._stop = threading.Event()
+        self._watcher = None
+        self.current = None
+        self.reload()
+
+    def reload(self):
+        """重新解析資料來源並切換快照；解析失敗時保留舊快照，回傳是否切換成功"""
+        with self._lock:
+            signature = self.source.signature()
+            try:
+                rows = self.source.load_rows()
+            except Exception:
+                if self.current is None:
+                    raise
+                # 記下這次的 signature，等檔案再次變動才重試（例如寫到一半的檔案）
+                self._signature = signature
+                logger.exception("資料重載失敗，沿用版本 %s", self.current.version)
+                return False
+            self._version += 1
+            snapshot = DatasetSnapshot(rows, self._version)
+            self._signature = signature
+            self._publish(snapshot)
+        logger.info("資料快照切換至版本 %s（%s 筆）", snapshot.version, len(snapshot))
+        return True
+
+    def update_row(self, pos, row):
+        """替換第 pos 列資料並切換到新版本快照"""
+        with self._lock:
+            self._version += 1
+            self._publish(self.current.replace_row(pos, row, self._version))
+        return self.current
+
+    def _publish(self, snapshot):
+        # 呼叫端需持有寫入鎖
+        self._recent[snapshot.version] = snapshot
+        while len(self._recent) > self.keep_versions:
+            self._recent.popitem(last=False)
+        self.current = snapshot
+
+    def get_snapshot(self, version):
+        """取得指定版本的快照；已被淘汰時回傳 None"""
+        return self._recent.get(version)
+
+    def check_reload(self):
+        """資料來源有變動時才重載"""
+        signature = self.source.signature()
+        if signature is not None and signature != self._signature:
+            return self.reload()
+        return False
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.check_reload()
+            except Exception:
+                logger.exception("資料來源監控失敗")
+
+    def start_watcher(self):
+        """啟動背景 watcher 執行緒；poll_interval <= 0 時不啟動"""
+        if self.poll_interval <= 0 or self._watcher is not None:
+            return
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, name="dataset-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self):
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
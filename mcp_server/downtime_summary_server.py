@@ -10,33 +10,19 @@ downtime_summary_server.py
 """
 
 import config.setting as setting
-import pandas as pd
 from pathlib import Path
-from typing import Dict, Any, List
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel, Field
-import uuid
+from mcp_server import metrics
+from mcp_server.tool_common import CSV_CACHE, ToolCall, ToolResult, run_tool_call
 
 # 設定資料來源資料夾
 DATA_DIR = Path(setting.MOCK_DOWNTIME_SUMMARY)
 
-# MCP Tool Schema & Pydantic 模型
-class ToolCall(BaseModel):
-    trace_id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    tool: str
-    args: Dict[str, Any]
-
-# ToolResult Schema
-class ToolResult(BaseModel):
-    trace_id: str
-    status: str
-    data: List[Dict[str, Any]]
-
 # 建立 FastAPI 伺服器
 app = FastAPI(title="Downtime Summary MCP-server")
+metrics.instrument(app, "downtime_summary")
 
-# 路由：處理工具呼叫
-@app.post("/tool_call", response_model=ToolResult)
+# 處理工具呼叫
 def handle_tool_call(req: ToolCall):
     if req.tool != "downtime_summary":
         raise HTTPException(400, "Unsupported tool")
@@ -45,21 +31,24 @@ def handle_tool_call(req: ToolCall):
         raise HTTPException(400, "date required")
 
     csv_path = DATA_DIR / f"{date}.csv"
-    if not csv_path.exists():
-        raise HTTPException(404, f"No downtime data for {date}")
-
     try:
-        df = pd.read_csv(csv_path, encoding="utf-8")
+        records = CSV_CACHE.load(csv_path, encoding="utf-8")
+    except FileNotFoundError:
+        raise HTTPException(404, f"No downtime data for {date}")
     except Exception as e:
         raise HTTPException(500, f"Failed to read downtime data: {e}")
 
-    records = df.to_dict(orient="records")
     return ToolResult(
         trace_id=req.trace_id,
         status="OK",
         data=records
     )
 
+# 路由：在共用執行緒池執行 handle_tool_call，同時進行的相同查詢只執行一次
+@app.post("/tool_call", response_model=ToolResult)
+async def tool_call(req: ToolCall):
+    return await run_tool_call(handle_tool_call, req, "downtime_summary")
+
 # 啟動 FastAPI 伺服器
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+fast_json.py
+
+unified_server 的 JSON 輸出：有安裝 orjson 時使用 orjson，否則退回標準 json（輸出格式相同，皆為 UTF-8 bytes，NaN/Inf 皆輸出為 null）。
+JSONFragments 包裝已序列化好的 JSON 元素（例如快照中預先序列化的資料列），
+輸出時直接以 bytes 拼接成 JSON array，不需逐列建立 dict 再序列化。
+"""
+
+import json
+import math
+import uuid
+
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:  # orjson 列於 requirements.txt；未安裝時退回標準 json，輸出相同
+    orjson = None
+
+def _finite(obj):
+    # NaN/Inf 轉為 None，與 orjson 輸出 null 相同
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {k: _finite(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_finite(v) for v in obj]
+    return obj
+
+def _dumps(obj):
+    if orjson is not None:
+        return orjson.dumps(obj)
+    try:
+        text = json.dumps(obj, ensure_ascii=False, allow_nan=False, separators=(",", ":"))
+    except ValueError:
+        # 含 NaN/Inf 時才逐項轉換，一般資料不多走一次
+        text = json.dumps(_finite(obj), ensure_ascii=False, allow_nan=False, separators=(",", ":"))
+    return text.encode("utf-8")
+
+class JSONFragments:
+    """已序列化的 JSON 元素清單，輸出時拼接為一個 JSON array"""
+    __slots__ = ('items',)
+
+    def __init__(self, items):
+        self.items = items
+
+    def __len__(self):
+        return len(self.items)
+
+    def raw(self):
+        return b"[" + b",".join(self.items) + b"]"
+
+def dumps(obj):
+    """
+    序列化為 UTF-8 JSON bytes。
+    JSONFragments 可出現在最外層 dict 的值，或最外層 dict 中 list 裡各 dict 的 "data" 值
+    （例如 {"data": ...} 與 {"results": [{"data": ...}]}）。
+    """
+    if not isinstance(obj, dict):
+        return _dumps(obj)
+    raws = {}
+    token_prefix = f"__fragment_{uuid.uuid4().hex}_"
+
+    def swap(d):
+        out = {}
+        for k, v in d.items():
+            if isinstance(v, JSONFragments):
+                token = f"{token_prefix}{len(raws)}"
+                raws[token] = v.raw()
+                v = token
+            out[k] = v
+        return out
+
+    top = swap(obj)
+    for k, v in top.items():
+        if isinstance(v, list):
+            top[k] = [
+                swap(i) if isinstance(i, dict) and isinstance(i.get("data"), JSONFragments) else i
+                for i in v
+            ]
+    body = _dumps(top)
+    for token, raw in raws.items():
+        body = body.replace(b'"' + token.encode("ascii") + b'"', raw, 1)
+    return body
+
+class FastJSONResponse(Response):
+    """以 fast_json.dumps 輸出的 JSONResponse"""
+    media_type = "application/json"
+
+    def render(self, content):
+        return dumps(content)
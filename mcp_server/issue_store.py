@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+issue_store.py
+
+issue_tracker_server 的記憶體工單表：issues.csv 解析一次後常駐記憶體，
+並建立 status/owner/batch_id 等值索引、未結案工單清單與 created_at 排序索引。
+檔案變動時若只是在尾端追加新工單，只解析追加的部分；其他變動才整份重新載入。
+"""
+
+import hashlib
+import io
+import math
+import os
+import threading
+from bisect import bisect_left, bisect_right, insort
+
+import pandas as pd
+
+from mcp_server.dataset_store import _intersect
+
+ISSUE_INDEX_FIELDS = ('status', 'owner', 'batch_id')
+CLOSED_STATUS = 'closed'
+
+def _index_key(value):
+    # 索引值一律轉成字串（CSV 數字欄如 batch_id 會被解析為 int；含空欄時為 float，101.0 也以 "101" 索引），
+    # NaN（空欄）以 None 表示
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+class IssueStore:
+    """
+    以 path 的 (mtime, size) 判斷是否需要重載；refresh() 後以 query() 查詢。
+    列位置即 CSV 中的順序，所有 posting list 維持遞增排序。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.rows = []
+        self.indexes = {f: {} for f in ISSUE_INDEX_FIELDS}
+        self.open_positions = []
+        self.created_index = []  # 依 created_at 排序的 (created_at, 列位置)
+        self.columns = None
+        self.dtypes = None  # 整份載入時各欄的 dtype，追加的部分以相同型別解析
+        self._signature = None
+        self._size = 0
+        self._digest = None  # 已載入內容的雜湊，用來確認檔案只在尾端追加
+        self._ends_newline = True
+        self._lock = threading.Lock()
+
+    def _reset(self):
+        self.rows = []
+        self.indexes = {f: {} for f in ISSUE_INDEX_FIELDS}
+        self.open_positions = []
+        self.created_index = []
+
+    def _append(self, records, bulk=False):
+        """
+        加入工單並更新索引。bulk 為整份載入：created_index 收集後排序一次；
+        尾端追加的少量工單才以 insort 插入既有索引。
+        """
+        for record in records:
+            pos = len(self.rows)
+            self.rows.append(record)
+            for f in ISSUE_INDEX_FIELDS:
+                self.indexes[f].setdefault(_index_key(record.get(f)), []).append(pos)
+            if record.get('status') != CLOSED_STATUS:
+                self.open_positions.append(pos)
+            created = _index_key(record.get('created_at'))
+            if created is not None:
+                if bulk:
+                    self.created_index.append((created, pos))
+                else:
+                    insort(self.created_index, (created, pos))
+        if bulk:
+            self.created_index.sort()
+
+    def refresh(self):
+        """檔案有變動時重載；回傳檔案是否存在"""
+        with self._lock:
+            try:
+                st = os.stat(self.path)
+            except FileNotFoundError:
+                self._reset()
+                self._signature = None
+                return False
+            signature = (st.st_mtime_ns, st.st_size)
+            if signature == self._signature:
+                return True
+            with open(self.path, 'rb') as f:
+                content = f.read()
+            appended = (
+                self._signature is not None and self.columns is not None and self._ends_newline
+                and len(content) > self._size
+                and hashlib.blake2b(content[:self._size]).digest() == self._digest
+            )
+            tail = None
+            if appended:
+                try:
+                    tail = pd.read_csv(io.BytesIO(content[self._size:]), header=None, names=self.columns,
+                                       dtype=self.dtypes)
+                except (ValueError, TypeError):
+                    # 追加的資料無法以原型別解析（例如整數欄出現空值），改為整份重新載入
+                    tail = None
+            if tail is not None:
+                self._append(tail.to_dict(orient="records"))
+            else:
+                df = pd.read_csv(io.BytesIO(content))
+                self._reset()
+                self.columns = list(df.columns)
+                self.dtypes = df.dtypes.to_dict()
+                self._append(df.to_dict(orient="records"), bulk=True)
+            self._signature = signature
+            self._size = len(content)
+            self._digest = hashlib.blake2b(content).digest()
+            self._ends_newline = content.endswith(b'\n')
+            return True
+
+    def _created_range(self, start, end):
+        lo = bisect_left(self.created_index, (start,)) if start else 0
+        # end 以前綴比對：end='2025-06-30' 也包含 '2025-06-30 18:00'
+        hi = bisect_right(self.created_index, (end + '\uffff',)) if end else len(self.created_index)
+        return sorted(pos for _, pos in self.created_index[lo:hi])
+
+    def query(self, status=None, owner=None, batch_id=None, created_from=None, created_to=None, limit=None):
+        """
+        status 省略時回傳未結案工單（status != closed）；'all' 表示不限狀態；其他值為等值比對（可逗號分隔多個）。
+        owner、batch_id 為等值比對；created_from/created_to 為 created_at 區間（含頭尾）。
+        回傳依 CSV 順序排列的工單，最多 limit 筆。
+        """
+        with self._lock:
+            postings = []
+            if status is None:
+                postings.append(self.open_positions)
+            elif status != 'all':
+                values = [s.strip() for s in str(status).split(',') if s.strip()]
+                idx = self.indexes['status']
+                postings.append(sorted(p for v in values for p in idx.get(v, [])))
+            for f, v in (('owner', owner), ('batch_id', batch_id)):
+                if v is not None:
+                    postings.append(self.indexes[f].get(str(v), []))
+            if created_from or created_to:
+                postings.append(self._created_range(created_from, created_to))
+
+            if postings:
+                postings.sort(key=len)
+                positions = postings[0]
+                for p in postings[1:]:
+                    if not positions:
+                        break
+                    positions = _intersect(positions, p)
+            else:
+                positions = range(len(self.rows))
+            if limit is not None:
+                positions = positions[:limit]
+            return [self.rows[pos] for pos in positions]
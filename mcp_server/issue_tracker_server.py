@@ -3,49 +3,64 @@
 issue_tracker_server.py
 
 自動彙整所有未結案的異常/缺陷工單，回傳工單明細。
+工單表常駐記憶體（見 issue_store.py），可用 status、owner、batch_id、created_from/created_to 篩選，limit 限制筆數。
 標準 API 回傳格式，支援 LLM 多工具自動化查詢。
 
 啟動方式：
   uvicorn mcp_server.issue_tracker_server:app --host 0.0.0.0 --port 8008
 """
 
-from fastapi import FastAPI
-from pydantic import BaseModel
-from typing import Any, Dict, List
+from fastapi import FastAPI, HTTPException
 import config.setting as setting
-import pandas as pd
 from pathlib import Path
-import uuid
+from mcp_server import metrics
+from mcp_server.issue_store import IssueStore
+from mcp_server.tool_common import ToolCall, ToolResult, run_tool_call
 
 # Issue Tracker Server
 DATA_DIR = Path(setting.MOCK_ISSUE_TRACKER)
-
-# MCP Tool Schema & Pydantic 模型
-class ToolCall(BaseModel):
-    trace_id: str = str(uuid.uuid4())
-    tool: str
-    args: Dict[str, Any]
-
-# ToolResult Schema
-class ToolResult(BaseModel):
-    trace_id: str
-    status: str
-    data: List[Dict[str, Any]]
+ISSUES = IssueStore(DATA_DIR / "issues.csv")
 
 # 建立 FastAPI 伺服器
 app = FastAPI()
+metrics.instrument(app, "issue_tracker")
 
 # 將字串轉為 datetime 物件
-@app.post("/tool_call", response_model=ToolResult)
-def tool_call(payload: ToolCall):
-    target_path = DATA_DIR / "issues.csv"
-    if not target_path.exists():
+def handle_tool_call(payload: ToolCall):
+    args = payload.args
+    limit = args.get("limit")
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except (TypeError, ValueError):
+            raise HTTPException(400, "limit must be an integer")
+        if limit < 0:
+            raise HTTPException(400, "limit must be >= 0")
+
+    try:
+        with metrics.phase("refresh"):
+            exists = ISSUES.refresh()
+    except Exception as e:
+        raise HTTPException(500, f"Failed to read issue data: {e}")
+    if not exists:
         return ToolResult(trace_id=payload.trace_id, status="NO_DATA", data=[])
-    df = pd.read_csv(target_path)
-    not_closed = df[df['status'] != 'closed']
-    data = not_closed.to_dict(orient="records")
+    with metrics.phase("query"):
+        data = ISSUES.query(
+            status=args.get("status"),
+            owner=args.get("owner"),
+            batch_id=args.get("batch_id"),
+            created_from=args.get("created_from"),
+            created_to=args.get("created_to"),
+            limit=limit,
+        )
+    metrics.add_rows(len(data))
     return ToolResult(trace_id=payload.trace_id, status="OK", data=data)
 
+# 路由：在共用執行緒池執行 handle_tool_call，同時進行的相同查詢只執行一次
+@app.post("/tool_call", response_model=ToolResult)
+async def tool_call(payload: ToolCall):
+    return await run_tool_call(handle_tool_call, payload, "issue_tracker")
+
 # 啟動 FastAPI 伺服器
 if __name__ == "__main__":
     import uvicorn
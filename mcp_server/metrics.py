@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+metrics.py
+
+MCP server 的效能量測：
+- 每個請求建立一個 RequestTiming（放在 contextvar），程式中以 `with phase("parse"):` 累計各階段耗時，
+  add_rows() 記錄掃描的資料列數；
+- MetricsMiddleware 在回應加上 `Server-Timing`（各階段 + total）與 `X-Trace-Id` 標頭，
+  請求結束後寫入行程內的 REGISTRY 並記錄一行含 trace_id 的 log；
+- GET /metrics 以 Prometheus 文字格式輸出各 tool 的延遲 histogram、各階段耗時、掃描列數與快取命中率。
+  tool label 為 set_tool() 設定的名稱；未設定時用比對到的路由樣板（例如 /api/query/{type}），
+  沒有比對到路由（404）時為 "other"，避免原始路徑讓 label 數量無上限。
+
+trace_id 來源依序為：請求標頭 X-Trace-Id、ToolCall.trace_id（run_tool_call 會寫入）、自動產生。
+"""
+
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+import logging
+import threading
+import time
+import uuid
+
+from fastapi.responses import PlainTextResponse
+
+logger = logging.getLogger("mcp_server.metrics")
+
+# 延遲 histogram 的 bucket 上界（秒）
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class RequestTiming:
+    """單一請求的計時資料"""
+
+    def __init__(self, server, tool, trace_id=None):
+        self.server = server
+        self.tool = tool
+        self.trace_id = trace_id
+        self.start = time.perf_counter()
+        self.phases = {}
+        self.rows = 0
+        self.handler_done = None
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def add_rows(self, n):
+        with self._lock:
+            self.rows += n
+
+    def server_timing(self, total):
+        parts = [f"{name};dur={sec * 1000:.2f}" for name, sec in self.phases.items()]
+        parts.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(parts)
+
+def escape_label(value):
+    """Prometheus label 值的跳脫（反斜線、雙引號、換行）"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def route_label(scope, root_path=""):
+    """請求比對到的路由樣板（含掛載前綴，不含外層的 root_path）；未比對到路由時為 other"""
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    if path is None:
+        return "other"
+    return scope.get("root_path", "")[len(root_path):] + path
+
+_CURRENT = ContextVar("mcp_request_timing", default=None)
+
+def current():
+    """目前請求的 RequestTiming；不在請求內（例如背景工作）時為 None"""
+    return _CURRENT.get()
+
+@contextmanager
+def phase(name):
+    """累計目前請求在 name 階段的耗時"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing = _CURRENT.get()
+        if timing is not None:
+            timing.add(name, time.perf_counter() - start)
+
+def add_rows(n):
+    """記錄目前請求掃描的資料列數"""
+    timing = _CURRENT.get()
+    if timing is not None:
+        timing.add_rows(n)
+
+def set_tool(tool, trace_id=None):
+    """設定目前請求的 tool 名稱（metrics 的 label）與 trace_id（已由標頭帶入時不覆寫）"""
+    timing = _CURRENT.get()
+    if timing is not None:
+        timing.tool = tool
+        if trace_id and not timing.trace_id:
+            timing.trace_id = trace_id
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class MetricsRegistry:
+    """行程內的 metrics 彙總（tool_gateway 承載多個 tool 時共用同一份）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency = {}    # (server, tool) -> Histogram
+        self.phases = {}     # (server, tool, phase) -> Histogram
+        self.rows = {}       # (server, tool) -> 掃描列數
+        self.requests = {}   # (server, tool, status) -> 請求數
+        self.caches = {}     # 名稱 -> 有 hits/misses 屬性的物件
+        self.gauges = {}     # 名稱 -> 回傳數值的函數
+
+    def register_cache(self, name, cache):
+        self.caches[name] = cache
+
+    def register_gauge(self, name, fn):
+        self.gauges[name] = fn
+
+    def record(self, timing, status, total):
+        key = (timing.server, timing.tool)
+        with self._lock:
+            self.latency.setdefault(key, Histogram()).observe(total)
+            for name, sec in timing.phases.items():
+                self.phases.setdefault(key + (name,), Histogram()).observe(sec)
+            self.rows[key] = self.rows.get(key, 0) + timing.rows
+            status_key = key + (str(status),)
+            self.requests[status_key] = self.requests.get(status_key, 0) + 1
+
+    def render(self):
+        """Prometheus 文字格式"""
+        lines = []
+
+        def labels(**kv):
+            return "{" + ",".join(f'{k}="{escape_label(v)}"' for k, v in kv.items()) + "}"
+
+        def histogram(name, help_text, items, label_names):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for key, h in sorted(items.items()):
+                base = dict(zip(label_names, key))
+                cumulative = 0
+                for le, n in zip(self.buckets_of(h), h.counts):
+                    cumulative += n
+                    lines.append(f"{name}_bucket{labels(**base, le=le)} {cumulative}")
+                lines.append(f"{name}_sum{labels(**base)} {h.sum:.6f}")
+                lines.append(f"{name}_count{labels(**base)} {h.count}")
+
+        with self._lock:
+            histogram("mcp_request_duration_seconds", "Request latency per tool.",
+                      self.latency, ("server", "tool"))
+            histogram("mcp_phase_duration_seconds", "Time spent per phase (io, parse, filter, serialize, ...).",
+                      self.phases, ("server", "tool", "phase"))
+            lines.append("# HELP mcp_requests_total Requests per tool and HTTP status.")
+            lines.append("# TYPE mcp_requests_total counter")
+            for (server, tool, status), n in sorted(self.requests.items()):
+                lines.append(f"mcp_requests_total{labels(server=server, tool=tool, status=status)} {n}")
+            lines.append("# HELP mcp_rows_scanned_total Rows scanned per tool.")
+            lines.append("# TYPE mcp_rows_scanned_total counter")
+            for (server, tool), n in sorted(self.rows.items()):
+                lines.append(f"mcp_rows_scanned_total{labels(server=server, tool=tool)} {n}")
+
+        lines.append("# HELP mcp_cache_requests_total Cache lookups by result.")
+        lines.append("# TYPE mcp_cache_requests_total counter")
+        ratios = []
+        for name, cache in sorted(self.caches.items()):
+            hits, misses = cache.hits, cache.misses
+            lines.append(f"mcp_cache_requests_total{labels(cache=name, result='hit')} {hits}")
+            lines.append(f"mcp_cache_requests_total{labels(cache=name, result='miss')} {misses}")
+            ratios.append(f"mcp_cache_hit_ratio{labels(cache=name)} {hits / (hits + misses) if hits + misses else 0:.4f}")
+        lines.append("# HELP mcp_cache_hit_ratio Cache hit ratio since start.")
+        lines.append("# TYPE mcp_cache_hit_ratio gauge")
+        lines.extend(ratios)
+        for name, fn in sorted(self.gauges.items()):
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {fn()}")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def buckets_of(h):
+        return [str(b) for b in h.buckets] + ["+Inf"]
+
+REGISTRY = MetricsRegistry()
+
+class MetricsMiddleware:
+    """
+    ASGI middleware：為每個請求建立 RequestTiming，回應加上 Server-Timing 與 X-Trace-Id，結束後寫入 REGISTRY。
+    巢狀掛載（tool_gateway 掛載各 tool server）時只由最外層處理。
+    """
+
+    def __init__(self, app, server):
+        self.app = app
+        self.server = server
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or _CURRENT.get() is not None or scope["path"].endswith("/metrics"):
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get("headers") or [])
+        trace_id = headers.get(b"x-trace-id", b"").decode("latin-1") or None
+        root_path = scope.get("root_path", "")
+        timing = RequestTiming(self.server, None, trace_id)
+        token = _CURRENT.set(timing)
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                now = time.perf_counter()
+                if timing.handler_done is not None:
+                    timing.add("serialize", now - timing.handler_done)
+                if not timing.trace_id:
+                    timing.trace_id = uuid.uuid4().hex
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", timing.server_timing(now - timing.start).encode("latin-1")))
+                if not any(k.lower() == b"x-trace-id" for k, _ in headers):
+                    headers.append((b"x-trace-id", timing.trace_id.encode("latin-1")))
+                message = dict(message, headers=headers)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _CURRENT.reset(token)
+            if timing.tool is None:
+                # 路由比對後 scope 會帶有 route（巢狀掛載時 root_path 含掛載前綴）
+                timing.tool = route_label(scope, root_path)
+            total = time.perf_counter() - timing.start
+            REGISTRY.record(timing, status, total)
+            logger.info(
+                "trace_id=%s server=%s tool=%s status=%s total_ms=%.2f rows=%d phases=%s",
+                timing.trace_id, timing.server, timing.tool, status, total * 1000, timing.rows,
+                ",".join(f"{k}:{v * 1000:.2f}" for k, v in timing.phases.items()),
+            )
+
+def metrics_endpoint():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+def instrument(app, server):
+    """為 FastAPI app 加上 MetricsMiddleware 與 GET /metrics"""
+    app.add_middleware(MetricsMiddleware, server=server)
+    app.add_api_route("/metrics", metrics_endpoint, methods=["GET"], include_in_schema=False)
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+response_cache.py
+
+unified_server 的查詢結果快取：以「正規化查詢參數 + 資料快照版本」為 key，
+直接快取序列化後的回應位元組與 ETag。資料快照切換到新版本時整個快取失效。
+"""
+
+import hashlib
+import threading
+
+from mcp_server.dataset_store import ByteLRU
+
+def make_etag(version, body):
+    """ETag = 快照版本 + 回應內容雜湊"""
+    digest = hashlib.blake2b(body, digest_size=8).hexdigest()
+    return f'"{version}-{digest}"'
+
+def etag_matches(if_none_match, etag):
+    """判斷 If-None-Match 標頭是否包含 etag（支援多值、弱比對與 *）"""
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        if tag == '*' or tag == etag:
+            return True
+    return False
+
+class ResponseCache:
+    """
+    有位元組上限的 LRU 回應快取，只保存目前最新快照版本的結果。
+    以舊版本快照回答的查詢（例如 cursor 分頁）不讀寫快取。
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self._lru = ByteLRU(max_bytes)
+        self._lock = threading.Lock()
+
+    def _sync_version(self, version):
+        # 回傳此版本是否可使用快取；遇到更新的版本時清空快取
+        # （key 也帶版本號，切換瞬間併發寫入的舊版結果不會被新版查詢讀到）
+        with self._lock:
+            if self.version is None or version > self.version:
+                self.version = version
+                self._lru = ByteLRU(self.max_bytes)
+            return version == self.version
+
+    def get(self, key, version):
+        """取得 (body, etag)；未命中回傳 None"""
+        entry = self._lru.get((version, key)) if self._sync_version(version) else None
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def put(self, key, version, body, etag):
+        if self._sync_version(version):
+            self._lru.put((version, key), (body, etag), len(body))
+
+    def __len__(self):
+        return len(self._lru)
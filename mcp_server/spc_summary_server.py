@@ -3,57 +3,24 @@
 spc_summary_server.py
 
 自動彙整每批所有特徵的SPC能力統計（Cpk/Ppk），逐項判斷異常與明細，標準API回傳格式。
+也可一次查詢多個批次（batch_ids、glob、日期/機台篩選），見 batch_source.py。
 啟動方式：
   uvicorn mcp_server.spc_summary_server:app --host 0.0.0.0 --port 8002
 """
 
-import config.setting as setting
-from pathlib import Path
-import json
-from pathlib import Path
-from typing import Dict, Any, List
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel, Field
-import uuid
+from mcp_server import metrics
+from mcp_server.batch_source import batch_tool_response
+from mcp_server.tool_common import ToolCall, ToolResult, run_tool_call
 
 CPK_PPK_THRESHOLD = 1.33   # 製程能力異常的閾值
 
-# 設定 JSON cache 存放目錄
-CACHE_DIR = Path(setting.JSON_CACHE)
-
-# MCP Tool Schema & Pydantic
-class ToolCall(BaseModel):
-    trace_id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    tool: str
-    args: Dict[str, Any]
-
-class ToolResult(BaseModel):
-    trace_id: str
-    status: str
-    data: List[Dict[str, Any]]
-
 # FastAPI 伺服器
 app = FastAPI(title="SPC Summary MCP-server")
+metrics.instrument(app, "spc_summary")
 
-# 路由：處理工具呼叫
-@app.post("/tool_call", response_model=ToolResult)
-def handle_tool_call(req: ToolCall):
-    if req.tool != "spc_summary":
-        raise HTTPException(400, "Unsupported tool")
-    batch_id = req.args.get("batch_id")
-    if not batch_id:
-        raise HTTPException(400, "batch_id required")
-
-    json_path = CACHE_DIR / f"{batch_id}.json"
-    if not json_path.exists():
-        raise HTTPException(404, f"Batch {batch_id} not found")
-
-    try:
-        with open(json_path, "r", encoding="utf-8") as f:
-            batch_data = json.load(f)
-    except Exception as e:
-        raise HTTPException(500, f"Failed to load batch: {e}")
-
+def build_spc_summary(batch_id, batch_data):
+    """單一批次的 SPC 摘要"""
     features = batch_data.get("features", [])
     meta = batch_data.get("meta", {})
     summary = batch_data.get("summary", {})
@@ -76,7 +43,7 @@ def handle_tool_call(req: ToolCall):
            (feat.get("ppk") is not None and feat.get("ppk") < CPK_PPK_THRESHOLD):
             abnormal_spc.append(spc_item)
 
-    summary_result = {
+    return {
         "batch_id": batch_id,
         "machine_id": meta.get("machine_id"),
         "product_name": summary.get("product_name"),
@@ -91,11 +58,18 @@ def handle_tool_call(req: ToolCall):
         "type": "spc_summary_result"
     }
 
-    return ToolResult(
-        trace_id=req.trace_id,
-        status="OK",
-        data=[summary_result]
-    )
+# 處理工具呼叫
+# args：batch_id（單批）或 batch_ids / glob / date、start_date、end_date（生產日期）、machine_id（多批），
+#       stream=true 以 NDJSON 串流、only_abnormal=true 只回傳有異常的批次
+def handle_tool_call(req: ToolCall):
+    if req.tool != "spc_summary":
+        raise HTTPException(400, "Unsupported tool")
+    return batch_tool_response(req, build_spc_summary)
+
+# 路由：在共用執行緒池執行 handle_tool_call，同時進行的相同查詢只執行一次
+@app.post("/tool_call", response_model=ToolResult)
+async def tool_call(req: ToolCall):
+    return await run_tool_call(handle_tool_call, req, "spc_summary")
 
 # 主程式（可選）
 if __name__ == "__main__":
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+tool_common.py
+
+各 MCP tool server 共用的元件：tool_call 的 Pydantic Schema、同一行程內共用的工作執行緒池、
+相同 tool_call 的合併執行（single-flight），以及依檔案 mtime/size 驗證的檔案解析結果快取。
+各階段耗時與掃描列數記錄到目前請求的 metrics（見 metrics.py）。
+單獨啟動某個 tool server 或由 tool_gateway 一次承載全部 tool 時，都使用這裡的定義。
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, List
+import uuid
+
+import pandas as pd
+from pydantic import BaseModel, Field
+
+import config.setting as setting
+from mcp_server import metrics
+from mcp_server.dataset_store import ByteLRU
+
+# MCP Tool Schema & Pydantic 模型
+class ToolCall(BaseModel):
+    trace_id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    tool: str
+    args: Dict[str, Any]
+
+# ToolResult Schema
+class ToolResult(BaseModel):
+    trace_id: str
+    status: str
+    data: List[Dict[str, Any]]
+
+# 同一行程內所有 tool 共用的工作執行緒池（檔案讀取、pandas 解析等阻塞工作）
+EXECUTOR = ThreadPoolExecutor(max_workers=setting.TOOL_WORKERS, thread_name_prefix="mcp-tool")
+
+class SingleFlight:
+    """
+    合併同時進行的相同呼叫：同一個 key 已有工作在 EXECUTOR 執行時，後到的呼叫直接等待同一個結果
+    （包含例外），不重複讀檔與解析。工作完成後即移除，之後的呼叫會重新執行。
+    """
+
+    def __init__(self, executor):
+        self.executor = executor
+        self.coalesced = 0
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key, fn, *args):
+        """回傳執行 fn(*args) 的 concurrent.futures.Future；相同 key 進行中時回傳同一個 Future"""
+        with self._lock:
+            future = self._inflight.get(key)
+            # 已完成但 done callback 尚未移除的工作不合併，避免拿到舊結果
+            if future is not None and not future.done():
+                self.coalesced += 1
+                return future
+            future = self.executor.submit(fn, *args)
+            self._inflight[key] = future
+        future.add_done_callback(lambda f: self._forget(key, f))
+        return future
+
+    def _forget(self, key, future):
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+SINGLE_FLIGHT = SingleFlight(EXECUTOR)
+
+def tool_call_key(req):
+    """以 tool 與正規化後的 args（排序 key、略過值為 None 的參數）作為合併的 key"""
+    args = {k: v for k, v in req.args.items() if v is not None}
+    return req.tool, json.dumps(args, sort_keys=True, ensure_ascii=False, default=str)
+
+def _timed_handler(handler, req, submitted):
+    # 在工作執行緒中執行；contextvars 由 run_tool_call 複製，階段耗時記入發起請求的 metrics
+    started = time.perf_counter()
+    timing = metrics.current()
+    if timing is not None:
+        timing.add("queue", started - submitted)
+    with metrics.phase("handler"):
+        return handler(req)
+
+async def run_tool_call(handler, req, tool):
+    """
+    在 EXECUTOR 上執行 handler(req)，不阻塞 event loop；同時進行的相同 tool_call 只執行一次。
+    合併的呼叫各自取得帶有自己 trace_id 的 ToolResult。串流回應（args.stream）無法共用，一律個別執行。
+    tool 為 server 固定的 tool 名稱，作為 metrics 的 label（不使用用戶端送來的 req.tool，避免 label 數量無上限）。
+    """
+    metrics.set_tool(tool, req.trace_id)
+    ctx = contextvars.copy_context()
+    submitted = time.perf_counter()
+    if req.args.get("stream"):
+        return await asyncio.wrap_future(EXECUTOR.submit(ctx.run, _timed_handler, handler, req, submitted))
+    future = SINGLE_FLIGHT.submit(tool_call_key(req), ctx.run, _timed_handler, handler, req, submitted)
+    try:
+        result = await asyncio.wrap_future(future)
+    finally:
+        timing = metrics.current()
+        if timing is not None:
+            if "handler" not in timing.phases:
+                # 合併到其他請求的執行結果，只記錄等待時間
+                timing.add("coalesced", time.perf_counter() - submitted)
+            timing.handler_done = time.perf_counter()
+    if isinstance(result, ToolResult) and result.trace_id != req.trace_id:
+        result = result.model_copy(update={"trace_id": req.trace_id})
+    return result
+
+def records_nbytes(records):
+    """估算 records（list of dict）佔用的記憶體位元組數，作為 LRU 上限的計量"""
+    total = sys.getsizeof(records)
+    for row in records:
+        total += sys.getsizeof(row)
+        for v in row.values():
+            total += sys.getsizeof(v)
+    return total
+
+class ParsedFileCache:
+    """
+    檔案解析結果快取：以檔案路徑為 key，保存 (mtime, size) 與解析結果。
+    每次讀取都先 stat 檔案，mtime 或 size 與快取不同時重新解析；總量以 LRU 限制在 max_bytes 以內。
+    回傳的解析結果由多個請求共用，呼叫端不可修改。
+    """
+
+    def __init__(self, max_bytes=128 * 1024 * 1024):
+        self._lru = ByteLRU(max_bytes)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path, parse, sizeof):
+        """
+        回傳 parse(path) 的結果（可能來自快取）；sizeof(value, stat) 估算結果佔用的位元組數。
+        檔案不存在時丟出 FileNotFoundError，解析失敗時丟出 parse 的例外。
+        """
+        path = os.fspath(path)
+        with metrics.phase("io"):
+            st = os.stat(path)
+        signature = (st.st_mtime_ns, st.st_size)
+        entry = self._lru.get(path)
+        if entry is not None and entry[0] == signature:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        with metrics.phase("parse"):
+            value = parse(path)
+        self._lru.put(path, (signature, value), sizeof(value, st))
+        return value
+
+class CsvRecordCache(ParsedFileCache):
+    """CSV 解析結果快取，保存 to_dict(orient="records") 的結果"""
+
+    def load(self, path, **read_csv_kwargs):
+        """讀取 CSV 並回傳 records；檔案不存在時丟出 FileNotFoundError，解析失敗時丟出 pandas 的例外"""
+        records = self.get(
+            path,
+            lambda p: pd.read_csv(p, **read_csv_kwargs).to_dict(orient="records"),
+            lambda records, st: records_nbytes(records),
+        )
+        metrics.add_rows(len(records))
+        return records
+
+# 同一行程內所有 tool 共用的 CSV 快取
+CSV_CACHE = CsvRecordCache(setting.CSV_CACHE_MAX_BYTES)
+metrics.REGISTRY.register_cache("csv", CSV_CACHE)
+metrics.REGISTRY.register_gauge("mcp_single_flight_coalesced_total", lambda: SINGLE_FLIGHT.coalesced)
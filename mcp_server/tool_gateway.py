@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+tool_gateway.py
+
+單一行程承載全部 MCP tool server（batch_anomaly、spc_summary、production、downtime、yield、
+anomaly_trend、KPI、issue_tracker）。POST /tool_call 依 ToolCall.tool 分派到對應的 handler，
+所有 tool 共用同一個工作執行緒池與資料快取，同時進行的相同 tool_call 只執行一次；
+原本各 server 的路由也掛在 /<tool>/tool_call 下。
+
+需要隔離時，可只承載部分 tool（--tools 或 settings 的 GATEWAY_TOOLS），
+其餘 tool 透過 TOOL_ENDPOINTS 轉送到另一個 gateway 或單獨啟動的 tool server。
+
+啟動方式：
+  uvicorn mcp_server.tool_gateway:app_from_settings --factory --host 0.0.0.0 --port 8010
+  python -m mcp_server.tool_gateway --tools spc_summary,batch_anomaly --port 8011
+"""
+
+import argparse
+import asyncio
+import importlib
+
+import requests
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
+
+import config.setting as setting
+from mcp_server import metrics
+from mcp_server.tool_common import EXECUTOR, ToolCall, ToolResult, run_tool_call
+
+# tool 名稱 -> 實作模組（模組需提供 app 與 handle_tool_call）
+TOOL_MODULES = {
+    "batch_anomaly": "mcp_server.batch_anomaly_server",
+    "spc_summary": "mcp_server.spc_summary_server",
+    "production_summary": "mcp_server.production_summary_server",
+    "downtime_summary": "mcp_server.downtime_summary_server",
+    "yield_summary": "mcp_server.yield_summary_server",
+    "anomaly_trend": "mcp_server.anomaly_trend_server",
+    "KPI_summary": "mcp_server.KPI_summary_server",
+    "issue_tracker": "mcp_server.issue_tracker_server",
+}
+
+def _relay(resp):
+    # 邊收邊轉送遠端的串流內容，結束（或用戶端中斷）時關閉連線
+    try:
+        yield from resp.iter_content(chunk_size=None)
+    finally:
+        resp.close()
+
+def forward_tool_call(url, req: ToolCall):
+    """
+    將 tool_call 轉送到其他行程的 tool server（帶上 X-Trace-Id，兩端 log 可用同一個 trace_id 對照）。
+    遠端回傳 NDJSON 串流（args.stream）時以 StreamingResponse 原樣轉送，其餘回應解析為 ToolResult。
+    """
+    try:
+        resp = requests.post(url, json=req.model_dump(), headers={"X-Trace-Id": req.trace_id}, timeout=30, stream=True)
+    except requests.RequestException as e:
+        raise HTTPException(502, f"Failed to reach {req.tool} at {url}: {e}")
+    content_type = resp.headers.get("content-type", "")
+    if resp.status_code < 400 and content_type.startswith("application/x-ndjson"):
+        return StreamingResponse(_relay(resp), media_type=content_type, headers={"X-Trace-Id": req.trace_id})
+    with resp:
+        if resp.status_code >= 400:
+            try:
+                detail = resp.json().get("detail", resp.text)
+            except ValueError:
+                detail = resp.text
+            raise HTTPException(resp.status_code, detail)
+        return ToolResult(**resp.json())
+
+def create_app(tools=None, endpoints=None):
+    """
+    建立 gateway。tools 為本行程承載的 tool 名稱（None 表示全部）；
+    endpoints 為 {tool: url}，列出的 tool 一律轉送到該 url。
+    """
+    endpoints = dict(endpoints or {})
+    tools = [t for t in (tools or TOOL_MODULES) if t not in endpoints]
+    unknown = [t for t in tools if t not in TOOL_MODULES]
+    if unknown:
+        raise ValueError(f"Unknown tools: {', '.join(unknown)}")
+
+    handlers = {}
+    gateway = FastAPI(title="MCP Tool Gateway")
+    metrics.instrument(gateway, "tool_gateway")
+    for tool in tools:
+        module = importlib.import_module(TOOL_MODULES[tool])
+        handlers[tool] = module.handle_tool_call
+        gateway.mount(f"/{tool}", module.app)
+
+    @gateway.get("/tools")
+    def list_tools():
+        return {"local": sorted(handlers), "remote": endpoints}
+
+    @gateway.post("/tool_call", response_model=ToolResult)
+    async def dispatch_tool_call(req: ToolCall):
+        if req.tool in handlers:
+            return await run_tool_call(handlers[req.tool], req, req.tool)
+        if req.tool in endpoints:
+            metrics.set_tool(req.tool, req.trace_id)
+            loop = asyncio.get_running_loop()
+            with metrics.phase("forward"):
+                return await loop.run_in_executor(EXECUTOR, forward_tool_call, endpoints[req.tool], req)
+        raise HTTPException(400, f"Unsupported tool: {req.tool}")
+
+    return gateway
+
+def _parse_tools(value):
+    if not value:
+        return None
+    if isinstance(value, str):
+        value = value.split(",")
+    return [t.strip() for t in value if t.strip()]
+
+def app_from_settings():
+    """依 settings 的 GATEWAY_TOOLS / TOOL_ENDPOINTS 建立 gateway（uvicorn --factory 使用，import 時不建立）"""
+    return create_app(_parse_tools(setting.GATEWAY_TOOLS), setting.TOOL_ENDPOINTS)
+
+# 啟動 FastAPI 伺服器
+if __name__ == "__main__":
+    import uvicorn
+    parser = argparse.ArgumentParser(description="MCP tool gateway")
+    parser.add_argument("--tools", type=str, default=setting.GATEWAY_TOOLS, help="本行程承載的 tool，逗號分隔（預設全部）")
+    parser.add_argument("--host", type=str, default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8010)
+    args = parser.parse_args()
+    uvicorn.run(create_app(_parse_tools(args.tools), setting.TOOL_ENDPOINTS), host=args.host, port=args.port)
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+trend_store.py
+
+anomaly_trend_server 的趨勢資料儲存：把每日的 {YYYY-MM-DD}.csv 壓實成以月份分區的檔案
+（每月一個 {YYYY-MM}.json，內容為 {date: 該日 CSV 文字}；只存資料，不用 pickle，讀取分區不會執行任何程式），
+並以 manifest 記錄各日檔的 mtime/size。每日的 DataFrame 由該日 CSV 文字解析，與直接讀取該日 CSV 相同，
+欄位與型別不因其他日期改變。
+每日檔新增或變動時，只重建受影響的月份分區；區間查詢只讀取涵蓋到的分區（平行讀取），
+只取區間內的日期，並可先以 machine_id/line 篩選再轉為 records。解析後的分區放在有位元組上限的 LRU。
+未指定 store_dir 時不寫入任何檔案（不寫進每日檔所在的資料夾），分區只保存在記憶體。
+分區檔無法讀取（寫入中斷、格式不符等）時視為快取失效，由每日檔重建。
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import io
+import json
+import logging
+import os
+from pathlib import Path
+import re
+import threading
+
+import pandas as pd
+
+from mcp_server.dataset_store import ByteLRU
+
+logger = logging.getLogger(__name__)
+
+DAY_FILE_RE = re.compile(r"^(\d{4})-(\d{2})-(\d{2})\.csv$")
+MANIFEST_NAME = "manifest.json"
+PUSHDOWN_FIELDS = ("machine_id", "line")
+
+class TrendStoreError(Exception):
+    """分區或每日檔讀取失敗"""
+
+def _write_atomic(path, write):
+    # 先寫暫存檔再 os.replace，查詢端不會讀到寫一半的分區
+    tmp = path.with_name(path.name + ".tmp")
+    write(tmp)
+    os.replace(tmp, path)
+
+def _parse_day(date, text):
+    df = pd.read_csv(io.StringIO(text))
+    df["date"] = date
+    return df
+
+def _frames_nbytes(frames):
+    return sum(int(df.memory_usage(index=True, deep=True).sum()) for df in frames.values())
+
+class TrendStore:
+    """
+    src_dir：每日 CSV 所在資料夾；store_dir：月份分區與 manifest 的存放位置（None 表示只放在記憶體）。
+    sync() 將每日檔的變動增量併入分區；query() 回傳日期區間內的 records。
+    """
+
+    def __init__(self, src_dir, store_dir=None, max_workers=4, max_bytes=128 * 1024 * 1024):
+        self.src_dir = Path(src_dir)
+        self.store_dir = Path(store_dir) if store_dir else None
+        # {month: {day_file: [mtime_ns, size]}}
+        self.manifest = {}
+        # 無法解析的每日檔 {day_file: ([mtime_ns, size], 錯誤訊息)}，檔案再次變動時才重試
+        self.errors = {}
+        # month -> (分區版本, {date: DataFrame})；分區版本為分區檔 mtime_ns，只放記憶體時為該月的 manifest
+        self._frames = ByteLRU(max_bytes)
+        # 查詢執行緒重建分區時也會取得此鎖，sync 內讀取分區時會重入
+        self._lock = threading.RLock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="trend-store")
+        self._load_manifest()
+
+    def _partition_path(self, month):
+        return self.store_dir / f"{month}.json"
+
+    def _load_manifest(self):
+        if self.store_dir is None:
+            return
+        path = self.store_dir / MANIFEST_NAME
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            return
+        except ValueError:
+            logger.warning("trend store: manifest %s unreadable, rebuilding all partitions", path)
+            return
+        # 分區檔遺失時視為未建立，下次 sync 重建該月份
+        self.manifest = {m: days for m, days in saved.items() if self._partition_path(m).exists()}
+
+    def _save_manifest(self):
+        if self.store_dir is None:
+            return
+        def write(tmp):
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.manifest, f, ensure_ascii=False, indent=1, sort_keys=True)
+        _write_atomic(self.store_dir / MANIFEST_NAME, write)
+
+    def _scan(self):
+        """回傳 {month: {day_file: [mtime_ns, size]}}"""
+        found = {}
+        if not self.src_dir.exists():
+            return found
+        with os.scandir(self.src_dir) as it:
+            for e in it:
+                m = DAY_FILE_RE.match(e.name)
+                if m and e.is_file():
+                    st = e.stat()
+                    found.setdefault(f"{m.group(1)}-{m.group(2)}", {})[e.name] = [st.st_mtime_ns, st.st_size]
+        return found
+
+    def _read_day(self, name):
+        """讀取每日檔，回傳 (CSV 文字, DataFrame)；無法解析時丟出例外"""
+        text = (self.src_dir / name).read_text(encoding="utf-8")
+        return text, _parse_day(name[:-4], text)
+
+    def _rebuild_month(self, month, days):
+        """依 days（該月目前的每日檔）增量更新分區，回傳實際併入分區的每日檔清單"""
+        old_days = self.manifest.get(month, {})
+        changed = [
+            d for d, sig in days.items()
+            if old_days.get(d) != sig and (d not in self.errors or self.errors[d][0] != sig)
+        ]
+        dropped = [d for d in old_days if d not in days or d in changed]
+        if not changed and not dropped:
+            return None
+
+        texts = dict(self._read_texts(month)) if old_days and self.store_dir is not None else {}
+        for name in dropped:
+            texts.pop(name[:-4], None)
+        merged = {d: sig for d, sig in old_days.items() if d not in dropped}
+        for name in changed:
+            try:
+                texts[name[:-4]], _ = self._read_day(name)
+            except Exception as e:
+                logger.warning("trend store: failed to read %s: %s", name, e)
+                self.errors[name] = (days[name], str(e))
+                continue
+            self.errors.pop(name, None)
+            merged[name] = days[name]
+        self._frames.discard(month)
+        if self.store_dir is not None:
+            self._write_partition(month, texts)
+        return merged
+
+    def _write_partition(self, month, texts):
+        # 依日期排序保存，查詢時依序輸出
+        texts = dict(sorted(texts.items()))
+        def write(tmp):
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(texts, f, ensure_ascii=False)
+        _write_atomic(self._partition_path(month), write)
+        return texts
+
+    def sync(self):
+        """掃描每日檔並把新增/變動/刪除的日期併入對應月份分區；回傳是否有分區更新"""
+        with self._lock:
+            found = self._scan()
+            if found == self.manifest:
+                return False
+            if self.store_dir is not None:
+                self.store_dir.mkdir(parents=True, exist_ok=True)
+            updated = False
+            for month in sorted(set(found) | set(self.manifest)):
+                days = found.get(month, {})
+                if not days:
+                    self.manifest.pop(month, None)
+                    self._frames.discard(month)
+                    if self.store_dir is not None:
+                        self._partition_path(month).unlink(missing_ok=True)
+                    updated = True
+                    continue
+                merged = self._rebuild_month(month, days)
+                if merged is not None:
+                    self.manifest[month] = merged
+                    updated = True
+            # 已刪除的每日檔不再回報錯誤
+            self.errors = {d: err for d, err in self.errors.items() if d in found.get(d[:7], {})}
+            if updated:
+                self._save_manifest()
+            return updated
+
+    def _read_texts(self, month):
+        """讀取分區檔的 {date: CSV 文字}；分區檔無法讀取或格式不符時由每日檔重建"""
+        try:
+            with open(self._partition_path(month), "r", encoding="utf-8") as f:
+                texts = json.load(f)
+            if not isinstance(texts, dict) or not all(isinstance(t, str) for t in texts.values()):
+                raise ValueError("unexpected partition content")
+        except Exception as e:
+            logger.warning("trend store: partition %s unreadable (%s), rebuilding from daily files", month, e)
+            return self._restore_partition(month)
+        return texts
+
+    def _restore_partition(self, month):
+        """由 manifest 記錄的每日檔重建分區（有 store_dir 時覆寫分區檔）；每日檔本身無法讀取時丟出 TrendStoreError"""
+        with self._lock:
+            texts = {}
+            for name in sorted(self.manifest.get(month, {})):
+                try:
+                    texts[name[:-4]], _ = self._read_day(name)
+                except FileNotFoundError:
+                    # 已刪除的每日檔由下次 sync 移出 manifest
+                    continue
+                except Exception as e:
+                    raise TrendStoreError(f"Failed to rebuild trend partition {month}: {name}: {e}")
+            if self.store_dir is None:
+                return texts
+            self.store_dir.mkdir(parents=True, exist_ok=True)
+            return self._write_partition(month, texts)
+
+    def _partition_version(self, month):
+        if self.store_dir is None:
+            return json.dumps(self.manifest.get(month), sort_keys=True)
+        try:
+            return self._partition_path(month).stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _read_partition(self, month):
+        """月份分區的 {date: DataFrame}（依日期排序），解析結果放在 LRU"""
+        version = self._partition_version(month)
+        cached = self._frames.get(month)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        texts = self._restore_partition(month) if self.store_dir is None else self._read_texts(month)
+        try:
+            frames = {date: _parse_day(date, text) for date, text in sorted(texts.items())}
+        except Exception as e:
+            raise TrendStoreError(f"Failed to parse trend partition {month}: {e}")
+        self._frames.put(month, (version, frames), _frames_nbytes(frames))
+        return frames
+
+    def _query_partition(self, month, start, end, filters):
+        records = []
+        for date, df in self._read_partition(month).items():
+            if not start <= date <= end:
+                continue
+            if any(field not in df.columns for field in filters):
+                continue
+            for field, value in filters.items():
+                df = df[df[field].astype(str) == str(value)]
+            records.extend(df.to_dict(orient="records"))
+        return records
+
+    def query(self, start, end, **filters):
+        """
+        回傳 start~end（YYYY-MM-DD，含頭尾）的 records，依日期排序。
+        filters 僅支援 PUSHDOWN_FIELDS；區間內有無法讀取的每日檔或分區時丟出 TrendStoreError。
+        """
+        unknown = [k for k in filters if k not in PUSHDOWN_FIELDS]
+        if unknown:
+            raise ValueError(f"Unsupported filter: {', '.join(unknown)}")
+        filters = {k: v for k, v in filters.items() if v is not None}
+        with self._lock:
+            failed = sorted((d, err[1]) for d, err in self.errors.items() if start <= d[:-4] <= end)
+            months = [m for m in sorted(self.manifest) if start[:7] <= m <= end[:7]]
+        if failed:
+            names = ", ".join(d for d, _ in failed)
+            raise TrendStoreError(f"Failed to read {names}: {failed[0][1]}")
+
+        futures = [self._pool.submit(self._query_partition, m, start, end, filters) for m in months]
+        records = []
+        for fut in futures:
+            records.extend(fut.result())
+        return records
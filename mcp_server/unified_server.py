@@ -1,16 +1,47 @@
+import base64
+import hashlib
 import json
-from fastapi import FastAPI, Query
-from typing import List, Optional
-from fastapi.responses import JSONResponse
-from collections import defaultdict, Counter # 引入 Counter
-from config.setting import MOCK_DATA_PATH, CPK_PPK_THRESHOLD
+from datetime import datetime
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Query, Request
+from typing import Any, Dict, List, Optional, Union
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
+from fastapi.responses import Response, StreamingResponse
+from itertools import islice
+from config.setting import (
+    MOCK_DATA_PATH, JSON_CACHE, USE_MOCK_DATA, DATA_RELOAD_INTERVAL, DOC_CACHE_MAX_BYTES,
+    RESPONSE_CACHE_MAX_BYTES
+)
+from mcp_server import metrics
+from mcp_server.dataset_store import DatasetStore, MockFileSource, JsonCacheSource
+from mcp_server.aggregation import aggregate
+from mcp_server.response_cache import ResponseCache, make_etag, etag_matches
+from mcp_server.fast_json import FastJSONResponse, JSONFragments, dumps as json_dumps
 
-app = FastAPI(title="Summary Server",
-              description="提供各類生產數據的查詢和統計功能")
+# 資料來源：mock data 單檔，或 ETL 輸出的 json_cache 目錄（catalog + 批次文件 LRU）
+# 背景 watcher 偵測來源變動後自動重載並切換快照
+if USE_MOCK_DATA:
+    SOURCE = MockFileSource(MOCK_DATA_PATH)
+else:
+    SOURCE = JsonCacheSource(JSON_CACHE, max_doc_bytes=DOC_CACHE_MAX_BYTES)
+STORE = DatasetStore(SOURCE, poll_interval=DATA_RELOAD_INTERVAL)
+# 查詢結果快取（序列化後的位元組 + ETag），資料版本更新時整個失效
+RESPONSE_CACHE = ResponseCache(max_bytes=RESPONSE_CACHE_MAX_BYTES)
+metrics.REGISTRY.register_cache("response", RESPONSE_CACHE)
+if isinstance(SOURCE, JsonCacheSource):
+    metrics.REGISTRY.register_cache("documents", SOURCE.docs)
+
+@asynccontextmanager
+async def lifespan(app):
+    STORE.start_watcher()
+    yield
+    STORE.stop_watcher()
 
-# 載入 mock data
-with open(MOCK_DATA_PATH, 'r', encoding='utf-8') as f:
-    DATA = json.load(f)
+app = FastAPI(title="Summary Server",
+              description="提供各類生產數據的查詢和統計功能",
+              lifespan=lifespan)
+# 每個回應附 Server-Timing 與 X-Trace-Id，GET /metrics 輸出延遲、掃描列數與快取命中率
+metrics.instrument(app, "unified_server")
 
 SUPPORTED_TYPES = [
     'production_summary', 'downtime_summary', 'yield_summary',
@@ -37,130 +68,409 @@ TYPE_FIELDS = {
     ]
 }
 
-def is_abnormal(row):
-    # 綜合異常判斷
-    if row.get('abnormal_count', 0) > 0:
-        return True
-    if row.get('event_count', 0) > 0:
-        return True
-    if row.get('ng_qty', 0) > 0:
-        return True
-    if row.get('event_type'):
-        return True
-    if row.get('status') == 'open':
-        return True
-    if row.get('kpi_achieve_rate', 100) < 90:
-        return True
-    return False
-
-def is_spc_abnormal(row):
-    for spc in row.get('spc_items', []):
-        if (spc.get('cpk', 99) < CPK_PPK_THRESHOLD) or (spc.get('ppk', 99) < CPK_PPK_THRESHOLD):
-            return True
-        if spc.get('cpk_alert') or spc.get('ppk_alert'):
-            return True
-    return False
-
-def is_batch_abnormal(row):
-    return bool(row.get('abnormal_features'))
+def normalize_query(type, filters, use_fields, group_by=None, agg=None, include_measurements=False):
+    """正規化後的查詢參數（不含預設/空值與分頁參數），作為快取 key 與 cursor 綁定的查詢"""
+    return {
+        k: v for k, v in dict(
+            filters, type=type, fields=use_fields, group_by=group_by, agg=agg,
+            include_measurements=include_measurements,
+        ).items() if v not in (None, False, '')
+    }
+
+def query_hash(query):
+    """正規化查詢的雜湊（cursor 只能用於產生它的同一個查詢）"""
+    raw = json.dumps(query, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha1(raw).hexdigest()[:16]
+
+def encode_cursor(version, pos, qhash):
+    """keyset 分頁 cursor：編碼快照版本、本頁最後一列的位置（排序鍵）與查詢雜湊"""
+    raw = json.dumps({"v": version, "p": pos, "q": qhash}, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+def decode_cursor(cursor):
+    """解析 cursor，回傳 (version, pos, 查詢雜湊)；格式錯誤時回傳 None"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return int(payload["v"]), int(payload["p"]), str(payload["q"])
+    except Exception:
+        return None
+
+def iter_ndjson(items):
+    """逐筆序列化為 NDJSON（一行一筆），搭配 StreamingResponse 邊過濾邊輸出"""
+    for item in items:
+        yield json_dumps(item) + b"\n"
+
+def iter_ndjson_rows(render, positions, chunk_size=256):
+    """依列位置分段投影並輸出 NDJSON，預先序列化的資料列直接拼接"""
+    positions = iter(positions)
+    while True:
+        chunk = list(islice(positions, chunk_size))
+        if not chunk:
+            return
+        out = render(chunk)
+        items = out.items if isinstance(out, JSONFragments) else [json_dumps(d) for d in out]
+        yield b"".join(item + b"\n" for item in items)
+
+def ndjson_response(items, snap):
+    return StreamingResponse(
+        iter_ndjson(items),
+        media_type="application/x-ndjson",
+        headers={"X-Dataset-Version": str(snap.version)},
+    )
+
+def iter_trend(snap, use_fields, positions):
+    # 從符合篩選條件（日期區間、機台、產線等）的數據中提取所有與趨勢相關的事件紀錄
+    for pos in positions:
+        row = snap.rows[pos]
+        # 我們認為，只要 'anomaly_remark' 存在，就代表一筆值得分析的歷史事件
+        if row.get('anomaly_remark'):
+            trend_item = {k: row.get(k) for k in use_fields if k in row}
+            # 確保 'count' 欄位存在，若無則預設為 1
+            if 'count' not in trend_item or not trend_item['count']:
+                trend_item['count'] = 1
+            yield trend_item
+
+# 等值篩選欄位（走索引）、日期區間參數（走排序 date 索引）與異常旗標參數（走 bitmap）
+FILTER_FIELDS = ['batch_id', 'machine_id', 'product', 'shift', 'line', 'date', 'status']
+RANGE_PARAMS = ['start_date', 'end_date']
+FLAG_PARAMS = {
+    'abnormal_only': 'abnormal',
+    'batch_abnormal_only': 'batch_abnormal',
+    'spc_abnormal_only': 'spc_abnormal',
+}
+
+def resolve_fields(type, fields=None):
+    """動態欄位：fields 可為逗號分隔字串或 list，未指定時使用型別預設欄位"""
+    if not fields:
+        return TYPE_FIELDS.get(type, [])
+    if isinstance(fields, str):
+        fields = fields.split(',')
+    return [f.strip() for f in fields if f and f.strip()]
+
+def check_date_range(filters):
+    """檢查 start_date/end_date 格式，錯誤時回傳錯誤訊息"""
+    for param in RANGE_PARAMS:
+        value = filters.get(param)
+        if value:
+            try:
+                datetime.strptime(value, "%Y-%m-%d")
+            except (TypeError, ValueError):
+                return f"{param} 日期格式錯誤，請用YYYY-MM-DD"
+    return None
+
+def select_filters(snap, type, filters, memo=None):
+    """
+    依等值條件與異常旗標取得 (candidates, mask)。
+    memo 為同一請求內共用的 dict：相同條件的索引交集與 bitmap AND 只計算一次。
+    """
+    memo = {} if memo is None else memo
+    eq_key = tuple((f, filters[f]) for f in FILTER_FIELDS if filters.get(f))
+    date_range = (filters.get('start_date'), filters.get('end_date'))
+    if ('eq', eq_key, date_range) not in memo:
+        # 過濾：等值條件與日期區間先走索引，只檢查交集後的候選列
+        with metrics.phase("filter"):
+            memo[('eq', eq_key, date_range)] = snap.lookup(dict(eq_key), date_range)
+    # 異常旗標條件以 bitmap AND 合併：
+    # spc_abnormal_only 是通用篩選器，而 spc_summary 型別強制只回傳有SPC異常的批次
+    flags = {name for param, name in FLAG_PARAMS.items() if filters.get(param)}
+    if type == 'spc_summary':
+        flags.add('spc_abnormal')
+    flag_key = tuple(sorted(flags))
+    if ('flag', flag_key) not in memo:
+        with metrics.phase("filter"):
+            memo[('flag', flag_key)] = snap.flag_mask(flag_key)
+    return memo[('eq', eq_key, date_range)], memo[('flag', flag_key)]
+
+def make_projector(snap, type, use_fields, include_measurements=False):
+    """
+    回傳 render(positions)，把列位置投影成輸出資料。
+    型別預設欄位時直接取快照中預先序列化的 JSON 片段（不建立 dict）；
+    自訂欄位或需附量測值時才逐列建立 dict。
+    """
+    with_measurements = include_measurements and 'spc_items' in use_fields
+    if not with_measurements and use_fields == TYPE_FIELDS.get(type):
+        encoded = snap.projection(type, use_fields)
+        return lambda positions: JSONFragments([encoded[pos] for pos in positions])
+
+    fields = tuple(use_fields)
+    rows = snap.rows
+
+    def project(pos):
+        row = rows[pos]
+        # 完整量測值只在需要時才由資料來源載入（json_cache 來源走 LRU）
+        if with_measurements:
+            row = SOURCE.attach_measurements(row)
+        return dict(zip(fields, map(row.get, fields)))
+    return lambda positions: [project(pos) for pos in positions]
+
+def trend_payload(snap, use_fields, candidates, mask):
+    with metrics.phase("aggregate"):
+        trend_data = list(iter_trend(snap, use_fields, snap.select(candidates, mask)))
+    return {
+        "status": "ok",
+        "type": "anomaly_trend",
+        "version": snap.version,
+        "total": len(trend_data),
+        "data": trend_data
+    }
+
+def group_payload(snap, type, candidates, mask, group_by, agg):
+    """分群/分組：在欄式資料上聚合，只回傳每群的彙總值"""
+    positions = snap.select(candidates, mask)
+    if not isinstance(positions, range):
+        positions = list(positions)
+    metrics.add_rows(len(positions))
+    try:
+        with metrics.phase("aggregate"):
+            groups = aggregate(
+                snap.frame, None if isinstance(positions, range) else positions, group_by, agg
+            )
+    except ValueError as e:
+        return {"status": "error", "msg": str(e)}
+    return {
+        "status": "ok",
+        "type": type,
+        "version": snap.version,
+        "group_by": [k.strip() for k in group_by.split(',') if k.strip()],
+        "total_groups": len(groups),
+        "groups": groups
+    }
+
+def page_payload(snap, type, candidates, mask, render, page, size, qhash):
+    with metrics.phase("filter"):
+        positions = list(snap.select(candidates, mask))
+    metrics.add_rows(len(positions))
+
+    # 分頁
+    total = len(positions)
+    start = (page-1)*size
+    end = start+size
+    with metrics.phase("project"):
+        paged = render(positions[start:end])
+    next_cursor = encode_cursor(snap.version, positions[end-1], qhash) if end < total else None
+
+    return {
+        "status": "ok",
+        "type": type,
+        "version": snap.version,
+        "total": total,
+        "page": page,
+        "size": size,
+        "next_cursor": next_cursor,
+        "data": paged
+    }
+
+def cached_json_response(request, cache_key, snap, build_payload):
+    """
+    以快取回應查詢：命中時直接回傳已序列化的位元組；
+    ETag 與 If-None-Match 相符時回 304。錯誤結果不快取。
+    """
+    with metrics.phase("cache"):
+        entry = RESPONSE_CACHE.get(cache_key, snap.version)
+    if entry is None:
+        payload = build_payload()
+        if payload.get("status") != "ok":
+            return FastJSONResponse(payload)
+        with metrics.phase("serialize"):
+            body = json_dumps(payload)
+        entry = (body, make_etag(snap.version, body))
+        RESPONSE_CACHE.put(cache_key, snap.version, *entry)
+    body, etag = entry
+    headers = {"ETag": etag, "X-Dataset-Version": str(snap.version)}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 @app.get("/api/query")
 def query_server(
+    request: Request,
     type: str = Query(..., description="查詢型別"),
     batch_id: Optional[str] = Query(None),
     machine_id: Optional[str] = Query(None),
     product: Optional[str] = Query(None),
     shift: Optional[str] = Query(None),
     date: Optional[str] = Query(None),
+    start_date: Optional[str] = Query(None, description="日期區間起日 YYYY-MM-DD（含）"),
+    end_date: Optional[str] = Query(None, description="日期區間迄日 YYYY-MM-DD（含）"),
+    line: Optional[str] = Query(None),
     status: Optional[str] = Query(None),
     abnormal_only: Optional[bool] = Query(False),
     spc_abnormal_only: Optional[bool] = Query(False),
     batch_abnormal_only: Optional[bool] = Query(False),
-    group_by: Optional[str] = Query(None),
+    group_by: Optional[str] = Query(None, description="分群欄位, 逗號分隔"),
+    agg: Optional[str] = Query(None, description="聚合, 如 sum:actual_qty,mean:yield_percent,count"),
     fields: Optional[str] = Query(None, description="動態欄位, 逗號分隔"),
+    include_measurements: bool = Query(False, description="spc_items 是否附上原始量測值"),
+    format: str = Query("json", description="json（分頁）或 ndjson（串流回傳全部符合資料，忽略分頁）"),
+    cursor: Optional[str] = Query(None, description="上一頁回傳的 next_cursor，其餘查詢參數需與上一頁相同（size 可不同）"),
     page: int = Query(1, ge=1),
     size: int = Query(50, ge=1, le=500)
 ):
     if type not in SUPPORTED_TYPES:
         return {"status": "error", "msg": f"不支援的查詢型別: {type}"}
+    metrics.set_tool(type)
+    if format not in ("json", "ndjson"):
+        return {"status": "error", "msg": f"不支援的回傳格式: {format}"}
     
-    # 動態欄位
-    use_fields = TYPE_FIELDS.get(type, [])
-    if fields:
-        use_fields = [f.strip() for f in fields.split(',') if f.strip()]
+    use_fields = resolve_fields(type, fields)
     
-    if type == 'anomaly_trend':
-        trend_data = []
-        # 從原始數據中提取所有與趨勢相關的事件紀錄
-        for row in DATA:
-            # 我們認為，只要 'anomaly_remark' 存在，就代表一筆值得分析的歷史事件
-            if row.get('anomaly_remark'):
-                trend_item = {k: row.get(k) for k in use_fields if k in row}
-                # 確保 'count' 欄位存在，若無則預設為 1
-                if 'count' not in trend_item or not trend_item['count']:
-                    trend_item['count'] = 1
-                trend_data.append(trend_item)
-        
-        return JSONResponse({
-            "status": "ok",
-            "type": "anomaly_trend",
-            "total": len(trend_data),
-            "data": trend_data
-        })
+    filters = {
+        'batch_id': batch_id, 'machine_id': machine_id, 'product': product,
+        'shift': shift, 'line': line, 'date': date, 'status': status,
+        'start_date': start_date, 'end_date': end_date,
+        'abnormal_only': abnormal_only, 'spc_abnormal_only': spc_abnormal_only,
+        'batch_abnormal_only': batch_abnormal_only,
+    }
+    error = check_date_range(filters)
+    if error:
+        return {"status": "error", "msg": error}
+    query = normalize_query(type, filters, use_fields, group_by, agg, include_measurements)
+    qhash = query_hash(query)
 
-    # 過濾
-    result = []
-    for row in DATA:
-        if batch_id and row.get('batch_id') != batch_id: continue
-        if machine_id and row.get('machine_id') != machine_id: continue
-        if product and row.get('product') != product: continue
-        if shift and row.get('shift') != shift: continue
-        if date and row.get('date') != date: continue
-        if status and row.get('status') != status: continue
-        if abnormal_only and not is_abnormal(row): continue
-        if batch_abnormal_only and not is_batch_abnormal(row): continue
-
-        # spc_abnormal_only 是一個通用的篩選器
-        if spc_abnormal_only and not is_spc_abnormal(row):
-            continue
-        
-        # 而當查詢類型本身就是 spc_summary 時，我們強制只回傳有SPC異常的批次
-        if type == 'spc_summary' and not is_spc_abnormal(row):
-            continue
+    # 整個請求只使用同一版快照；cursor 分頁沿用第一頁的快照版本
+    snap = STORE.current
+    resume_from = 0
+    if cursor:
+        decoded = decode_cursor(cursor)
+        if decoded is None:
+            return {"status": "error", "msg": "cursor 格式錯誤"}
+        version, last_pos, cursor_hash = decoded
+        if cursor_hash != qhash:
+            return FastJSONResponse(
+                {"status": "error", "msg": "cursor 與查詢參數不符，請以產生 cursor 的同一個查詢取下一頁"},
+                status_code=400,
+            )
+        snap = STORE.get_snapshot(version)
+        if snap is None:
+            return {"status": "error", "msg": "cursor 已過期（資料已更新），請重新查詢"}
+        resume_from = last_pos + 1
 
-        filtered = {k: row.get(k, None) for k in use_fields}
-        result.append(filtered)
-    
-    # 分群/分組
-    if group_by and group_by in use_fields:
-        group_dict = defaultdict(list)
-        for r in result:
-            group_dict[r.get(group_by)].append(r)
-        # 統計每群異常數、總數
-        group_stats = {}
-        for g, items in group_dict.items():
-            group_stats[g] = {
-                'total': len(items),
-                'abnormal': sum(1 for i in items if i['is_abnormal']),
-                'spc_abnormal': sum(1 for i in items if i['is_spc_abnormal']),
-                'batch_abnormal': sum(1 for i in items if i['is_batch_abnormal']),
-                'items': items
+    # 串流模式：不建立完整結果清單，邊走訪候選列邊投影、輸出（不經過回應快取）
+    if format == "ndjson":
+        candidates, mask = select_filters(snap, type, filters)
+        if type == 'anomaly_trend':
+            return ndjson_response(iter_trend(snap, use_fields, snap.select(candidates, mask)), snap)
+        render = make_projector(snap, type, use_fields, include_measurements)
+        return StreamingResponse(
+            iter_ndjson_rows(render, snap.select(candidates, mask)),
+            media_type="application/x-ndjson",
+            headers={"X-Dataset-Version": str(snap.version)},
+        )
+
+    def build_payload():
+        candidates, mask = select_filters(snap, type, filters)
+        if type == 'anomaly_trend':
+            return trend_payload(snap, use_fields, candidates, mask)
+        if group_by:
+            return group_payload(snap, type, candidates, mask, group_by, agg)
+        render = make_projector(snap, type, use_fields, include_measurements)
+        # cursor 分頁：直接從上一頁最後一列之後接續，只取本頁（多取一筆判斷是否還有下一頁）
+        if cursor:
+            positions = list(islice(snap.select(candidates, mask, start=resume_from), size + 1))
+            has_more = len(positions) > size
+            positions = positions[:size]
+            return {
+                "status": "ok",
+                "type": type,
+                "version": snap.version,
+                "size": size,
+                "next_cursor": encode_cursor(snap.version, positions[-1], qhash) if has_more else None,
+                "data": render(positions)
             }
-        return JSONResponse({"status": "ok", "type": type, "group_by": group_by, "group_stats": group_stats})
-    # 分頁
-    total = len(result)
-    start = (page-1)*size
-    end = start+size
-    paged = result[start:end]
+        return page_payload(snap, type, candidates, mask, render, page, size, qhash)
 
-    return JSONResponse({
-        "status": "ok",
-        "type": type,
-        "total": total,
-        "page": page,
-        "size": size,
-        "data": paged
-    })
+    # 快取 key：正規化後的查詢參數加上分頁參數，搭配快照版本使用
+    cache_key = json.dumps({
+        k: v for k, v in dict(
+            query, cursor=cursor,
+            page=None if cursor or group_by else page, size=None if group_by else size,
+        ).items() if v is not None
+    }, sort_keys=True, ensure_ascii=False)
+    return cached_json_response(request, cache_key, snap, build_payload)
+
+class QueryFilters(BaseModel):
+    """篩選條件，型別與 GET /api/query 的同名參數相同（數字轉為字串、"false"/"0" 等轉為布林）"""
+    model_config = ConfigDict(extra="forbid", coerce_numbers_to_str=True)
+
+    batch_id: Optional[str] = None
+    machine_id: Optional[str] = None
+    product: Optional[str] = None
+    shift: Optional[str] = None
+    line: Optional[str] = None
+    date: Optional[str] = None
+    status: Optional[str] = None
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+    abnormal_only: bool = False
+    spc_abnormal_only: bool = False
+    batch_abnormal_only: bool = False
+
+def validate_filters(raw):
+    """驗證並轉換子查詢的篩選條件，回傳 (filters, 錯誤訊息)"""
+    try:
+        return QueryFilters.model_validate(raw).model_dump(), None
+    except ValidationError as e:
+        unknown = [str(err["loc"][0]) for err in e.errors() if err["type"] == "extra_forbidden"]
+        if unknown:
+            return None, f"不支援的篩選條件: {', '.join(unknown)}"
+        return None, "篩選條件格式錯誤: " + "; ".join(
+            f"{'.'.join(map(str, err['loc']))} {err['msg']}" for err in e.errors()
+        )
+
+class SubQuery(BaseModel):
+    type: str
+    filters: Dict[str, Any] = Field(default_factory=dict)
+    fields: Optional[Union[List[str], str]] = None
+    group_by: Optional[str] = None
+    agg: Optional[str] = None
+    include_measurements: bool = False
+    page: int = Field(1, ge=1)
+    size: int = Field(50, ge=1, le=500)
+
+class BatchQuery(BaseModel):
+    # 所有子查詢共用的篩選條件，子查詢的 filters 可再覆寫/追加
+    filters: Dict[str, Any] = Field(default_factory=dict)
+    queries: List[SubQuery]
+
+@app.post("/api/query/batch")
+def batch_query_server(req: BatchQuery):
+    """
+    一次處理多個子查詢：共用同一版快照，相同的篩選條件（索引交集、bitmap AND）只計算一次，
+    各子查詢再依型別投影欄位，於同一個回應中回傳。
+    """
+    metrics.set_tool("batch")
+    snap = STORE.current
+    memo = {}
+    results = []
+    for sub in req.queries:
+        if sub.type not in SUPPORTED_TYPES:
+            results.append({"status": "error", "type": sub.type, "msg": f"不支援的查詢型別: {sub.type}"})
+            continue
+        # 篩選條件依 GET /api/query 的參數型別驗證，格式錯誤只影響該子查詢
+        filters, error = validate_filters({**req.filters, **sub.filters})
+        if error is None:
+            error = check_date_range(filters)
+        if error:
+            results.append({"status": "error", "type": sub.type, "msg": error})
+            continue
+        use_fields = resolve_fields(sub.type, sub.fields)
+        candidates, mask = select_filters(snap, sub.type, filters, memo)
+        if sub.type == 'anomaly_trend':
+            results.append(trend_payload(snap, use_fields, candidates, mask))
+            continue
+        if sub.group_by:
+            results.append(group_payload(snap, sub.type, candidates, mask, sub.group_by, sub.agg))
+            continue
+        render = make_projector(snap, sub.type, use_fields, sub.include_measurements)
+        # next_cursor 與 GET /api/query 的同一個查詢相同，可直接以 GET 取下一頁
+        qhash = query_hash(normalize_query(sub.type, filters, use_fields, include_measurements=sub.include_measurements))
+        results.append(page_payload(snap, sub.type, candidates, mask, render, sub.page, sub.size, qhash))
+    with metrics.phase("serialize"):
+        return FastJSONResponse({
+            "status": "ok",
+            "version": snap.version,
+            "results": results
+        })
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,112 @@
+"""
+pytest 共用設定：把專案根目錄加入 sys.path，unified_server 固定讀取 repo 內的 mock data（不啟動背景重載），
+並提供建立 ETL 批次文件的 fixture。
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import config.setting as setting  # noqa: E402
+
+# 需在 import mcp_server.unified_server 之前設定
+setting.USE_MOCK_DATA = True
+setting.MOCK_DATA_PATH = os.path.join(ROOT, "mock_data", "all_server_full_mock_data.json")
+setting.DATA_RELOAD_INTERVAL = 0
+# batch_source 在 import 時讀取 JSON_CACHE，測試再以 monkeypatch 指向暫存目錄
+setting.JSON_CACHE = setting.JSON_CACHE or os.path.join(ROOT, "mcp_server", "json_cache")
+# 各 tool server 的資料夾未設定時指向暫存目錄（測試需要資料時自行寫入）
+TOOL_DATA_ROOT = tempfile.mkdtemp(prefix="mcp_tool_data_")
+for name in ("PRODUCTION_SUMMARY", "DOWNTIME_SUMMARY", "YIELD_SUMMARY", "ANOMALY_TREND", "KPI_SUMMARY", "ISSUE_TRACKER"):
+    key = f"MOCK_{name}"
+    if not getattr(setting, key):
+        setattr(setting, key, os.path.join(TOOL_DATA_ROOT, name.lower()))
+        os.makedirs(getattr(setting, key))
+
+def make_feature(name="F1", cpk=1.5, ppk=1.5, values=(10.0, 10.1, 9.9), **extra):
+    feature = {
+        "feature_name": name,
+        "spec": 10.0,
+        "usl": 10.5,
+        "lsl": 9.5,
+        "unit": "mm",
+        "sample_size": 5,
+        "measurements": [
+            {"seq": i + 1, "value": v, "timestamp": "08:00", "out_of_spec": False}
+            for i, v in enumerate(values)
+        ],
+        "cpk": cpk,
+        "ppk": ppk,
+        "cpk_alert": cpk is not None and cpk < 1.33,
+        "cpk_reason": "",
+        "ppk_alert": ppk is not None and ppk < 1.33,
+        "ppk_reason": "",
+        "abnormal_detail": [],
+    }
+    feature.update(extra)
+    return feature
+
+def make_batch(machine_id="01", features=None, **meta):
+    return {
+        "meta": dict({
+            "machine_id": machine_id,
+            "batch_id": f"B_{machine_id}",
+            "source_file": f"insp_{machine_id}.xlsx",
+            "etl_time": "2025-04-30T08:00:00",
+        }, **meta),
+        "summary": {"part_no": "P-1", "product_name": "Widget", "vendor": "V"},
+        "features": [make_feature()] if features is None else features,
+        "etl_log": {"status": "success", "msg": ""},
+    }
+
+def make_workbook(path, features=2, rows=12, timestamp=lambda i: f"2025-06-03 {8 + i // 5:02d}:00"):
+    """
+    建立 ETL 輸入格式的檢驗 Excel：Summary 分頁 G1~G5 為 vendor、批號、機台、品名、料號，
+    各特性分頁第 2~4 列為特性名稱/規格/單位、USL、LSL 與樣本數，第 5 列起為 seq、量測值、時間。
+    """
+    from openpyxl import Workbook
+
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Summary"
+    for r, v in enumerate(["VendorX", "LOT001", "M1", "Widget", "PN-1"], start=1):
+        ws.cell(row=r, column=7, value=v)
+    for fi in range(features):
+        sh = wb.create_sheet(f"F{fi}")
+        sh.append(["hdr0", "hdr1", "hdr2", "hdr3"])
+        spec = 10.0 + fi
+        sh.append([f"Feature{fi}", spec, "x", "mm"])
+        sh.append(["usl", spec + 0.3, None, None])
+        sh.append(["lsl", spec - 0.3, 5, None])
+        for i in range(1, rows + 1):
+            ts = timestamp(i) if i % 5 == 1 else None
+            sh.append([i, round(spec + 0.01 * ((i * 7 + fi) % 11 - 5), 4), ts, None])
+    wb.save(path)
+    return path
+
+@pytest.fixture(scope="session")
+def client():
+    """unified_server 的 TestClient（讀取 mock data）"""
+    from fastapi.testclient import TestClient
+    from mcp_server.unified_server import app
+
+    with TestClient(app) as c:
+        yield c
+
+@pytest.fixture
+def workbook_factory():
+    return make_workbook
+
+@pytest.fixture
+def batch_factory():
+    return make_batch
+
+@pytest.fixture
+def feature_factory():
+    return make_feature
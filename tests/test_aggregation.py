@@ -0,0 +1,37 @@
+import pandas as pd
+import pytest
+
+from mcp_server.aggregation import aggregate
+
+@pytest.fixture
+def frame():
+    return pd.DataFrame({
+        "machine_id": ["M01", "M01", "M02"],
+        "actual_qty": [10, 20, 5],
+        "mixed": [1, "x", 2],
+        "is_abnormal": [True, False, True],
+    })
+
+def test_group_aggregates(frame):
+    groups = aggregate(frame, None, "machine_id", "count,sum:actual_qty,mean:actual_qty,sum:is_abnormal")
+    assert groups == [
+        {"machine_id": "M01", "count": 2, "sum_actual_qty": 30, "mean_actual_qty": 15.0, "sum_is_abnormal": 1},
+        {"machine_id": "M02", "count": 1, "sum_actual_qty": 5, "mean_actual_qty": 5.0, "sum_is_abnormal": 1},
+    ]
+    assert aggregate(frame, [2], "machine_id", "count") == [{"machine_id": "M02", "count": 1}]
+
+@pytest.mark.parametrize("agg,msg", [
+    ("mean:machine_id", "聚合函數只適用數值欄位: mean:machine_id"),
+    ("count,sum:machine_id,std:mixed", "聚合函數只適用數值欄位: sum:machine_id, std:mixed"),
+    ("max:mixed", "聚合欄位型別不符: max:mixed"),
+    ("sum:nope", "不支援分群/聚合的欄位: nope"),
+    ("avg:actual_qty", "不支援的聚合函數: avg"),
+])
+def test_invalid_agg_reports_field_error(frame, agg, msg):
+    with pytest.raises(ValueError) as e:
+        aggregate(frame, None, "machine_id", agg)
+    assert str(e.value) == msg
+
+def test_query_returns_field_error(client):
+    resp = client.get("/api/query", params={"type": "production_summary", "group_by": "line", "agg": "mean:machine_id"})
+    assert resp.json() == {"status": "error", "msg": "聚合函數只適用數值欄位: mean:machine_id"}
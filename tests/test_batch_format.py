@@ -0,0 +1,65 @@
+import json
+
+import pytest
+
+from edge_etl.etl_to_json import etl_inspection_excel, write_batch
+from mcp_server.batch_format import BinaryBatch, write_batch_binary
+from mcp_server.dataset_store import JsonCacheSource
+
+def as_text(doc):
+    # 逐字比較（含欄位順序與 int/float 型別）
+    return json.dumps(doc, ensure_ascii=False)
+
+def edge_doc(batch_factory, feature_factory):
+    features = [
+        feature_factory("F1", values=(10.0, -0.0, 1e-300, 12345.678901234567)),
+        feature_factory("空特性", cpk=None, ppk=None, values=()),
+        feature_factory("F3", values=(9.4, 10.6)),
+    ]
+    features[0]["measurements"][1]["timestamp"] = None
+    features[2]["measurements"][0]["out_of_spec"] = True
+    features[2]["measurements"][1].update(seq=2 ** 31 - 1, out_of_spec=True, timestamp="09:15")
+    return batch_factory("07", features, date="2025-06-03")
+
+def test_binary_round_trip_edge_cases(tmp_path, batch_factory, feature_factory):
+    doc = edge_doc(batch_factory, feature_factory)
+    write_batch_binary(doc, tmp_path / "07.mcpb")
+    batch = BinaryBatch(tmp_path / "07.mcpb")
+
+    assert as_text(batch.document(with_measurements=True)) == as_text(doc)
+    without = batch.document()
+    assert all("measurements" not in feat for feat in without["features"])
+    assert without["meta"] == doc["meta"]
+    subset = batch.document(with_measurements=True, feature_names=["F3"])
+    assert [("measurements" in f) for f in subset["features"]] == [False, False, True]
+    assert subset["features"][2]["measurements"] == doc["features"][2]["measurements"]
+
+def test_binary_round_trip_without_measurements(tmp_path, batch_factory):
+    for i, features in enumerate(([], [{"feature_name": "F1", "measurements": []}])):
+        doc = batch_factory("08", features)
+        write_batch_binary(doc, tmp_path / f"{i}.mcpb")
+        assert as_text(BinaryBatch(tmp_path / f"{i}.mcpb").document(with_measurements=True)) == as_text(doc)
+
+def test_etl_outputs_match_across_formats(tmp_path, workbook_factory):
+    result = etl_inspection_excel(workbook_factory(tmp_path / "insp.xlsx", features=3, rows=23))
+    json_dir, bin_dir = tmp_path / "json", tmp_path / "bin"
+    json_dir.mkdir()
+    bin_dir.mkdir()
+    json_path = write_batch(result, json_dir, "json")
+    bin_path = write_batch(result, bin_dir, "binary")
+
+    with open(json_path, encoding="utf-8") as f:
+        expected = json.load(f)
+    assert as_text(BinaryBatch(bin_path).document(with_measurements=True)) == as_text(expected)
+
+    # 讀取端（catalog 與完整文件）兩種格式結果相同
+    json_src, bin_src = JsonCacheSource(json_dir), JsonCacheSource(bin_dir)
+    json_rows, bin_rows = json_src.load_rows(), bin_src.load_rows()
+    assert as_text(bin_rows) == as_text(json_rows)
+    assert as_text(bin_src.attach_measurements(bin_rows[0])) == as_text(json_src.attach_measurements(json_rows[0]))
+
+def test_rejects_foreign_file(tmp_path):
+    path = tmp_path / "x.mcpb"
+    path.write_bytes(b"JSON" + b"\0" * 16)
+    with pytest.raises(ValueError):
+        BinaryBatch(path)
@@ -0,0 +1,27 @@
+import json
+
+import pytest
+
+from mcp_server import batch_source
+from mcp_server.dataset_store import JsonCacheSource
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch, batch_factory):
+    for key, date in (("01", "2025-06-01"), ("02", "2025-06-15"), ("03", None)):
+        doc = batch_factory(key, date=date, etl_time="2026-10-18T09:00:00")
+        (tmp_path / f"{key}.json").write_text(json.dumps(doc), encoding="utf-8")
+    monkeypatch.setattr(batch_source, "CACHE_DIR", tmp_path)
+    monkeypatch.setattr(batch_source, "CATALOG", JsonCacheSource(tmp_path, max_doc_bytes=0))
+    return tmp_path
+
+@pytest.mark.parametrize("args,expected", [
+    ({"start_date": "2025-06-01", "end_date": "2025-06-30"}, ["01", "02"]),
+    ({"date": "2025-06-15"}, ["02"]),
+    # 篩選的是生產日期，不是 ETL 執行日期
+    ({"date": "2026-10-18"}, []),
+    ({"batch_ids": "0*", "start_date": "2025-06-10"}, ["02"]),
+])
+def test_date_filters_use_production_date(cache_dir, args, expected):
+    selected, missing = batch_source.select_batches(args)
+    assert selected == expected
+    assert missing == []
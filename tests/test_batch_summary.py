@@ -0,0 +1,30 @@
+from edge_etl.etl_to_json import build_batch_summary
+from mcp_server.batch_anomaly_server import build_batch_anomaly
+from mcp_server.dataset_store import alert_features, batch_doc_to_row
+
+def make_doc(batch_factory, feature_factory):
+    return batch_factory("01", [
+        feature_factory("ok"),
+        feature_factory("low_cpk", cpk=1.0, ppk=1.5),
+        feature_factory("out_of_spec", abnormal_detail=["第2筆量測值超上限"]),
+        feature_factory("no_data", cpk=None, ppk=None, values=()),
+    ])
+
+def test_summary_alerts_match_full_document(batch_factory, feature_factory):
+    doc = make_doc(batch_factory, feature_factory)
+    summary = build_batch_summary(doc)
+    assert summary["alert_features"] == ["low_cpk", "out_of_spec"]
+    assert summary["abnormal_count"] == 2
+    assert [f["feature_name"] for f in alert_features(summary)] == summary["alert_features"]
+    assert [f["feature_name"] for f in alert_features(doc)] == summary["alert_features"]
+
+def test_readers_use_summary_alerts(batch_factory, feature_factory):
+    doc = make_doc(batch_factory, feature_factory)
+    summary = build_batch_summary(doc)
+    assert batch_doc_to_row("01", summary) == batch_doc_to_row("01", doc)
+    assert build_batch_anomaly("01", summary) == build_batch_anomaly("01", doc)
+
+    # 摘要檔的 alert_features 優先於逐項判斷
+    summary["alert_features"] = ["ok"]
+    assert [f["feature_name"] for f in build_batch_anomaly("01", summary)["abnormal_features"]] == ["ok"]
+    assert batch_doc_to_row("01", summary)["abnormal_count"] == 1
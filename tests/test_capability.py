@@ -0,0 +1,81 @@
+import math
+import random
+import statistics
+
+import pytest
+
+from edge_etl.capability import D2, c4, capability_indices
+
+def reference(values, usl, lsl, n, method):
+    """逐特性、逐子群組的直譯計算，作為向量化結果的對照"""
+    values = [v for v in values if math.isfinite(v)]
+    if len(values) < 2 or usl is None or lsl is None or not usl > lsl:
+        return dict(cp=None, cpk=None, pp=None, ppk=None, ca=None)
+    mean = sum(values) / len(values)
+    sigma_overall = statistics.stdev(values)
+    sigma_within = None
+    if n and n >= 2 and len(values) // n > 0:
+        groups = [values[i * n:(i + 1) * n] for i in range(len(values) // n)]
+        if method == "rbar" and n <= max(D2):
+            sigma_within = sum(max(g) - min(g) for g in groups) / len(groups) / D2[n]
+        else:
+            dof = len(groups) * (n - 1)
+            ss = sum(sum((x - sum(g) / n) ** 2 for x in g) for g in groups)
+            sigma_within = math.sqrt(ss / dof) / c4(dof + 1)
+    if sigma_within is None:
+        sigma_within = sum(abs(a - b) for a, b in zip(values[1:], values)) / (len(values) - 1) / D2[2]
+
+    def index(num, sigma):
+        return round(num / sigma, 4) if sigma > 0 else None
+
+    nearest = min(usl - mean, mean - lsl)
+    return dict(
+        cp=index(usl - lsl, 6 * sigma_within), cpk=index(nearest, 3 * sigma_within),
+        pp=index(usl - lsl, 6 * sigma_overall), ppk=index(nearest, 3 * sigma_overall),
+        ca=round((mean - (usl + lsl) / 2) / ((usl - lsl) / 2), 4),
+    )
+
+def random_features(rng, k):
+    samples, usl, lsl, sizes = [], [], [], []
+    for _ in range(k):
+        count = rng.choice([0, 1, 2, 3, 4, 5, 7, 10, 25, 60])
+        values = [rng.gauss(10, 1) for _ in range(count)]
+        if rng.random() < 0.1:
+            values = [5.0] * count
+        elif rng.random() < 0.1 and values:
+            values[rng.randrange(count)] = float("nan")
+        samples.append(values)
+        usl.append(rng.choice([13.0, None, 12.5, 8.0]))
+        lsl.append(rng.choice([7.0, None, 9.0]))
+        sizes.append(rng.choice([None, 1, 2, 5, 30, 100]))
+    return samples, usl, lsl, sizes
+
+@pytest.mark.parametrize("method", ["rbar", "pooled"])
+def test_matches_reference(method):
+    rng = random.Random(1)
+    for _ in range(200):
+        samples, usl, lsl, sizes = random_features(rng, rng.randint(1, 6))
+        got = capability_indices(samples, usl, lsl, sizes, method)
+        for values, u, l, n, result in zip(samples, usl, lsl, sizes, got):
+            expected = reference(values, u, l, n, method)
+            for key, value in expected.items():
+                if value is None:
+                    assert result[key] is None, (key, values, u, l, n)
+                else:
+                    assert result[key] == pytest.approx(value, abs=1.5e-4), (key, values, u, l, n)
+
+def test_worked_example():
+    # 子群組 (1,2)(3,4)(5,6)：R-bar = 1，群內 sigma = 1/1.128；整體 sigma = stdev = 1.8708
+    [result] = capability_indices([[1, 2, 3, 4, 5, 6]], [9.5], [-2.5], [2])
+    assert result == {"cp": 2.256, "cpk": 2.256, "pp": 1.069, "ppk": 1.069, "ca": 0.0}
+
+def test_within_sigma_ignores_between_subgroup_shift():
+    # 子群組平均逐步偏移：群內變異小，Cpk 應明顯高於 Ppk
+    values = [x + shift for shift in (0.0, 0.5, 1.0, 1.5) for x in (10.0, 10.1, 9.9, 10.05, 9.95)]
+    [result] = capability_indices([values], [12.0], [9.0], [5])
+    assert result["cpk"] > 2 * result["ppk"]
+
+def test_invalid_method_and_empty_input():
+    assert capability_indices([], [], [], []) == []
+    with pytest.raises(ValueError):
+        capability_indices([[1.0, 2.0]], [3.0], [0.0], [2], method="sbar")
@@ -0,0 +1,52 @@
+import time
+
+from edge_etl.change_watch import ChangeWatcher, EtlManifest
+
+class NotifyDuringScan(EtlManifest):
+    """第一次檢查檔案時模擬檔案事件在掃描途中到達"""
+
+    def __init__(self, dst, watcher_ref, late_path):
+        super().__init__(dst)
+        self.watcher_ref = watcher_ref
+        self.late_path = late_path
+
+    def is_current(self, path, st):
+        if self.late_path is not None:
+            self.late_path.write_bytes(b"late")
+            self.watcher_ref[0].notify(self.late_path)
+            self.late_path = None
+        return super().is_current(path, st)
+
+def timed_wait(watcher):
+    start = time.monotonic()
+    watcher.wait()
+    return time.monotonic() - start
+
+def test_event_during_scan_wakes_next_wait(tmp_path):
+    src, dst = tmp_path / "src", tmp_path / "dst"
+    src.mkdir()
+    dst.mkdir()
+    done = (src / "a.xlsx").resolve()
+    done.write_bytes(b"a")
+    late = src / "b.xlsx"
+    ref = []
+    manifest = NotifyDuringScan(dst, ref, late)
+    manifest.record(done, done.stat(), "sha", "success")
+    watcher = ChangeWatcher(src, manifest, interval=30, settle=0)
+    ref.append(watcher)
+
+    assert watcher.poll() == []
+    # 掃描途中到達的事件不可被清掉：wait() 需立即返回，之後的 poll 看得到該檔
+    assert timed_wait(watcher) < 1
+    assert [p.name for p, _, _ in watcher.poll() + watcher.poll()] == ["b.xlsx"]
+
+def test_wait_does_not_consume_notification(tmp_path):
+    watcher = ChangeWatcher(tmp_path, EtlManifest(tmp_path), interval=30, settle=0)
+    watcher.poll()
+    watcher.notify(tmp_path / "c.xlsx")
+    assert timed_wait(watcher) < 1
+    # 通知只由 poll() 取走
+    assert timed_wait(watcher) < 1
+    watcher.poll()
+    watcher._next_scan = time.monotonic() + 0.2
+    assert timed_wait(watcher) >= 0.1
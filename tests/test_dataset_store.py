@@ -0,0 +1,141 @@
+import json
+
+from mcp_server.dataset_store import DatasetSnapshot, DatasetStore, JsonCacheSource, bit_positions, is_spc_abnormal
+
+def write_json(path, doc):
+    path.write_text(json.dumps(doc, ensure_ascii=False), encoding="utf-8")
+
+def test_spc_abnormal_ignores_missing_capability():
+    assert not is_spc_abnormal({"spc_items": [{"cpk": None, "ppk": None}]})
+    assert is_spc_abnormal({"spc_items": [{"cpk": None, "ppk": 1.0}]})
+    assert is_spc_abnormal({"spc_items": [{"cpk": None, "ppk": None, "cpk_alert": True}]})
+
+def test_json_cache_loads_batch_with_null_cpk(tmp_path, batch_factory, feature_factory):
+    write_json(tmp_path / "01.json", batch_factory("01", [feature_factory("F1", cpk=None, ppk=None, values=(10.0,))]))
+    write_json(tmp_path / "02.json", batch_factory("02", [feature_factory("F1", cpk=1.0, ppk=1.1)]))
+
+    store = DatasetStore(JsonCacheSource(tmp_path), poll_interval=0)
+    snap = store.current
+    assert len(snap) == 2
+    positions = list(snap.select(None, snap.flag_mask(["spc_abnormal"])))
+    assert [snap.rows[pos]["machine_id"] for pos in positions] == ["02"]
+
+def test_bit_positions_match_bit_scan():
+    import random
+
+    rng = random.Random(7)
+    for n in (0, 1, 7, 8, 9, 64, 1000):
+        bits = rng.getrandbits(n) if n else 0
+        assert bit_positions(bits) == [i for i in range(n) if bits >> i & 1]
+
+def test_select_with_mask_candidates_and_start():
+    rows = [{"machine_id": f"{i % 3:02d}", "ng_qty": int(i % 4 == 0), "status": "ok"} for i in range(50)]
+    snap = DatasetSnapshot(rows, 1)
+    mask = snap.flag_mask(["abnormal"])
+    flagged = [i for i in range(50) if i % 4 == 0]
+    candidates = snap.lookup({"machine_id": "01"})
+
+    assert list(snap.select(None, mask)) == flagged
+    assert list(snap.select(None, mask, start=21)) == [i for i in flagged if i >= 21]
+    assert list(snap.select(candidates, mask)) == [i for i in flagged if i % 3 == 1]
+    assert list(snap.select(candidates, mask, start=30)) == [i for i in flagged if i % 3 == 1 and i >= 30]
+    assert snap.frame["is_abnormal"].tolist() == [i % 4 == 0 for i in range(50)]
+
+    # 替換列產生的新快照不可沿用舊快照解碼的位置
+    new = snap.replace_row(1, dict(rows[1], ng_qty=1), 2)
+    assert list(new.select(None, new.flag_mask(["abnormal"]))) == sorted(flagged + [1])
+    assert list(snap.select(None, mask)) == flagged
+
+def random_rows(n, seed):
+    import random
+
+    rng = random.Random(seed)
+    return [{
+        "batch_id": f"B{rng.randrange(20)}",
+        "machine_id": rng.choice(["M01", "M02", "M03", None]),
+        "product": rng.choice(["P-1", "P-2"]),
+        "shift": rng.choice(["A", "B", "C"]),
+        "line": rng.choice(["L1", "L2", None]),
+        "date": rng.choice([f"2025-06-{d:02d}" for d in range(1, 11)] + [None]),
+        "status": rng.choice(["ok", "ng"]),
+    } for _ in range(n)]
+
+def test_lookup_matches_linear_scan():
+    import random
+
+    rows = random_rows(300, seed=1)
+    snap = DatasetSnapshot(rows, 1)
+    rng = random.Random(2)
+    for _ in range(200):
+        filters = {f: rng.choice([None, rows[rng.randrange(len(rows))][f], "missing"])
+                   for f in rng.sample(["batch_id", "machine_id", "product", "shift", "line", "status"], 3)}
+        date_range = rng.choice([None, ("2025-06-03", "2025-06-05"), (None, "2025-06-02"), ("2025-06-09", None)])
+        expected = [
+            pos for pos, row in enumerate(rows)
+            if all(row.get(f) == v for f, v in filters.items() if v)
+            and (not date_range or (row["date"] is not None
+                                    and (date_range[0] is None or row["date"] >= date_range[0])
+                                    and (date_range[1] is None or row["date"] <= date_range[1])))
+        ]
+        result = snap.lookup(filters, date_range)
+        if not any(filters.values()) and not date_range:
+            assert result is None
+        else:
+            assert result == expected
+
+class ListSource:
+    """測試用資料來源：rows 與 signature 可直接替換"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.sig = 1
+        self.fail = False
+
+    def signature(self):
+        return self.sig
+
+    def load_rows(self):
+        if self.fail:
+            raise ValueError("half-written file")
+        return list(self.rows)
+
+def test_reload_swaps_snapshot_and_keeps_recent_versions():
+    source = ListSource([{"batch_id": "B1", "date": "2025-06-01"}])
+    store = DatasetStore(source, poll_interval=0, keep_versions=2)
+    old = store.current
+    assert store.check_reload() is False
+
+    source.rows, source.sig = [{"batch_id": "B2", "date": "2025-06-02"}, {"batch_id": "B3"}], 2
+    assert store.check_reload() is True
+    new = store.current
+    assert new.version == old.version + 1
+    assert [r["batch_id"] for r in new.rows] == ["B2", "B3"]
+    # 舊版快照仍可依版本取得，內容與索引不受影響
+    assert store.get_snapshot(old.version) is old
+    assert [r["batch_id"] for r in old.rows] == ["B1"]
+    assert old.lookup({"batch_id": "B1"}) == [0]
+
+    # 解析失敗時沿用目前快照
+    source.sig, source.fail = 3, True
+    assert store.check_reload() is False
+    assert store.current is new
+
+    source.sig, source.fail = 4, False
+    assert store.check_reload() is True
+    assert store.get_snapshot(old.version) is None
+    assert store.get_snapshot(new.version) is new
+
+def test_date_range_boundaries():
+    dates = ["2025-06-03", None, "2025-06-01", "2025-06-03", "2025-06-05", "", "2025-06-02"]
+    snap = DatasetSnapshot([{"date": d} for d in dates], 1)
+
+    # 兩端皆包含，沒有日期的列不列入
+    assert snap.date_range("2025-06-02", "2025-06-03") == [0, 3, 6]
+    assert snap.date_range("2025-06-03", "2025-06-03") == [0, 3]
+    assert snap.date_range("2025-06-03") == [0, 3, 4]
+    assert snap.date_range(end="2025-06-02") == [2, 6]
+    assert snap.date_range() == [0, 2, 3, 4, 6]
+    # 端點不在資料中
+    assert snap.date_range("2025-06-04", "2025-06-30") == [4]
+    assert snap.date_range("2025-05-01", "2025-05-31") == []
+    assert snap.date_range("2025-06-05", "2025-06-01") == []
@@ -0,0 +1,29 @@
+from pathlib import Path
+
+from edge_etl.etl_to_json import etl_inspection_excel, parse_date, COMPACT_DATE_RE
+from mcp_server.dataset_store import batch_doc_to_row
+
+def test_parse_date():
+    assert parse_date("2025/6/3 08:00") == "2025-06-03"
+    assert parse_date("2025-02-30") is None
+    assert parse_date("insp_20250430_01", COMPACT_DATE_RE) == "2025-04-30"
+    assert parse_date("M2025043001", COMPACT_DATE_RE) is None
+
+def test_meta_date_is_earliest_measurement_date(tmp_path, workbook_factory):
+    stamps = {1: "2025-06-04 08:00", 6: "2025-06-03 23:00", 11: "2025-06-05 01:00"}
+    path = workbook_factory(tmp_path / "insp_01.xlsx", timestamp=lambda i: stamps[i])
+    doc = etl_inspection_excel(path)
+    assert doc["meta"]["date"] == "2025-06-03"
+    assert batch_doc_to_row("01", doc)["date"] == "2025-06-03"
+
+def test_meta_date_falls_back_to_file_name(tmp_path, workbook_factory):
+    folder = tmp_path / "20250430產品出貨SPC"
+    folder.mkdir()
+    path = workbook_factory(folder / "insp_01.xlsx", timestamp=lambda i: f"{8 + i // 5:02d}:00")
+    assert etl_inspection_excel(path)["meta"]["date"] == "2025-04-30"
+
+    path = workbook_factory(tmp_path / "insp_01.xlsx", timestamp=lambda i: None)
+    doc = etl_inspection_excel(Path(path))
+    assert doc["meta"]["date"] is None
+    # 沒有生產日期時不可退回 ETL 執行日期
+    assert batch_doc_to_row("01", doc)["date"] is None
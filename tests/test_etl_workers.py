@@ -0,0 +1,81 @@
+import json
+import os
+import time
+from pathlib import Path
+
+import pytest
+
+from edge_etl import etl_to_json
+
+def fake_convert(file, dst, fmt="json"):
+    # 子行程中執行：crash 開頭的檔案直接結束行程，模擬記憶體不足或原生程式庫崩潰
+    name = Path(file).name
+    if name.startswith("crash"):
+        os._exit(1)
+    if name.startswith("bad"):
+        return None, "bad workbook"
+    return name + ".out", None
+
+def fake_keyed_convert(file, dst, fmt="json"):
+    # 子行程中執行：同一個輸出 key 同時只能有一個檔案在寫入，重疊時回報錯誤
+    key = etl_to_json.output_key(file)
+    lock = Path(dst) / f"{key}.busy"
+    try:
+        os.close(os.open(lock, os.O_CREAT | os.O_EXCL))
+    except FileExistsError:
+        return None, "concurrent write"
+    try:
+        time.sleep(0.05)
+        etl_to_json.write_json_atomic(Path(dst) / f"{key}.json", {"source": Path(file).name})
+    finally:
+        lock.unlink()
+    return f"{key}.json", None
+
+@pytest.fixture
+def fake_pool_convert(monkeypatch):
+    monkeypatch.setattr(etl_to_json, "convert_file", fake_convert)
+
+@pytest.mark.parametrize("workers", [1, 2, 3])
+def test_iter_convert_keeps_order_and_errors(fake_pool_convert, tmp_path, workers):
+    files = [Path(f"ok_{i}.xlsx") for i in range(5)] + [Path("bad_1.xlsx")]
+    results = list(etl_to_json.iter_convert(files, tmp_path, "json", workers))
+    assert [r[0] for r in results] == files
+    assert [r[2] for r in results] == [None] * 5 + ["bad workbook"]
+
+def test_iter_convert_isolates_crashing_worker(fake_pool_convert, tmp_path):
+    files = [Path(f"ok_{i}.xlsx") for i in range(4)] + [Path("crash_1.xlsx")] + \
+            [Path(f"ok_{i}.xlsx") for i in range(4, 12)] + [Path("crash_2.xlsx"), Path("ok_12.xlsx")]
+    results = list(etl_to_json.iter_convert(files, tmp_path, "json", workers=2))
+
+    assert [r[0] for r in results] == files
+    failed = {r[0].name for r in results if r[2] is not None}
+    assert failed == {"crash_1.xlsx", "crash_2.xlsx"}
+    assert all(r[2].startswith("worker failed") for r in results if r[2] is not None)
+    assert all(r[1] == r[0].name + ".out" for r in results if r[2] is None)
+
+def test_run_etl_reports_summary_after_crash(fake_pool_convert, tmp_path, capsys):
+    files = [Path("ok_1.xlsx"), Path("crash_1.xlsx"), Path("ok_2.xlsx")]
+    done = etl_to_json.run_etl(files, tmp_path, "json", workers=2)
+    assert done == [Path("ok_1.xlsx"), Path("ok_2.xlsx")]
+    assert "成功 2 筆、失敗 1 筆" in capsys.readouterr().out
+
+def test_iter_convert_serialises_duplicate_keys(monkeypatch, tmp_path):
+    monkeypatch.setattr(etl_to_json, "convert_file", fake_keyed_convert)
+    # a_7 / b_7 / c_7 與 x_8 / y_8 寫入同一個批次檔
+    files = [Path(n) for n in ["a_7.xlsx", "b_7.xlsx", "x_8.xlsx", "ok_1.xlsx", "c_7.xlsx", "y_8.xlsx", "ok_2.xlsx"]]
+    results = list(etl_to_json.iter_convert(files, tmp_path, "json", workers=3))
+
+    assert [r[0] for r in results] == files
+    assert [r[2] for r in results] == [None] * len(files)
+    # 最終內容與 workers=1 相同：files 中較後面的檔案為準
+    assert json.loads((tmp_path / "7.json").read_text())["source"] == "c_7.xlsx"
+    assert json.loads((tmp_path / "8.json").read_text())["source"] == "y_8.xlsx"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["1.json", "2.json", "7.json", "8.json"]
+
+@pytest.mark.parametrize("fmt", ["json", "binary"])
+def test_write_batch_leaves_no_tmp(batch_factory, tmp_path, fmt):
+    result = batch_factory("5")
+    for _ in range(2):
+        out = etl_to_json.write_batch(result, tmp_path, fmt)
+    assert out.exists()
+    assert [p.name for p in tmp_path.rglob("*.tmp")] == []
@@ -0,0 +1,86 @@
+from datetime import time
+import math
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from edge_etl.etl_to_json import extract_measurements, is_number
+
+def legacy_extract(body, usl, lsl):
+    """向量化之前逐列處理的版本（另外略過 seq 空白的列，原本在 int(NaN) 丟出例外）"""
+    measurements, abnormal_detail, last_timestamp = [], [], None
+    for _, row in body.iterrows():
+        if not is_number(row.iloc[0]) or pd.isna(row.iloc[0]):
+            continue
+        seq = int(row.iloc[0])
+        value = float(row.iloc[1]) if is_number(row.iloc[1]) and not pd.isna(row.iloc[1]) else None
+        if value is None:
+            continue
+        raw_time = row.iloc[2] if row.shape[0] > 2 else None
+        if pd.notna(raw_time) and str(raw_time).strip():
+            timestamp = last_timestamp = str(raw_time)
+        else:
+            timestamp = last_timestamp
+        out_of_spec = value > usl or value < lsl
+        if out_of_spec:
+            abnormal_detail.append(f"第{seq}筆量測值{'超上限' if value > usl else '超下限'}")
+        measurements.append({"seq": seq, "value": value, "timestamp": timestamp, "out_of_spec": out_of_spec})
+    return measurements, abnormal_detail
+
+def same(a, b):
+    # NaN 以外逐值比較（含型別）
+    return [[(k, type(v), v) for k, v in m.items()] for m in a] == [[(k, type(v), v) for k, v in m.items()] for m in b]
+
+def test_mixed_and_blank_cells():
+    body = pd.DataFrame({
+        "seq": ["Feature0", "usl", "lsl", 1, 2.0, "3", None, "x", 4, 5, 6, 7, True, 9],
+        "value": [10.0, 10.5, 9.5, 10.0, "10.2", 9.0, 10.1, 10.0, "abc", " ", 10.6, 9.3, 10.0, np.inf],
+        "time": [None, None, None, "08:00", None, " ", "09:00", "10:00", "11:00", None, time(12, 0), None, None, None],
+    })
+    measurements, abnormal_detail, values = extract_measurements(body, 10.5, 9.5)
+    assert measurements == [
+        {"seq": 1, "value": 10.0, "timestamp": "08:00", "out_of_spec": False},
+        {"seq": 2, "value": 10.2, "timestamp": "08:00", "out_of_spec": False},
+        {"seq": 3, "value": 9.0, "timestamp": "08:00", "out_of_spec": True},
+        # seq 空白、文字的列略過，量測值為文字或空白字串的列也略過
+        {"seq": 6, "value": 10.6, "timestamp": "12:00:00", "out_of_spec": True},
+        {"seq": 7, "value": 9.3, "timestamp": "12:00:00", "out_of_spec": True},
+        {"seq": 1, "value": 10.0, "timestamp": "12:00:00", "out_of_spec": False},
+        {"seq": 9, "value": math.inf, "timestamp": "12:00:00", "out_of_spec": True},
+    ]
+    assert abnormal_detail == ["第3筆量測值超下限", "第6筆量測值超上限", "第7筆量測值超下限", "第9筆量測值超上限"]
+    assert values.tolist() == [m["value"] for m in measurements]
+    assert (measurements, abnormal_detail) == legacy_extract(body, 10.5, 9.5)
+
+def test_numeric_columns_and_missing_time_column():
+    body = pd.DataFrame({"seq": [1.0, np.nan, 3.0], "value": [9.4, 10.0, np.nan]})
+    measurements, abnormal_detail, _ = extract_measurements(body, 10.5, 9.5)
+    assert measurements == [{"seq": 1, "value": 9.4, "timestamp": None, "out_of_spec": True}]
+    assert abnormal_detail == ["第1筆量測值超下限"]
+
+def test_empty_body():
+    measurements, abnormal_detail, values = extract_measurements(pd.DataFrame({"a": [], "b": [], "c": []}), 1.0, 0.0)
+    assert (measurements, abnormal_detail, values.tolist()) == ([], [], [])
+
+SEQ_POOL = [1, 2, 3.0, "4", None, np.nan, "x", "", True, 7]
+VALUE_POOL = [10.0, 10.49, 10.51, 9.49, "10.3", "abc", " ", None, np.nan, -1e9, 12]
+TIME_POOL = ["08:00", "2025-06-03 09:00", None, np.nan, " ", "", time(7, 30), 5]
+
+@pytest.mark.parametrize("seed", range(30))
+def test_matches_row_by_row_version(seed):
+    rng = random.Random(seed)
+    n = rng.randint(0, 40)
+    numeric = rng.random() < 0.3
+    columns = {
+        "seq": [float(rng.randint(1, 9)) if numeric else rng.choice(SEQ_POOL) for _ in range(n)],
+        "value": [rng.uniform(9, 11) if numeric else rng.choice(VALUE_POOL) for _ in range(n)],
+    }
+    if rng.random() < 0.8:
+        columns["time"] = [rng.choice(TIME_POOL) for _ in range(n)]
+    body = pd.DataFrame(columns)
+    measurements, abnormal_detail, _ = extract_measurements(body, 10.5, 9.5)
+    expected, expected_detail = legacy_extract(body, 10.5, 9.5)
+    assert same(measurements, expected)
+    assert abnormal_detail == expected_detail
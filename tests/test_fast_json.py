@@ -0,0 +1,39 @@
+import json
+
+import pytest
+
+from mcp_server import fast_json
+from mcp_server.fast_json import JSONFragments
+
+DOC = {
+    "count": 2,
+    "data": JSONFragments([b'{"machine_id":"01","cpk":1.2}', b'{"machine_id":"02","cpk":null}']),
+    "results": [{"index": 0, "data": JSONFragments([])}, {"index": 1, "error": "篩選條件格式錯誤"}],
+}
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_dumps_splices_fragments(monkeypatch, use_orjson):
+    if use_orjson:
+        pytest.importorskip("orjson")
+    else:
+        monkeypatch.setattr(fast_json, "orjson", None)
+    assert json.loads(fast_json.dumps(DOC)) == {
+        "count": 2,
+        "data": [{"machine_id": "01", "cpk": 1.2}, {"machine_id": "02", "cpk": None}],
+        "results": [{"index": 0, "data": []}, {"index": 1, "error": "篩選條件格式錯誤"}],
+    }
+
+def test_orjson_and_stdlib_output_match(monkeypatch):
+    pytest.importorskip("orjson")
+    fast = fast_json.dumps(DOC)
+    monkeypatch.setattr(fast_json, "orjson", None)
+    assert fast_json.dumps(DOC) == fast
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_non_finite_floats_become_null(monkeypatch, use_orjson):
+    if use_orjson:
+        pytest.importorskip("orjson")
+    else:
+        monkeypatch.setattr(fast_json, "orjson", None)
+    doc = {"cpk": float("nan"), "spc_items": [{"ppk": float("inf")}, (1.5, float("-inf"))], "data": JSONFragments([])}
+    assert fast_json.dumps(doc) == b'{"cpk":null,"spc_items":[{"ppk":null},[1.5,null]],"data":[]}'
@@ -0,0 +1,70 @@
+import pandas as pd
+import pytest
+
+from mcp_server.issue_store import IssueStore
+
+HEADER = "issue_id,status,owner,batch_id,created_at\n"
+
+def issue_line(i):
+    # created_at 刻意不依列順序，並夾雜空值
+    created = "" if i % 7 == 3 else f"2025-06-{(i * 13) % 28 + 1:02d} {i % 24:02d}:00"
+    return f"I{i},{'closed' if i % 3 == 0 else 'open'},u{i % 4},{100 + i % 5},{created}\n"
+
+def reference(path, created_from=None, created_to=None):
+    df = pd.read_csv(path)
+    created = df["created_at"]
+    mask = created.notna()
+    if created_from:
+        mask &= created >= created_from
+    if created_to:
+        mask &= created <= created_to + "￿"
+    return df[mask]["issue_id"].tolist()
+
+def test_created_index_after_bulk_load_and_append(tmp_path):
+    path = tmp_path / "issues.csv"
+    path.write_text(HEADER + "".join(issue_line(i) for i in range(200)), encoding="utf-8")
+    store = IssueStore(path)
+    assert store.refresh()
+    assert store.created_index == sorted(store.created_index)
+
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("".join(issue_line(i) for i in range(200, 230)))
+    assert store.refresh()
+    assert len(store.rows) == 230
+    assert store.created_index == sorted(store.created_index)
+
+    for start, end in [("2025-06-05", "2025-06-10"), (None, "2025-06-01"), ("2025-06-27", None), ("2025-06-15", "2025-06-15")]:
+        got = [r["issue_id"] for r in store.query(status="all", created_from=start, created_to=end)]
+        assert got == reference(path, start, end)
+
+def snapshot(store):
+    # 各種查詢的結果（含值的型別），比較追加與整份重載是否一致
+    queries = [{"status": "all"}, {"batch_id": 101}, {"batch_id": "102"}, {"owner": "u1"}, {"status": "open,closed"}]
+    return [[(k, repr(v)) for row in store.query(**q) for k, v in row.items()] for q in queries]
+
+@pytest.mark.parametrize("tail", [
+    "I3,open,u1,101,2025-06-03 08:00\n",
+    # 追加的部分也有空欄、字串型 batch_id
+    "I3,open,u1,,2025-06-03 08:00\nI4,closed,u2,102,\n",
+    "I3,open,,B-9,2025-06-03 08:00\n",
+])
+@pytest.mark.parametrize("head", [
+    # batch_id 含空欄（整份載入時為 float）
+    HEADER + "I1,open,u1,,2025-06-01 08:00\nI2,open,u2,101,2025-06-02 08:00\n",
+    # batch_id 全為整數
+    HEADER + "I1,open,u1,100,2025-06-01 08:00\nI2,open,u2,101,2025-06-02 08:00\n",
+])
+def test_append_matches_full_reload(tmp_path, head, tail):
+    path = tmp_path / "issues.csv"
+    path.write_text(head, encoding="utf-8")
+    appended = IssueStore(path)
+    appended.refresh()
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(tail)
+    assert appended.refresh()
+
+    fresh = IssueStore(path)
+    fresh.refresh()
+    assert snapshot(appended) == snapshot(fresh)
+    assert [r["issue_id"] for r in fresh.query(status="all", batch_id=101)] == \
+        [r["issue_id"] for r in fresh.query(status="all") if str(r["batch_id"]) in ("101", "101.0")]
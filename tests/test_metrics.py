@@ -0,0 +1,55 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from mcp_server import metrics
+
+def make_app():
+    tool_app = FastAPI()
+
+    @tool_app.get("/api/item/{item_id}")
+    def item(item_id: str):
+        return {"id": item_id}
+
+    @tool_app.get("/api/named")
+    def named(tool: str):
+        metrics.set_tool(tool)
+        return {}
+
+    app = FastAPI()
+    metrics.instrument(app, "test_gateway")
+    app.mount("/tool", tool_app)
+    return app
+
+def tool_labels(registry, server="test_gateway"):
+    return {tool for (s, tool, _status) in registry.requests if s == server}
+
+def test_tool_label_uses_route_template(monkeypatch):
+    registry = metrics.MetricsRegistry()
+    monkeypatch.setattr(metrics, "REGISTRY", registry)
+    client = TestClient(make_app())
+    for i in range(5):
+        assert client.get(f"/tool/api/item/{i}").status_code == 200
+    assert client.get("/random/path/1").status_code == 404
+    assert client.get("/tool/unknown").status_code == 404
+    assert tool_labels(registry) == {"/tool/api/item/{item_id}", "other"}
+
+def test_label_values_are_escaped(monkeypatch):
+    registry = metrics.MetricsRegistry()
+    monkeypatch.setattr(metrics, "REGISTRY", registry)
+    client = TestClient(make_app())
+    client.get("/tool/api/named", params={"tool": 'a"b\\c\nd'})
+    text = registry.render()
+    assert 'tool="a\\"b\\\\c\\nd"' in text
+    # 換行已跳脫，每一行仍是完整的樣本
+    assert all(line.startswith(("#", "mcp_")) for line in text.splitlines())
+
+def test_client_tool_name_does_not_create_labels(monkeypatch):
+    from mcp_server import production_summary_server
+
+    registry = metrics.MetricsRegistry()
+    monkeypatch.setattr(metrics, "REGISTRY", registry)
+    client = TestClient(production_summary_server.app)
+    for i in range(5):
+        resp = client.post("/tool_call", json={"tool": f"junk{i}", "args": {"date": "2025-06-01"}})
+        assert resp.status_code == 400
+    assert tool_labels(registry, "production_summary") == {"production_summary"}
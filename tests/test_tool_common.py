@@ -0,0 +1,87 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from mcp_server.tool_common import CsvRecordCache, SingleFlight
+
+def test_csv_cache_invalidates_on_mtime_or_size(tmp_path):
+    path = tmp_path / "2025-06-03.csv"
+    path.write_text("machine_id,qty\nM01,1\n")
+    cache = CsvRecordCache()
+
+    assert cache.load(path) == [{"machine_id": "M01", "qty": 1}]
+    assert cache.load(path) == [{"machine_id": "M01", "qty": 1}]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # 大小相同、mtime 不同
+    path.write_text("machine_id,qty\nM01,2\n")
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    assert cache.load(path) == [{"machine_id": "M01", "qty": 2}]
+    assert cache.misses == 2
+
+    # mtime 相同、大小不同
+    mtime_ns = path.stat().st_mtime_ns
+    path.write_text("machine_id,qty\nM01,2\nM02,3\n")
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+    assert cache.load(path) == [{"machine_id": "M01", "qty": 2}, {"machine_id": "M02", "qty": 3}]
+    assert cache.misses == 3
+
+    path.unlink()
+    with pytest.raises(FileNotFoundError):
+        cache.load(path)
+
+@pytest.fixture
+def executor():
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        yield pool
+
+def test_single_flight_coalesces_concurrent_calls(executor):
+    flight = SingleFlight(executor)
+    release = threading.Event()
+    calls = []
+
+    def work(value):
+        calls.append(value)
+        release.wait(5)
+        return value * 2
+
+    first = flight.submit("k", work, 21)
+    second = flight.submit("k", work, 21)
+    other = flight.submit("other", work, 1)
+    assert second is first
+    assert other is not first
+    assert flight.coalesced == 1
+
+    release.set()
+    assert first.result(5) == second.result(5) == 42
+    assert other.result(5) == 2
+    assert sorted(calls) == [1, 21]
+
+    # 完成後不再合併，重新執行
+    assert flight.submit("k", work, 21).result(5) == 42
+    assert sorted(calls) == [1, 21, 21]
+
+def test_single_flight_propagates_errors(executor):
+    flight = SingleFlight(executor)
+    release = threading.Event()
+    calls = []
+
+    def fail():
+        calls.append(1)
+        release.wait(5)
+        raise ValueError("bad csv")
+
+    futures = [flight.submit("k", fail) for _ in range(3)]
+    release.set()
+    for future in futures:
+        with pytest.raises(ValueError, match="bad csv"):
+            future.result(5)
+    assert len(calls) == 1
+
+    # 失敗的結果不保留，下一次呼叫重新執行
+    with pytest.raises(ValueError):
+        flight.submit("k", fail).result(5)
+    assert len(calls) == 2
@@ -0,0 +1,83 @@
+import json
+
+from fastapi.testclient import TestClient
+
+from mcp_server import tool_gateway
+
+REMOTE = "http://remote-gateway/tool_call"
+
+class FakeResponse:
+    """requests.Response 的替身：只提供 forward_tool_call 用到的部分"""
+
+    def __init__(self, status_code, content_type, chunks):
+        self.status_code = status_code
+        self.headers = {"content-type": content_type}
+        self._chunks = chunks
+        self.closed = False
+
+    @property
+    def text(self):
+        return b"".join(self._chunks).decode()
+
+    def json(self):
+        return json.loads(self.text)
+
+    def iter_content(self, chunk_size=None):
+        yield from self._chunks
+
+    def close(self):
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def make_client(monkeypatch, response):
+    sent = []
+
+    def fake_post(url, **kwargs):
+        sent.append((url, kwargs))
+        return response
+
+    monkeypatch.setattr(tool_gateway.requests, "post", fake_post)
+    app = tool_gateway.create_app(tools=[], endpoints={"batch_anomaly": REMOTE})
+    return TestClient(app), sent
+
+def test_forwards_ndjson_stream(monkeypatch):
+    lines = [b'{"batch_id": "B_1"}\n', b'{"batch_id": "B_2"}\n']
+    response = FakeResponse(200, "application/x-ndjson", lines)
+    client, sent = make_client(monkeypatch, response)
+
+    resp = client.post("/tool_call", json={"tool": "batch_anomaly", "args": {"stream": True}})
+
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    assert [json.loads(line) for line in resp.text.splitlines()] == [{"batch_id": "B_1"}, {"batch_id": "B_2"}]
+    assert sent[0][0] == REMOTE and sent[0][1]["stream"] is True
+    assert response.closed
+
+def test_forwards_json_result(monkeypatch):
+    body = {"trace_id": "abc", "status": "ok", "data": [{"batch_id": "B_1"}]}
+    response = FakeResponse(200, "application/json", [json.dumps(body).encode()])
+    client, _ = make_client(monkeypatch, response)
+
+    resp = client.post("/tool_call", json={"tool": "batch_anomaly", "args": {}})
+
+    assert resp.status_code == 200
+    assert resp.json()["data"] == [{"batch_id": "B_1"}]
+    assert response.closed
+
+def test_forwards_remote_error(monkeypatch):
+    response = FakeResponse(400, "application/json", [b'{"detail": "bad args"}'])
+    client, _ = make_client(monkeypatch, response)
+
+    resp = client.post("/tool_call", json={"tool": "batch_anomaly", "args": {}})
+
+    assert resp.status_code == 400
+    assert resp.json()["detail"] == "bad args"
+    assert response.closed
+
+def test_app_is_not_built_at_import():
+    assert not hasattr(tool_gateway, "app")
@@ -0,0 +1,111 @@
+from datetime import date, timedelta
+import json
+import os
+
+import pandas as pd
+import pytest
+
+from mcp_server.trend_store import TrendStore
+
+DAYS = {
+    "2025-05-30": "machine_id,line,event_type,count\nM01,A,停機,1\nM02,B,異常,3\n",
+    # 沒有 count 欄
+    "2025-05-31": "machine_id,line,event_type\nM01,A,停機\n",
+    "2025-06-01": "machine_id,line,event_type,count,remark\nM03,A,異常,2,換線\nM01,B,停機,5,\n",
+    # 只有欄名
+    "2025-06-02": "machine_id,line,event_type,count\n",
+}
+
+def write_days(src, days):
+    for name, text in days.items():
+        (src / f"{name}.csv").write_text(text, encoding="utf-8")
+
+def read_per_day(src, start, end):
+    """原本 anomaly_trend_server 的讀法：逐日讀取 CSV 並附上 date"""
+    records = []
+    day = date.fromisoformat(start)
+    while day <= date.fromisoformat(end):
+        path = src / f"{day.isoformat()}.csv"
+        if path.exists():
+            for row in pd.read_csv(path, encoding="utf-8").to_dict(orient="records"):
+                row["date"] = day.isoformat()
+                records.append(row)
+        day += timedelta(days=1)
+    return records
+
+def normalized(records):
+    # 比較欄位順序、值與 Python 型別（int 不可變成 float、不可多出缺值欄）
+    return [[(k, repr(v), type(v).__name__) for k, v in row.items()] for row in records]
+
+@pytest.fixture
+def src(tmp_path):
+    d = tmp_path / "src"
+    d.mkdir()
+    write_days(d, DAYS)
+    return d
+
+@pytest.mark.parametrize("start,end", [
+    ("2025-05-01", "2025-06-30"), ("2025-05-31", "2025-06-01"), ("2025-06-01", "2025-06-01"), ("2025-07-01", "2025-07-02"),
+])
+def test_query_matches_per_day_csv(src, tmp_path, start, end):
+    store = TrendStore(src, tmp_path / "store")
+    store.sync()
+    assert normalized(store.query(start, end)) == normalized(read_per_day(src, start, end))
+
+def test_pushdown_filters_and_incremental_update(src, tmp_path):
+    store = TrendStore(src, tmp_path / "store")
+    store.sync()
+    got = store.query("2025-05-01", "2025-06-30", machine_id="M01")
+    assert normalized(got) == normalized([r for r in read_per_day(src, "2025-05-01", "2025-06-30") if r["machine_id"] == "M01"])
+
+    write_days(src, {"2025-05-31": "machine_id,line,event_type,count\nM09,C,異常,7\n"})
+    (src / "2025-06-02.csv").unlink()
+    assert store.sync()
+    assert normalized(store.query("2025-05-01", "2025-06-30")) == normalized(read_per_day(src, "2025-05-01", "2025-06-30"))
+
+@pytest.mark.parametrize("content", [b"", b'{"2025-06-01": "machine_id', b'["2025-06-01"]', b'{"2025-06-01": 1}', "pickle"])
+def test_unreadable_partition_is_rebuilt(src, tmp_path, content):
+    store_dir = tmp_path / "store"
+    TrendStore(src, store_dir).sync()
+    path = store_dir / "2025-06.json"
+    if content == "pickle":
+        # 舊格式或被置換的 pickle 內容不可被反序列化
+        pd.to_pickle({"2025-06-01": pd.DataFrame({"date": ["x"]})}, path, compression=None)
+    else:
+        path.write_bytes(content)
+    os.utime(path, ns=(1, 1))
+
+    store = TrendStore(src, store_dir)
+    assert normalized(store.query("2025-06-01", "2025-06-30")) == normalized(read_per_day(src, "2025-06-01", "2025-06-30"))
+    with open(path, encoding="utf-8") as f:
+        assert sorted(json.load(f)) == ["2025-06-01", "2025-06-02"]
+
+def test_partitions_are_not_pickled(src, tmp_path, monkeypatch):
+    store_dir = tmp_path / "store"
+    store = TrendStore(src, store_dir)
+    monkeypatch.setattr(pd, "read_pickle", None)
+    store.sync()
+    assert sorted(p.name for p in store_dir.iterdir()) == ["2025-05.json", "2025-06.json", "manifest.json"]
+    assert normalized(TrendStore(src, store_dir).query("2025-05-01", "2025-06-30")) == \
+        normalized(read_per_day(src, "2025-05-01", "2025-06-30"))
+
+def test_without_store_dir_nothing_is_written(src):
+    before = sorted(p.name for p in src.iterdir())
+    store = TrendStore(src)
+    store.sync()
+    assert normalized(store.query("2025-05-01", "2025-06-30")) == normalized(read_per_day(src, "2025-05-01", "2025-06-30"))
+    write_days(src, {"2025-06-03": "machine_id,line,event_type,count\nM05,A,停機,4\n"})
+    assert store.sync()
+    assert normalized(store.query("2025-06-01", "2025-06-30")) == normalized(read_per_day(src, "2025-06-01", "2025-06-30"))
+    assert sorted(p.name for p in src.iterdir()) == sorted(before + ["2025-06-03.csv"])
+
+def test_parsed_partitions_are_bounded(src, tmp_path):
+    # 上限小於單一分區時不保留任何解析結果，查詢仍正確
+    for max_bytes in (1, 10 ** 9):
+        store = TrendStore(src, tmp_path / f"store{max_bytes}", max_bytes=max_bytes)
+        store.sync()
+        for _ in range(2):
+            assert normalized(store.query("2025-05-01", "2025-06-30")) == \
+                normalized(read_per_day(src, "2025-05-01", "2025-06-30"))
+        assert store._frames.total_bytes <= max_bytes
+        assert len(store._frames) == (0 if max_bytes == 1 else 2)
@@ -0,0 +1,40 @@
+def batch(client, *queries, **shared):
+    resp = client.post("/api/query/batch", json={"filters": shared, "queries": list(queries)})
+    assert resp.status_code == 200
+    return resp.json()["results"]
+
+def test_batch_matches_get(client):
+    expected = client.get("/api/query", params={"type": "production_summary", "abnormal_only": "true", "size": 500}).json()
+    [result] = batch(client, {"type": "production_summary", "filters": {"abnormal_only": True}, "size": 500})
+    assert result["total"] == expected["total"]
+    assert result["data"] == expected["data"]
+
+def test_string_booleans_are_coerced(client):
+    everything = client.get("/api/query", params={"type": "production_summary", "size": 500}).json()
+    [result] = batch(client, {"type": "production_summary", "filters": {"abnormal_only": "false"}, "size": 500})
+    assert result["status"] == "ok"
+    assert result["total"] == everything["total"]
+
+def test_numbers_are_coerced_like_query_params(client):
+    expected = client.get("/api/query", params={"type": "production_summary", "shift": "1"}).json()
+    [result] = batch(client, {"type": "production_summary", "filters": {"shift": 1}})
+    assert result["status"] == "ok"
+    assert result["total"] == expected["total"]
+
+def test_invalid_filters_fail_only_their_sub_query(client):
+    results = batch(
+        client,
+        {"type": "production_summary", "filters": {"machine_id": ["M01"]}},
+        {"type": "production_summary", "filters": {"abnormal_only": "maybe"}},
+        {"type": "production_summary", "filters": {"machine": "M01"}},
+        {"type": "production_summary", "filters": {"start_date": "2025/01/01"}},
+        {"type": "production_summary", "filters": {"machine_id": "M01"}},
+    )
+    assert [r["status"] for r in results] == ["error", "error", "error", "error", "ok"]
+    assert "machine_id" in results[0]["msg"]
+    assert "不支援的篩選條件: machine" == results[2]["msg"]
+    assert results[4]["total"] > 0
+
+def test_shared_filters_are_validated(client):
+    [result] = batch(client, {"type": "production_summary"}, machine_id={"a": 1})
+    assert result["status"] == "error"
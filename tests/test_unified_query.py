@@ -0,0 +1,134 @@
+import json
+
+import pytest
+
+from mcp_server.unified_server import decode_cursor, encode_cursor
+
+def query(client, **params):
+    resp = client.get("/api/query", params=params)
+    assert resp.status_code == 200
+    return resp.json()
+
+@pytest.mark.parametrize("params", [
+    {"type": "production_summary"},
+    {"type": "production_summary", "abnormal_only": "true"},
+    {"type": "spc_summary", "fields": "batch_id,machine_id,date"},
+    {"type": "yield_summary", "line": "A"},
+])
+@pytest.mark.parametrize("size", [1, 2, 5])
+def test_cursor_pages_cover_full_result(client, params, size):
+    expected = query(client, **params, size=500)["data"]
+    rows, cursor, pages = [], None, 0
+    while True:
+        page = query(client, **params, size=size, **({"cursor": cursor} if cursor else {}))
+        assert page["status"] == "ok"
+        assert len(page["data"]) <= size
+        rows.extend(page["data"])
+        pages += 1
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert rows == expected
+    assert pages == max(1, -(-len(expected) // size))
+
+def test_cursor_page_matches_offset_page(client):
+    first = query(client, type="production_summary", size=4)
+    second = query(client, type="production_summary", size=4, page=2)
+    by_cursor = query(client, type="production_summary", size=4, cursor=first["next_cursor"])
+    assert by_cursor["data"] == second["data"]
+    assert by_cursor["next_cursor"] == second["next_cursor"]
+
+def test_invalid_cursor(client):
+    assert query(client, type="production_summary", cursor="not-a-cursor") == {"status": "error", "msg": "cursor 格式錯誤"}
+
+def test_expired_cursor(client):
+    _, pos, qhash = decode_cursor(query(client, type="production_summary", size=2)["next_cursor"])
+    assert query(client, type="production_summary", cursor=encode_cursor(10 ** 6, pos, qhash)) == {
+        "status": "error", "msg": "cursor 已過期（資料已更新），請重新查詢"
+    }
+
+@pytest.mark.parametrize("changed", [
+    {"machine_id": "M01"},
+    {"type": "spc_summary"},
+    {"fields": "batch_id,date"},
+    {"abnormal_only": "true"},
+])
+def test_cursor_rejected_for_other_query(client, changed):
+    params = {"type": "production_summary", "size": 2}
+    cursor = query(client, **params)["next_cursor"]
+    resp = client.get("/api/query", params=dict(params, **changed, cursor=cursor))
+    assert resp.status_code == 400
+    assert resp.json()["status"] == "error"
+
+def test_cursor_allows_other_page_size(client):
+    cursor = query(client, type="production_summary", size=2)["next_cursor"]
+    assert query(client, type="production_summary", size=3, cursor=cursor)["status"] == "ok"
+
+def test_batch_cursor_continues_with_get(client):
+    resp = client.post("/api/query/batch", json={
+        "filters": {"line": "A"},
+        "queries": [{"type": "yield_summary", "size": 2}],
+    })
+    first = resp.json()["results"][0]
+    offset = query(client, type="yield_summary", line="A", size=2, page=2)
+    by_cursor = query(client, type="yield_summary", line="A", size=2, cursor=first["next_cursor"])
+    assert by_cursor["data"] == offset["data"]
+
+def test_etag_and_not_modified(client):
+    params = {"type": "production_summary", "machine_id": "M01", "size": 5}
+    first = client.get("/api/query", params=params)
+    etag = first.headers["ETag"]
+    assert client.get("/api/query", params=params).headers["ETag"] == etag
+
+    for header in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+        resp = client.get("/api/query", params=params, headers={"If-None-Match": header})
+        assert resp.status_code == 304
+        assert resp.content == b""
+        assert resp.headers["ETag"] == etag
+
+    resp = client.get("/api/query", params=params, headers={"If-None-Match": '"0-stale"'})
+    assert resp.status_code == 200
+    assert resp.content == first.content
+
+    # 不同查詢參數有各自的 ETag
+    assert client.get("/api/query", params=dict(params, size=6)).headers["ETag"] != etag
+
+def test_error_response_has_no_etag(client):
+    resp = client.get("/api/query", params={"type": "production_summary", "start_date": "2025/06/01"})
+    assert resp.json()["status"] == "error"
+    assert "ETag" not in resp.headers
+
+def test_etag_changes_with_dataset_version(client, monkeypatch):
+    from mcp_server import unified_server
+    from mcp_server.dataset_store import DatasetStore
+
+    store = DatasetStore(unified_server.SOURCE, poll_interval=0)
+    monkeypatch.setattr(unified_server, "STORE", store)
+    params = {"type": "production_summary", "size": 3}
+    old = client.get("/api/query", params=params)
+
+    snap = store.current
+    store.update_row(0, dict(snap.rows[0], actual_qty=(snap.rows[0].get("actual_qty") or 0) + 1))
+    resp = client.get("/api/query", params=params, headers={"If-None-Match": old.headers["ETag"]})
+    assert resp.status_code == 200
+    assert resp.headers["X-Dataset-Version"] == str(store.current.version)
+    assert resp.headers["ETag"] != old.headers["ETag"]
+    assert resp.json()["data"][0]["actual_qty"] == old.json()["data"][0]["actual_qty"] + 1
+
+@pytest.mark.parametrize("params", [
+    {"type": "production_summary"},
+    {"type": "spc_summary", "fields": "batch_id,machine_id,date", "abnormal_only": "true"},
+    {"type": "yield_summary", "line": "A"},
+])
+def test_ndjson_streams_all_matching_rows(client, params):
+    expected = query(client, **params, size=500)["data"]
+    resp = client.get("/api/query", params=dict(params, format="ndjson", size=1, page=3))
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    assert resp.headers["X-Dataset-Version"]
+    # 一行一筆，忽略分頁參數，內容與 JSON 分頁結果相同
+    assert resp.text.endswith("\n") or resp.text == ""
+    assert [json.loads(line) for line in resp.text.splitlines()] == expected
+
+def test_ndjson_rejects_unknown_format(client):
+    assert query(client, type="production_summary", format="csv")["status"] == "error"
@@ -0,0 +1,95 @@
+from datetime import date, datetime, time
+import re
+import zipfile
+
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+from openpyxl.utils.datetime import CALENDAR_MAC_1904
+
+from edge_etl.xlsx_reader import XlsxReader
+
+# 直接寫入工作表 XML 的儲存格：inline string（含 rich text）與有快取值的公式
+RAW_CELLS = {
+    "B9": '<c r="B9" t="inlineStr"><is><t>inline 文字</t></is></c>',
+    "D9": '<c r="D9" t="inlineStr"><is><r><t>rich </t></r><r><t>run</t></r></is></c>',
+    "B10": '<c r="B10"><f>B2*2</f><v>20.5</v></c>',
+    "D10": '<c r="D10" t="str"><f>"x"&amp;"y"</f><v>xy</v></c>',
+}
+
+def build_workbook(path, epoch=None):
+    wb = Workbook()
+    if epoch is not None:
+        wb.epoch = epoch
+    ws = wb.active
+    ws.title = "Summary"
+    for r, v in enumerate(["VendorX", 12345, 3.5, datetime(2025, 6, 3, 8, 30), True], start=1):
+        ws.cell(row=r, column=7, value=v)
+    # G 欄以外、較後面的列仍有資料：尾端裁切依整個分頁判斷
+    ws.cell(row=9, column=10, value="note")
+
+    sh = wb.create_sheet("F0")
+    sh.append(["name", "value", "time", "flag", None, "extra"])
+    sh.append(["Feature0", 10.25, time(8, 0), True])
+    sh.append(["usl", 10.5, datetime(2025, 6, 3, 9, 15), False])
+    sh.append(["lsl", 10, date(2025, 6, 4), "#N/A"])
+    sh.append([])  # 空白列
+    sh.append([1, 10.01, "08:00", None])
+    sh.append([2, "=B2*3", None, 1])  # 公式（無快取值）
+    sh.append([3, 1e-7, None, "文字"])
+    sh.append([4, "placeholder", None, "placeholder"])
+    sh.append([5, "placeholder", None, "placeholder"])
+    sh.append([6, -0.0, None, None])
+    sh.cell(row=13, column=6, value="far right, later row")
+
+    ints = wb.create_sheet("Ints")
+    ints.append(["seq", "v"])
+    for i in range(1, 6):
+        ints.append([i, i * 2])
+    ints.cell(row=9, column=5, value=1)
+
+    wb.create_sheet("Empty")
+    wb.save(path)
+
+    # 以原始 XML 置換部分儲存格
+    with zipfile.ZipFile(path) as z:
+        files = {name: z.read(name) for name in z.namelist()}
+    sheet_xml = files["xl/worksheets/sheet2.xml"].decode("utf-8")
+    for ref, raw in RAW_CELLS.items():
+        sheet_xml, n = re.subn(rf'<c r="{ref}"[^>]*?(?:/>|>.*?</c>)', raw, sheet_xml)
+        assert n == 1, ref
+    files["xl/worksheets/sheet2.xml"] = sheet_xml.encode("utf-8")
+    with zipfile.ZipFile(path, "w") as z:
+        for name, data in files.items():
+            z.writestr(name, data)
+    return path
+
+@pytest.fixture(params=[None, CALENDAR_MAC_1904], ids=["1900", "1904"])
+def workbook(request, tmp_path):
+    return build_workbook(tmp_path / "book.xlsx", request.param)
+
+def expected_frame(path, sheet, header, min_col, max_col):
+    return pd.read_excel(path, sheet_name=sheet, header=header, engine="openpyxl").iloc[:, min_col - 1:max_col]
+
+@pytest.mark.parametrize("sheet,header,min_col,max_col", [
+    ("Summary", None, 7, 7),
+    ("Summary", None, 1, None),
+    ("F0", 0, 1, 4),
+    ("F0", None, 1, 4),
+    ("F0", 0, 2, 3),
+    ("F0", 0, 1, None),
+    ("Ints", 0, 1, 2),
+    ("Ints", 0, 1, 4),
+])
+def test_read_frame_matches_read_excel(workbook, sheet, header, min_col, max_col):
+    with XlsxReader(workbook) as book:
+        assert book.sheet_names == pd.ExcelFile(workbook, engine="openpyxl").sheet_names
+        got = book.read_frame(sheet, header=header, min_col=min_col, max_col=max_col)
+    expected = expected_frame(workbook, sheet, header, min_col, max_col)
+    got.columns = expected.columns
+    pd.testing.assert_frame_equal(got, expected)
+
+def test_empty_sheet_and_out_of_range_columns(workbook):
+    with XlsxReader(workbook) as book:
+        assert book.read_frame("Empty", header=0, max_col=4).empty
+        assert book.read_frame("Ints", header=0, min_col=8, max_col=9).empty